@@ -0,0 +1,172 @@
+"""
+Admission control for incoming connections, applied before the TLS handshake.
+
+A handshake costs a private-key operation plus certificate validation, so a
+listener checks every accepted socket here first and drops it straight away
+when:
+  - its source IP is banned after repeated authentication failures
+  - too many handshakes are already in progress
+  - its source IP, or all sources together, exceeded their rate (token buckets)
+
+Failures decay: each source's failure score halves every `failure_half_life`
+seconds, so an occasional bad connection never adds up to a ban, while a
+source that keeps presenting revoked, expired or foreign certificates is
+banned for `ban_seconds`, doubling with every repeat ban.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+PER_IP_RATE = float(os.environ.get("ADMISSION_PER_IP_RATE", "5"))
+PER_IP_BURST = float(os.environ.get("ADMISSION_PER_IP_BURST", "10"))
+GLOBAL_RATE = float(os.environ.get("ADMISSION_GLOBAL_RATE", "200"))
+GLOBAL_BURST = float(os.environ.get("ADMISSION_GLOBAL_BURST", "400"))
+MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", "64"))
+
+REJECT_BANNED = "banned"
+REJECT_CONCURRENCY = "concurrency"
+REJECT_SOURCE_RATE = "source_rate"
+REJECT_GLOBAL_RATE = "global_rate"
+
+
+class TokenBucket:
+    """Allows `rate` events per second with bursts of up to `burst`. Not thread-safe."""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class _Source:
+    __slots__ = ("bucket", "score", "scored_at", "banned_until", "bans")
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.score = 0.0
+        self.scored_at = 0.0
+        self.banned_until = 0.0
+        self.bans = 0
+
+
+class AdmissionController:
+    """Decides, per accepted connection, whether it may start a handshake.
+
+    Call `admit(ip)` before wrap_socket; if it returns None the connection was
+    admitted and `release(ip, authenticated)` must follow once the handshake
+    is over. Otherwise it returns the rejection reason and the caller should
+    close the socket. Per-source state is kept for the `max_sources` most
+    recently seen IPs.
+    """
+    def __init__(self, per_ip_rate: float = PER_IP_RATE, per_ip_burst: float = PER_IP_BURST,
+                 global_rate: float = GLOBAL_RATE, global_burst: float = GLOBAL_BURST,
+                 max_concurrent: int = MAX_CONCURRENT, ban_threshold: float = 5.0,
+                 failure_half_life: float = 60.0, ban_seconds: float = 60.0, max_ban_seconds: float = 3600.0,
+                 max_sources: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.per_ip_rate = per_ip_rate
+        self.per_ip_burst = per_ip_burst
+        self.max_concurrent = max_concurrent
+        self.ban_threshold = ban_threshold
+        self.failure_half_life = failure_half_life
+        self.ban_seconds = ban_seconds
+        self.max_ban_seconds = max_ban_seconds
+        self.max_sources = max_sources
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_rate, global_burst, clock())
+        self._sources: "OrderedDict[str, _Source]" = OrderedDict()
+        self._in_flight = 0
+        self._stats: Dict[str, int] = {
+            "admitted": 0, REJECT_BANNED: 0, REJECT_CONCURRENCY: 0,
+            REJECT_SOURCE_RATE: 0, REJECT_GLOBAL_RATE: 0, "failures": 0, "bans": 0,
+        }
+
+    def _source(self, ip: str, now: float) -> _Source:
+        source = self._sources.get(ip)
+        if source is None:
+            source = _Source(TokenBucket(self.per_ip_rate, self.per_ip_burst, now))
+            self._sources[ip] = source
+            if len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        else:
+            self._sources.move_to_end(ip)
+        return source
+
+    def admit(self, ip: str) -> Optional[str]:
+        """Returns None if a handshake from ip may proceed, else the rejection reason."""
+        with self._lock:
+            now = self._clock()
+            source = self._source(ip, now)
+            if source.banned_until > now:
+                reason = REJECT_BANNED
+            elif self._in_flight >= self.max_concurrent:
+                reason = REJECT_CONCURRENCY
+            elif not source.bucket.take(now):
+                reason = REJECT_SOURCE_RATE
+            elif not self._global.take(now):
+                reason = REJECT_GLOBAL_RATE
+            else:
+                self._in_flight += 1
+                self._stats["admitted"] += 1
+                return None
+            self._stats[reason] += 1
+            return reason
+
+    def release(self, ip: str, authenticated: Optional[bool]) -> float:
+        """Ends an admitted handshake and records its outcome.
+
+        authenticated is None for a handshake that ended without a verdict on
+        the peer's identity (a reset connection, a timeout, a non-TLS client);
+        it leaves the source's failure score as it was.
+
+        Returns:
+            The ban length in seconds if this failure got ip banned, else 0
+        """
+        with self._lock:
+            self._in_flight -= 1
+            now = self._clock()
+            source = self._source(ip, now)
+            if authenticated is None:
+                return 0.0
+            if authenticated:
+                source.score = 0.0
+                return 0.0
+            self._stats["failures"] += 1
+            source.score = source.score * 0.5 ** ((now - source.scored_at) / self.failure_half_life) + 1.0
+            source.scored_at = now
+            if source.score < self.ban_threshold:
+                return 0.0
+            duration = min(self.ban_seconds * 2 ** source.bans, self.max_ban_seconds)
+            source.banned_until = now + duration
+            source.bans += 1
+            source.score = 0.0
+            self._stats["bans"] += 1
+            return duration
+
+    def is_banned(self, ip: str) -> bool:
+        with self._lock:
+            source = self._sources.get(ip)
+            return source is not None and source.banned_until > self._clock()
+
+    def stats(self) -> dict:
+        """Returns admission/rejection counters plus current in-flight and banned counts."""
+        with self._lock:
+            now = self._clock()
+            out = dict(self._stats)
+            out["in_flight"] = self._in_flight
+            out["tracked_sources"] = len(self._sources)
+            out["banned_now"] = sum(1 for s in self._sources.values() if s.banned_until > now)
+        return out
@@ -1,6 +1,12 @@
+import re
 import ssl
+import sys
+import time
+import select
+import socket
+import datetime
 import threading
-from typing import Optional, Callable
+from typing import Callable, Dict, List, Optional
 
 # Import necessary utilities using relative path
 from .utils import COLOR_PEER, COLOR_ERROR, COLOR_RESET, MY_USER_ID
@@ -11,16 +17,96 @@ except ImportError:
     class SSLWantReadError(Exception):
         pass
 
+# In-band control frames (heartbeats, see app/heartbeat.py). Chat text never
+# contains NUL, so a NUL marks the start of a frame.
+CONTROL_PREFIX = b"\x00"
+_CONTROL_FRAME = re.compile(rb"\x00(PING|PONG) (\d+)\n")
+
+
+def control_frame(kind: bytes, seq: int) -> bytes:
+    """Encodes a PING/PONG control frame."""
+    return CONTROL_PREFIX + kind + b" %d\n" % seq
+
+
 class SessionState:
-    """Holds the active SSL connection and the peer's identity."""
-    def __init__(self, peer_id: str, conn: ssl.SSLSocket):
+    """Holds the active SSL connection, the peer's identity and per-session counters.
+
+    Slotted so that tens of thousands of sessions stay cheap: no per-instance
+    __dict__, and every field is fixed. The counters and last-activity times
+    are only written by the session's own reader (in) and sender (out), so
+    they are updated without a lock and read as a best-effort snapshot.
+    """
+    __slots__ = ("peer_id", "conn", "not_after", "serial", "cipher", "version", "receiver", "parked", "_closed",
+                 "created", "last_rx", "last_tx", "bytes_in", "bytes_out", "msgs_in", "msgs_out",
+                 "rtt", "_wlock")
+
+    def __init__(self, peer_id: str, conn: ssl.SSLSocket, not_after: Optional[datetime.datetime] = None,
+                 serial: Optional[int] = None, cipher: Optional[str] = None, version: Optional[str] = None):
         self.peer_id = peer_id
         self.conn = conn
+        self.not_after = not_after  # Peer certificate expiry (UTC-aware), if known
+        self.serial = serial  # Peer certificate serial, if known
+        self.cipher = cipher  # Negotiated cipher suite name, if known
+        self.version = version  # Negotiated TLS version, if known
+        self.receiver: Optional[threading.Thread] = None  # Thread running recv_loop, if any
+        self.parked = False  # Idle in a SessionPool: chat arriving now has no one to read it
         self._closed = False
+        self.created = time.monotonic()
+        self.last_rx = self.last_tx = self.created
+        self.bytes_in = self.bytes_out = 0
+        self.msgs_in = self.msgs_out = 0
+        self.rtt: Optional[float] = None  # Smoothed heartbeat round-trip time (seconds), if measured
+        self._wlock = threading.Lock()  # Chat and heartbeat writes come from different threads
+
+    def record_rx(self, nbytes: int):
+        self.bytes_in += nbytes
+        self.msgs_in += 1
+        self.last_rx = time.monotonic()
+
+    def record_tx(self, nbytes: int):
+        self.bytes_out += nbytes
+        self.msgs_out += 1
+        self.last_tx = time.monotonic()
+
+    def send(self, data: bytes, blocking: bool = True) -> bool:
+        """Writes data to the connection, one writer at a time.
+
+        With blocking=False it returns False instead of waiting for another
+        writer or for room in a full send buffer (a stalled peer), so timer
+        callbacks can never hang on a session.
+
+        Raises:
+            OSError: If the connection is broken
+        """
+        if not self._wlock.acquire(blocking):
+            return False
+        try:
+            if not blocking:
+                _, writable, _ = select.select([], [self.conn], [], 0)
+                if not writable:
+                    return False
+            self.conn.write(data)
+            return True
+        finally:
+            self._wlock.release()
+
+    def record_size(self) -> int:
+        """Approximate bytes held by this record itself (the socket and thread are not counted)."""
+        size = sys.getsizeof(self)
+        for name in ("peer_id", "cipher", "version", "serial", "not_after", "rtt", "_wlock"):
+            value = getattr(self, name)
+            if value is not None:
+                size += sys.getsizeof(value)
+        return size
     
     def close(self):
         """Safely close the connection."""
         if not self._closed:
+            try:
+                # Shut down first so a recv_loop blocked in read() wakes up
+                self.conn.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
             try:
                 self.conn.close()
             except:
@@ -28,15 +114,80 @@ class SessionState:
             self._closed = True
     
     def is_closed(self):
-        return self._closed
+        # recv_loop closes the socket directly when the peer goes away
+        return self._closed or self.conn.fileno() == -1
+
+
+class SessionRegistry:
+    """All live sessions, with aggregate traffic and memory figures.
+
+    Only add/remove take the lock; stats() works on a copy of the session
+    list, so reporting never blocks the per-message counter updates.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[int, SessionState] = {}  # id(session) -> session
+
+    def add(self, session: SessionState):
+        with self._lock:
+            self._sessions[id(session)] = session
+
+    def remove(self, session: SessionState):
+        with self._lock:
+            self._sessions.pop(id(session), None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def sessions(self) -> List[SessionState]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stats(self) -> dict:
+        """Returns session count, traffic totals and record memory (bytes)."""
+        sessions = self.sessions()
+        out = {"sessions": len(sessions), "bytes_in": 0, "bytes_out": 0, "msgs_in": 0, "msgs_out": 0,
+               "record_bytes": 0, "max_record_bytes": 0}
+        for s in sessions:
+            out["bytes_in"] += s.bytes_in
+            out["bytes_out"] += s.bytes_out
+            out["msgs_in"] += s.msgs_in
+            out["msgs_out"] += s.msgs_out
+            size = s.record_size()
+            out["record_bytes"] += size
+            out["max_record_bytes"] = max(out["max_record_bytes"], size)
+        out["record_bytes_per_session"] = round(out["record_bytes"] / len(sessions), 1) if sessions else 0.0
+        # The registry's own index counts too
+        out["registry_bytes"] = sys.getsizeof(self._sessions)
+        return out
+
+def _handle_control(conn: ssl.SSLSocket, data: bytes, session: Optional[SessionState],
+                    on_pong: Optional[Callable[[SessionState, int], None]]) -> bytes:
+    """Answers PINGs and reports PONGs found in data; returns the remaining chat bytes."""
+    for match in _CONTROL_FRAME.finditer(data):
+        kind, seq = match.group(1), int(match.group(2))
+        if kind == b"PING":
+            reply = control_frame(b"PONG", seq)
+            if session is not None:
+                session.send(reply)
+            else:
+                conn.write(reply)
+        elif on_pong is not None and session is not None:
+            on_pong(session, seq)
+    return _CONTROL_FRAME.sub(b"", data)
+
 
-def recv_loop(conn: ssl.SSLSocket, peer_id: str, on_disconnect: Optional[Callable] = None):
+def recv_loop(conn: ssl.SSLSocket, peer_id: str, on_disconnect: Optional[Callable] = None,
+              session: Optional[SessionState] = None,
+              on_pong: Optional[Callable[[SessionState, int], None]] = None):
     """Handles continuous secure reading in a background thread.
     
     Args:
         conn: The SSL socket to read from
         peer_id: The identifier of the peer
         on_disconnect: Optional callback function to call when connection is lost
+        session: Optional session whose receive counters are updated
+        on_pong: Optional callback for heartbeat replies (see app/heartbeat.py)
     """
     
     # Ensure the socket is in blocking mode for reliable reading
@@ -50,6 +201,18 @@ def recv_loop(conn: ssl.SSLSocket, peer_id: str, on_disconnect: Optional[Callabl
             if not data:
                 # Peer performed a graceful close (empty read on open socket)
                 raise ConnectionResetError("Peer closed connection")
+            if CONTROL_PREFIX in data:
+                data = _handle_control(conn, data, session, on_pong)
+                if not data:
+                    if session is not None:
+                        session.last_rx = time.monotonic()  # Heartbeats count as activity
+                    continue
+            if session is not None and session.parked:
+                # Nobody is chatting on a parked session: close it so the peer
+                # sees the disconnect instead of talking to no one
+                break
+            if session is not None:
+                session.record_rx(len(data))
             
             # Print decrypted message
             print(f"\n{COLOR_PEER}[{peer_id}] > {data.decode()}{COLOR_RESET}")
@@ -75,19 +238,25 @@ def recv_loop(conn: ssl.SSLSocket, peer_id: str, on_disconnect: Optional[Callabl
     if on_disconnect:
         on_disconnect()
 
-def chat_send(conn: ssl.SSLSocket, message: str) -> bool:
+def chat_send(conn: ssl.SSLSocket, message: str, session: Optional[SessionState] = None) -> bool:
     """Encrypts and sends a message over the established TLS connection.
     
     Args:
         conn: The SSL socket to write to
         message: The message to send
+        session: Optional session whose send counters are updated
         
     Returns:
         True if successful, False otherwise
     """
     
     try:
-        conn.write(message.encode('utf-8'))
+        data = message.encode('utf-8')
+        if session is not None:
+            session.send(data)
+            session.record_tx(len(data))
+        else:
+            conn.write(data)
         return True
     except (BrokenPipeError, OSError) as e:
         print(f"{COLOR_ERROR}[ERROR] Failed to send: Connection lost{COLOR_RESET}")
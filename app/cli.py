@@ -1,4 +1,6 @@
+import os
 import sys
+import time
 import threading
 import socket
 import ssl
@@ -7,9 +9,19 @@ from threading import Lock
 
 # Import everything from the other modules
 from .utils import COLOR_SUCCESS, COLOR_ME, MY_USER_ID, LISTEN_TCP_PORT
-from .utils import COLOR_RESET, COLOR_ERROR, create_ssl_context
-from .handshake import initiate_tls_handshake, handle_incoming_connection
-from .channel import SessionState, recv_loop, chat_send
+from .utils import COLOR_RESET, COLOR_ERROR, USER_CERT_PATH, CA_ROOT_PATH, create_ssl_context
+from . import utils
+from .handshake import initiate_tls_handshake, handle_incoming_connection, TRANSPORT_FAILURE
+from .channel import SessionState, SessionRegistry, recv_loop, chat_send
+from .pool import SessionPool
+from .discovery import DiscoveryService, PeerDirectory, der_fingerprint
+from . import stapling
+from .timerwheel import TimerWheel
+from .revocation import SessionIndex, CrlWatcher
+from .admission import AdmissionController
+from .profiles import PROFILES, get_profile
+from .heartbeat import HeartbeatMonitor, HEARTBEAT_INTERVAL
+from .renewal import ContextHolder, RenewalAgent
 
 class TLSClient:
     def __init__(self):
@@ -17,16 +29,76 @@ class TLSClient:
         self.active_conn: Optional[SessionState] = None
         self._conn_lock = Lock()
         self._listener_sock: Optional[socket.socket] = None
+        # Credentials for our identity, loaded once and swapped when the cert is renewed
+        self.contexts = ContextHolder()
+        self.renewal: Optional[RenewalAgent] = None
+        # Outbound sessions are parked here on 'disconnect' so reconnects skip the handshake
+        self.pool = SessionPool(connect=self._initiate)
+        # Filled by LAN multicast announcements; lets 'connect <PEER_ID>' skip the address
+        self.directory = PeerDirectory()
+        self.discovery: Optional[DiscoveryService] = None
+        # Live sessions by peer serial/expiry: CRL changes and cert expiry close them mid-session
+        self.wheel = TimerWheel()
+        self.sessions = SessionIndex(self.wheel, on_close=self._on_session_revoked)
+        self.crl_watcher = CrlWatcher(self.sessions, ca_path=CA_ROOT_PATH)
+        # Every session with a running receiver, for the 'sessions' accounting command
+        self.registry = SessionRegistry()
+        # Rate limits and failure bans, checked before any handshake work
+        self.admission = AdmissionController()
+        # Pings quiet sessions and drops dead peers, on the same wheel as cert expiry
+        self.heartbeats: Optional[HeartbeatMonitor] = None
+        if HEARTBEAT_INTERVAL > 0:
+            self.heartbeats = HeartbeatMonitor(self.wheel, on_dead=self._on_peer_dead)
 
-    def _on_disconnect(self):
-        """Callback when connection is lost."""
+    def _on_session_revoked(self, session: SessionState, reason: str):
+        """Callback when the session index tears a session down."""
+        print(f"\n{COLOR_ERROR}[INFO] Closing session with {session.peer_id}: {reason}.{COLOR_RESET}")
+
+    def _initiate(self, host: str, port: int, expected_peer_id: Optional[str] = None,
+                  profile: Optional[str] = None) -> Optional[SessionState]:
+        """Outbound handshake for the pool, using the current (possibly renewed) identity."""
+        try:
+            credentials = self.contexts.credentials
+        except Exception as e:
+            print(f"{COLOR_ERROR}[ERROR] Could not load TLS identity: {e}{COLOR_RESET}")
+            return None
+        return initiate_tls_handshake(host, port, expected_peer_id, profile=profile, credentials=credentials)
+
+    def _on_peer_dead(self, session: SessionState, idle: float):
+        """Callback when the heartbeat monitor gives up on a silent peer."""
+        print(f"\n{COLOR_ERROR}[INFO] No response from {session.peer_id} for {idle:.0f}s; closing session.{COLOR_RESET}")
+
+    def _on_disconnect(self, session: SessionState):
+        """Callback when a session's connection is lost."""
+        if self.heartbeats:
+            self.heartbeats.remove(session)
+        self.sessions.remove(session)
+        self.registry.remove(session)
+        self.pool.discard(session)
         with self._conn_lock:
-            if self.active_conn:
-                self.active_conn.close()
-                self.active_conn = None
+            if self.active_conn is not session:
+                return  # An idle pooled session went away; nothing to report
+            self.active_conn = None
         print(f"\n{COLOR_ERROR}[INFO] Disconnected. Ready for new connection.{COLOR_RESET}")
         print("\n> ", end="", flush=True)
 
+    def _start_receiver(self, session: SessionState):
+        """Starts the recv_loop thread for a session (once per session)."""
+        if session.receiver is not None and session.receiver.is_alive():
+            return
+        self.sessions.add(session)
+        self.registry.add(session)
+        on_pong = None
+        if self.heartbeats:
+            self.heartbeats.add(session)
+            on_pong = self.heartbeats.handle_pong
+        session.receiver = threading.Thread(
+            target=recv_loop,
+            args=(session.conn, session.peer_id, lambda: self._on_disconnect(session), session, on_pong),
+            daemon=True
+        )
+        session.receiver.start()
+
     # --- Server/Responder Logic ---
     def _tcp_listener_loop(self):
         """Background thread that listens for incoming TLS connections."""
@@ -35,6 +107,8 @@ class TLSClient:
         self._listener_sock = sock
 
         try:
+            # Accepted sockets inherit the listener profile's buffer sizes and NODELAY
+            get_profile(utils.TLS_PROFILE).apply_socket(sock)
             sock.bind(('0.0.0.0', LISTEN_TCP_PORT))
             sock.listen(1)
             sock.settimeout(1.0)  # Allow periodic checks of _running flag
@@ -56,7 +130,24 @@ class TLSClient:
                         raw_conn.close()
                         continue
                 
-                session = handle_incoming_connection(raw_conn, addr)
+                if self.admission.admit(addr[0]) is not None:
+                    raw_conn.close()  # Rejected before spending a handshake on it
+                    continue
+                try:
+                    credentials = self.contexts.credentials
+                except Exception:
+                    credentials = None  # handle_incoming_connection reports the broken identity
+                outcome, session = {}, None
+                try:
+                    session = handle_incoming_connection(raw_conn, addr, credentials=credentials, outcome=outcome)
+                finally:
+                    # A broken connection says nothing about the peer's identity, so only failed authentication scores
+                    ban = self.admission.release(addr[0], authenticated=None
+                                                 if outcome.get("failure") == TRANSPORT_FAILURE
+                                                 else session is not None)
+                if ban:
+                    print(f"{COLOR_ERROR}[INFO] Ignoring {addr[0]} for {ban:.0f}s after repeated "
+                          f"authentication failures.{COLOR_RESET}")
                 
                 if session:
                     print(f"{COLOR_SUCCESS}[SUCCESS] TLS established. Peer ID: {session.peer_id}{COLOR_RESET}")
@@ -66,11 +157,7 @@ class TLSClient:
                         self.active_conn = session
                     
                     # Start receive thread with disconnect callback
-                    threading.Thread(
-                        target=recv_loop, 
-                        args=(session.conn, session.peer_id, self._on_disconnect), 
-                        daemon=True
-                    ).start()
+                    self._start_receiver(session)
 
             except socket.timeout:
                 continue  # Check _running flag
@@ -85,8 +172,12 @@ class TLSClient:
             pass
 
     # --- Client/Initiator Logic ---
-    def connect_peer(self, ip: str, port: int):
-        """Initiate a connection to a peer."""
+    def connect_peer(self, ip: str, port: int, peer_id: Optional[str] = None, profile: Optional[str] = None,
+                     fingerprint: Optional[str] = None):
+        """Initiate a connection to a peer, reusing a pooled session when possible.
+
+        With fingerprint, the peer's certificate must also hash to it (SHA-256 of the DER).
+        """
         with self._conn_lock:
             if self.active_conn and not self.active_conn.is_closed():
                 print(f"{COLOR_ERROR}ERROR: Already connected. Use 'disconnect' first.{COLOR_RESET}")
@@ -94,32 +185,121 @@ class TLSClient:
 
         print(f"Attempting secure connection to {ip}:{port}...")
         
-        session = initiate_tls_handshake(ip, port)
+        session = self.pool.acquire(ip, port, peer_id, profile)
+
+        if session and fingerprint is not None:
+            try:
+                presented = der_fingerprint(session.conn.getpeercert(binary_form=True) or b"")
+            except (OSError, ValueError):
+                presented = None
+            if presented != fingerprint.lower():
+                print(f"{COLOR_ERROR}[ERROR] {ip}:{port} presented a certificate for {session.peer_id} "
+                      f"that is not the one it announced (fp={str(presented)[:16]}); closing.{COLOR_RESET}")
+                self.pool.discard(session)
+                return
         
         if session:
-            print(f"{COLOR_SUCCESS}[SUCCESS] TLS established. Peer ID: {session.peer_id}{COLOR_RESET}")
+            # Only a pooled session already has a receive thread running
+            if session.receiver is not None:
+                print(f"{COLOR_SUCCESS}[SUCCESS] Reusing pooled TLS session. Peer ID: {session.peer_id}{COLOR_RESET}")
+            else:
+                print(f"{COLOR_SUCCESS}[SUCCESS] TLS established. Peer ID: {session.peer_id}{COLOR_RESET}")
             
             with self._conn_lock:
                 self.active_conn = session
             
             # Start receive thread with disconnect callback
-            threading.Thread(
-                target=recv_loop, 
-                args=(session.conn, session.peer_id, self._on_disconnect), 
-                daemon=True
-            ).start()
-
-    def disconnect(self):
-        """Manually disconnect from current peer."""
+            self._start_receiver(session)
+
+    def connect_by_id(self, peer_id: str, profile: Optional[str] = None):
+        """Connect to a peer found by discovery, pinning its certificate CN and announced fingerprint."""
+        entry = self.directory.resolve(peer_id)
+        if entry is None:
+            print(f"{COLOR_ERROR}ERROR: Unknown peer '{peer_id}'. Use 'peers' to list discovered peers.{COLOR_RESET}")
+            return
+        if not entry.fingerprint:
+            print(f"{COLOR_ERROR}ERROR: '{peer_id}' announced no certificate fingerprint; "
+                  f"connect by address instead.{COLOR_RESET}")
+            return
+        self.connect_peer(entry.host, entry.port, peer_id, profile, fingerprint=entry.fingerprint)
+
+    def show_peers(self):
+        """Display peers currently in the discovery directory."""
+        if self.discovery is None:
+            print(f"{COLOR_ERROR}Discovery is disabled.{COLOR_RESET}")
+            return
+        peers = self.directory.peers()
+        if not peers:
+            print("No peers discovered yet.")
+        for entry in peers:
+            print(f"  {entry.peer_id:<20} {entry.host}:{entry.port}  fp={entry.fingerprint[:16]}")
+
+    def _start_discovery(self):
+        """Start LAN discovery unless disabled with DISCOVERY=0."""
+        if os.environ.get("DISCOVERY", "1") == "0":
+            return
+        service = DiscoveryService(MY_USER_ID, LISTEN_TCP_PORT, USER_CERT_PATH, directory=self.directory)
+        try:
+            service.start()
+        except OSError as e:
+            print(f"{COLOR_ERROR}[WARN] Peer discovery unavailable: {e}{COLOR_RESET}")
+            service.stop()
+            return
+        self.discovery = service
+
+    def disconnect(self, close: bool = False):
+        """Manually disconnect from current peer.
+
+        Outbound sessions are returned to the pool for reuse unless close is set.
+        """
         with self._conn_lock:
             if not self.active_conn or self.active_conn.is_closed():
                 print("ERROR: Not connected.")
                 return
             
-            self.active_conn.close()
+            session = self.active_conn
             self.active_conn = None
+
+        if not close and self.pool.owns(session):
+            self.pool.release(session)
+            print(f"{COLOR_SUCCESS}Disconnected successfully (session kept for reuse).{COLOR_RESET}")
+        else:
+            self.pool.discard(session)
             print(f"{COLOR_SUCCESS}Disconnected successfully.{COLOR_RESET}")
 
+    def show_pool(self):
+        """Display session pool statistics."""
+        stats = self.pool.stats()
+        print(f"Pool: {stats['in_use']} in use, {stats['idle']} idle | "
+              f"acquires={stats['acquires']} reused={stats['reused']} "
+              f"reuse_ratio={stats['reuse_ratio']:.0%}")
+        print(f"      connects={stats['connects']} failures={stats['connect_failures']} "
+              f"rejected_cap={stats['rejected_cap']} evicted(idle/expired/unhealthy)="
+              f"{stats['evicted_idle']}/{stats['evicted_expired']}/{stats['evicted_unhealthy']}")
+
+    def show_sessions(self):
+        """Display per-session traffic and aggregate session memory."""
+        now = time.monotonic()
+        for s in self.registry.sessions():
+            rtt = f"{s.rtt * 1000.0:.1f} ms" if s.rtt is not None else "-"
+            print(f"  {s.peer_id:<16} {s.version or '?'} {s.cipher or '?'} | in {s.msgs_in} msgs/{s.bytes_in} B, "
+                  f"out {s.msgs_out} msgs/{s.bytes_out} B | idle {now - max(s.last_rx, s.last_tx):.0f}s | rtt {rtt}")
+        stats = self.registry.stats()
+        print(f"Sessions: {stats['sessions']} | in={stats['bytes_in']} B out={stats['bytes_out']} B | "
+              f"records={stats['record_bytes']} B ({stats['record_bytes_per_session']} B/session)")
+        if self.heartbeats:
+            hb = self.heartbeats.stats()
+            print(f"Heartbeats: every {self.heartbeats.interval:.0f}s, timeout {self.heartbeats.idle_timeout:.0f}s | "
+                  f"pings={hb['pings']} pongs={hb['pongs']} timeouts={hb['timeouts']}")
+
+    def show_admission(self):
+        """Display incoming-connection admission counters."""
+        stats = self.admission.stats()
+        print(f"Admission: admitted={stats['admitted']} failures={stats['failures']} "
+              f"bans={stats['bans']} (active {stats['banned_now']})")
+        print(f"      rejected banned/concurrency/source_rate/global_rate="
+              f"{stats['banned']}/{stats['concurrency']}/{stats['source_rate']}/{stats['global_rate']}")
+
     def send_message(self, message: str):
         """Send a message to the connected peer."""
         with self._conn_lock:
@@ -127,13 +307,13 @@ class TLSClient:
                 print(f"{COLOR_ERROR}ERROR: Not connected.{COLOR_RESET}")
                 return
             
-            success = chat_send(self.active_conn.conn, message)
+            success = chat_send(self.active_conn.conn, message, self.active_conn)
             
             if success:
                 print(f"{COLOR_ME}[Me] > {message}{COLOR_RESET}")
             else:
                 # Connection lost during send
-                self.active_conn.close()
+                self.pool.discard(self.active_conn)
                 self.active_conn = None
 
     def show_status(self):
@@ -143,17 +323,43 @@ class TLSClient:
                 print(f"{COLOR_SUCCESS}Status: Connected to {self.active_conn.peer_id}{COLOR_RESET}")
             else:
                 print(f"{COLOR_ERROR}Status: Not connected{COLOR_RESET}")
+        if self.renewal:
+            try:
+                renew_at = self.renewal.renew_at().strftime("%Y-%m-%d %H:%M UTC")
+            except Exception as e:
+                renew_at = f"unknown ({e})"
+            print(f"Certificate renewals: {self.renewal.renewals} | next renewal due {renew_at}")
             
     def run(self):
         """Main client loop."""
         threading.Thread(target=self._tcp_listener_loop, daemon=True).start()
+        self.pool.start_reaper()
+        self.wheel.start()
+        self.crl_watcher.start()
+        self._start_discovery()
+        if os.environ.get("AUTO_RENEW", "1") == "1" and os.path.exists(USER_CERT_PATH):
+            # Renews our short-lived cert in the background; new handshakes pick it up at once
+            self.renewal = RenewalAgent(MY_USER_ID, self.contexts)
+            if utils.STAPLING:
+                # Our staple must cover the new serial straight away
+                self.renewal.on_renewed.append(lambda _: stapling.start_fetcher(USER_CERT_PATH).refresh())
+            self.renewal.start()
+        if utils.STAPLING:
+            # Keep a fresh status statement for our own cert to staple to handshakes
+            stapling.start_fetcher(USER_CERT_PATH)
         print(f"{COLOR_SUCCESS}\n*** First Contact Client (TLS/Certificate Demo) ***{COLOR_RESET}")
         print(f"My ID: {MY_USER_ID} | Listening on port {LISTEN_TCP_PORT}")
         print("\nCommands:")
-        print("  connect <IP> <PORT>  - Connect to a peer")
+        print("  connect <IP> <PORT> [PEER_ID]  - Connect to a peer (optionally pinning its ID)")
+        print("  connect <PEER_ID>    - Connect to a discovered peer")
+        print("  connect ... --profile NAME - Use a TLS profile (default, low-latency, bulk)")
+        print("  peers                - List peers discovered on the network")
         print("  send <MSG>           - Send a message")
-        print("  disconnect           - Close current connection")
+        print("  disconnect [--close] - Leave current connection (kept for reuse unless --close)")
         print("  status               - Show connection status")
+        print("  pool                 - Show session pool statistics")
+        print("  sessions             - Show per-session traffic, RTT and memory")
+        print("  admission            - Show incoming-connection admission statistics")
         print("  exit                 - Quit the application")
         
         try:
@@ -167,14 +373,26 @@ class TLSClient:
                 
                 if command == 'connect':
                     args = user_input.split()
-                    if len(args) == 3:
+                    profile = None
+                    if len(args) >= 2 and args[-2] == '--profile':
+                        profile = args[-1]
+                        args = args[:-2]
+                        if profile not in PROFILES:
+                            print(f"{COLOR_ERROR}Unknown TLS profile: {profile} (choose from {', '.join(PROFILES)}){COLOR_RESET}")
+                            continue
+                    if len(args) == 2:
+                        self.connect_by_id(args[1], profile)
+                    elif len(args) in (3, 4):
                         ip, port_str = args[1], args[2]
+                        peer_id = args[3] if len(args) == 4 else None
                         try:
-                            self.connect_peer(ip, int(port_str))
+                            port = int(port_str)
                         except ValueError: 
                             print(f"{COLOR_ERROR}Invalid port number.{COLOR_RESET}")
+                        else:
+                            self.connect_peer(ip, port, peer_id, profile)
                     else: 
-                        print(f"{COLOR_ERROR}Usage: connect <IP> <PORT>{COLOR_RESET}")
+                        print(f"{COLOR_ERROR}Usage: connect <IP> <PORT> [PEER_ID] | connect <PEER_ID> [--profile NAME]{COLOR_RESET}")
                 
                 elif command == 'send':
                     if len(parts) < 2: 
@@ -184,11 +402,23 @@ class TLSClient:
                         self.send_message(message)
                 
                 elif command == 'disconnect':
-                    self.disconnect()
+                    self.disconnect(close=user_input.split()[1:] == ['--close'])
                 
                 elif command == 'status':
                     self.show_status()
                 
+                elif command == 'pool':
+                    self.show_pool()
+                
+                elif command == 'sessions':
+                    self.show_sessions()
+                
+                elif command == 'admission':
+                    self.show_admission()
+                
+                elif command == 'peers':
+                    self.show_peers()
+                
                 elif command == 'exit' or command == 'quit':
                     break
                 
@@ -205,10 +435,17 @@ class TLSClient:
         print("\nShutting down client...")
         self._running = False
         
-        # Close active connection
+        # Close active connection and any pooled sessions
         with self._conn_lock:
             if self.active_conn:
                 self.active_conn.close()
+        self.pool.close_all()
+        self.crl_watcher.stop()
+        self.wheel.stop()
+        if self.renewal:
+            self.renewal.stop()
+        if self.discovery:
+            self.discovery.stop()
         
         # Close listener socket to unblock accept()
         if self._listener_sock:
@@ -0,0 +1,96 @@
+"""
+One identity's TLS material, as an object instead of app.utils' path globals.
+
+Credentials reads the CA certificate once and keeps it in memory: contexts
+load it with `cadata`, and peer validation uses the parsed trust anchor, so
+neither touches the CA file again. Contexts are built once per (side, TLS
+profile) and then shared. An SSLContext may be used from several threads at
+once, so one Credentials object can serve concurrent handshakes, and several
+objects can coexist in one process (multi-identity nodes, parallel tests).
+
+Python's ssl module loads a certificate chain and key only from files, so
+those are read when a context is first built, once per side and profile.
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from . import utils
+from .utils import create_ssl_context
+from .profiles import get_profile
+
+
+class Credentials:
+    """A CA to trust and our certificate/key, shared by every handshake that uses them.
+
+    Raises:
+        FileNotFoundError: If any of the files is missing
+    """
+    def __init__(self, ca_path: str, cert_path: str, key_path: str):
+        for kind, path in (("CA certificate", ca_path), ("User certificate", cert_path), ("User key", key_path)):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{kind} not found: {path}")
+        with open(ca_path, "rb") as f:
+            self.ca_pem = f.read()
+        self.ca_path = ca_path
+        self.cert_path = cert_path
+        self.key_path = key_path
+        self._lock = threading.Lock()
+        self._contexts: Dict[Tuple[bool, str], object] = {}
+        self._anchor = None
+        self._cert = None
+
+    @classmethod
+    def from_config(cls, ca_path: Optional[str] = None, cert_path: Optional[str] = None,
+                    key_path: Optional[str] = None) -> "Credentials":
+        """Credentials for the configured identity (app.utils paths, read now)."""
+        return cls(ca_path or utils.CA_ROOT_PATH, cert_path or utils.USER_CERT_PATH,
+                   key_path or utils.USER_KEY_PATH)
+
+    def context(self, is_server: bool, profile=None):
+        """The shared context for this side and profile (default utils.TLS_PROFILE)."""
+        key = (is_server, get_profile(profile or utils.TLS_PROFILE).name)
+        context = self._contexts.get(key)
+        if context is None:
+            with self._lock:
+                context = self._contexts.get(key)
+                if context is None:
+                    context = create_ssl_context(is_server=is_server, cert_path=self.cert_path,
+                                                 key_path=self.key_path, profile=key[1],
+                                                 cadata=self.ca_pem.decode("ascii"))
+                    self._contexts = {**self._contexts, key: context}
+        return context
+
+    def built(self):
+        """The (is_server, profile name) pairs that have a context already."""
+        return list(self._contexts)
+
+    @property
+    def anchor(self):
+        """The CA as a certificate_validation.TrustAnchor, parsed on first use."""
+        if self._anchor is None:
+            import certificate_validation
+
+            self._anchor = certificate_validation.TrustAnchor(
+                certificate_validation.load_certificate(self.ca_pem),
+                intermediates_dir=os.path.join(os.path.dirname(self.ca_path), "intermediates"))
+        return self._anchor
+
+    @property
+    def certificate(self):
+        """Our own (leaf) certificate, parsed on first use."""
+        if self._cert is None:
+            from cryptography import x509
+
+            with open(self.cert_path, "rb") as f:
+                self._cert = x509.load_pem_x509_certificate(f.read())
+        return self._cert
+
+    @property
+    def name(self) -> str:
+        """Our peer_id: the certificate's CN."""
+        from cryptography.x509.oid import NameOID
+
+        attrs = self.certificate.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+        return attrs[0].value if attrs else 'Unknown'
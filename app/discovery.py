@@ -0,0 +1,248 @@
+import os
+import ssl
+import json
+import math
+import time
+import random
+import socket
+import struct
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional
+
+# --- Discovery configuration ---
+DISCOVERY_GROUP = os.environ.get("DISCOVERY_GROUP", "239.255.70.67")
+DISCOVERY_PORT = int(os.environ.get("DISCOVERY_PORT", 7099))
+ANNOUNCE_VERSION = 1
+MAX_DATAGRAM = 1024
+
+
+class PeerEntry:
+    """A peer learned from a discovery announcement."""
+    def __init__(self, peer_id: str, host: str, port: int, fingerprint: str, expires_at: float):
+        self.peer_id = peer_id
+        self.host = host
+        self.port = port
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"PeerEntry({self.peer_id!r}, {self.host}:{self.port}, fp={self.fingerprint[:16]})"
+
+
+class PeerDirectory:
+    """In-memory peer_id -> address map whose entries expire after their announced TTL."""
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._peers: Dict[str, PeerEntry] = {}
+
+    def update(self, peer_id: str, host: str, port: int, fingerprint: str, ttl: float) -> bool:
+        """Adds or refreshes a peer. Returns True if the peer is new or its record changed."""
+        expires_at = self._clock() + ttl
+        with self._lock:
+            entry = self._peers.get(peer_id)
+            if entry and (entry.host, entry.port, entry.fingerprint) == (host, port, fingerprint):
+                entry.expires_at = expires_at
+                return False
+            self._peers[peer_id] = PeerEntry(peer_id, host, port, fingerprint, expires_at)
+            return True
+
+    def resolve(self, peer_id: str) -> Optional[PeerEntry]:
+        """Returns the live entry for peer_id, or None if unknown or expired."""
+        with self._lock:
+            entry = self._peers.get(peer_id)
+            if entry and entry.expires_at <= self._clock():
+                del self._peers[peer_id]
+                return None
+            return entry
+
+    def expire(self) -> int:
+        """Drops expired entries. Returns how many were removed."""
+        now = self._clock()
+        with self._lock:
+            stale = [pid for pid, e in self._peers.items() if e.expires_at <= now]
+            for pid in stale:
+                del self._peers[pid]
+        return len(stale)
+
+    def peers(self) -> List[PeerEntry]:
+        """Returns all live entries, sorted by peer_id."""
+        self.expire()
+        with self._lock:
+            return sorted(self._peers.values(), key=lambda e: e.peer_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._peers)
+
+
+def cert_fingerprint(cert_path: str) -> str:
+    """SHA-256 fingerprint (hex) of the DER encoding of a PEM certificate file.
+
+    Chain files (leaf followed by intermediates) are fingerprinted by the leaf.
+    """
+    with open(cert_path, "r", encoding="ascii") as f:
+        leaf = f.read().split(ssl.PEM_FOOTER)[0] + ssl.PEM_FOOTER
+    return der_fingerprint(ssl.PEM_cert_to_DER_cert(leaf))
+
+
+def der_fingerprint(der: bytes) -> str:
+    """SHA-256 fingerprint (hex) of a DER certificate, as announced by cert_fingerprint()."""
+    return hashlib.sha256(der).hexdigest()
+
+
+class DiscoveryService:
+    """Announces this peer over UDP multicast and feeds a PeerDirectory.
+
+    Announcements carry peer_id, TCP port, certificate fingerprint and a TTL.
+    A changed record is announced right away (at most once per
+    `min_interval`); an unchanged one is only refreshed before its TTL runs
+    out. The refresh interval grows with the number of known peers so the
+    fleet as a whole sends about `target_rate` announcements per second, and
+    is jittered so peers don't synchronize.
+    """
+    def __init__(self, peer_id: str, port: int, cert_path: str,
+                 directory: Optional[PeerDirectory] = None,
+                 group: str = DISCOVERY_GROUP, mcast_port: int = DISCOVERY_PORT,
+                 target_rate: float = 1.0, min_interval: float = 2.0, max_interval: float = 300.0):
+        self.peer_id = peer_id
+        self.port = port
+        self.cert_path = cert_path
+        self.directory = directory if directory is not None else PeerDirectory()
+        self.group = group
+        self.mcast_port = mcast_port
+        self.target_rate = target_rate
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # suppressed: changed records held back by min_interval (each counted once)
+        self.stats = {"sent": 0, "suppressed": 0, "received": 0, "ignored": 0}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._send_sock: Optional[socket.socket] = None
+        self._recv_sock: Optional[socket.socket] = None
+        self._cert_mtime = None
+        self._fingerprint = ""
+        self._threads: List[threading.Thread] = []
+
+    # --- Announcement encoding ---
+    def _current_record(self) -> dict:
+        try:
+            mtime = os.path.getmtime(self.cert_path)
+            if mtime != self._cert_mtime:
+                self._fingerprint = cert_fingerprint(self.cert_path)
+                self._cert_mtime = mtime
+        except (OSError, ValueError):
+            pass  # Keep announcing the last known fingerprint
+        return {"v": ANNOUNCE_VERSION, "peer_id": self.peer_id, "port": self.port, "fp": self._fingerprint}
+
+    def base_interval(self) -> float:
+        """Refresh interval that keeps fleet-wide chatter near target_rate."""
+        fleet = len(self.directory) + 1
+        return min(self.max_interval, max(self.min_interval, fleet / self.target_rate))
+
+    def _handle_datagram(self, data: bytes, addr) -> bool:
+        """Parses one announcement and updates the directory. Returns True if accepted."""
+        try:
+            msg = json.loads(data.decode("utf-8"))
+            if msg.get("v") != ANNOUNCE_VERSION:
+                raise ValueError("unsupported version")
+            peer_id = str(msg["peer_id"])
+            port = int(msg["port"])
+            fingerprint = str(msg["fp"])
+            ttl = float(msg["ttl"])
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+            self.stats["ignored"] += 1
+            return False
+        if peer_id == self.peer_id or not (0 < port < 65536) or ttl <= 0:
+            self.stats["ignored"] += 1
+            return False
+        self.stats["received"] += 1
+        if self.directory.update(peer_id, addr[0], port, fingerprint, ttl):
+            # Directory grew or changed: our refresh interval may need to stretch
+            self._wake.set()
+        return True
+
+    # --- Sockets ---
+    def _open_sockets(self):
+        recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            try:
+                recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        recv_sock.bind(("", self.mcast_port))
+        mreq = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("0.0.0.0"))
+        recv_sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        recv_sock.settimeout(1.0)  # Allow periodic checks of the stop flag
+
+        send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        send_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)  # Stay on the LAN
+        send_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)  # Peers on this host too
+        self._recv_sock, self._send_sock = recv_sock, send_sock
+
+    def _announce(self, record: dict, ttl: float):
+        payload = json.dumps(dict(record, ttl=round(ttl, 1)), sort_keys=True).encode("utf-8")
+        self._send_sock.sendto(payload, (self.group, self.mcast_port))
+        self.stats["sent"] += 1
+
+    # --- Threads ---
+    def _sender_loop(self):
+        # Random start-up delay so peers booted together don't announce in lockstep
+        next_refresh = time.monotonic() + random.uniform(0, self.min_interval)
+        last_sent_record, last_sent_at = None, -math.inf
+        held_back = None
+        while not self._stop.is_set():
+            now = time.monotonic()
+            record = self._current_record()
+            changed = record != last_sent_record
+            due = now >= next_refresh
+            if (changed and now - last_sent_at >= self.min_interval) or due:
+                interval = self.base_interval()
+                try:
+                    # TTL outlives a few jittered refreshes so one lost datagram doesn't drop us
+                    self._announce(record, ttl=3.5 * interval)
+                    last_sent_record, last_sent_at = record, now
+                except OSError:
+                    pass
+                next_refresh = now + interval * random.uniform(0.5, 1.5)
+            elif record != held_back:
+                held_back = record  # Sent once min_interval has passed
+                self.stats["suppressed"] += 1
+            self._wake.clear()
+            self._wake.wait(timeout=max(0.05, min(next_refresh - now, self.min_interval)))
+
+    def _receiver_loop(self):
+        while not self._stop.is_set():
+            try:
+                data, addr = self._recv_sock.recvfrom(MAX_DATAGRAM)
+            except socket.timeout:
+                self.directory.expire()
+                continue
+            except OSError:
+                break
+            self._handle_datagram(data, addr)
+
+    def start(self):
+        """Opens the multicast sockets and starts the sender/receiver threads.
+
+        Raises:
+            OSError: If the multicast group cannot be joined on this host
+        """
+        self._open_sockets()
+        for target in (self._sender_loop, self._receiver_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        """Stops announcing and listening."""
+        self._stop.set()
+        self._wake.set()
+        for sock in (self._send_sock, self._recv_sock):
+            if sock:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
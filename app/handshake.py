@@ -1,42 +1,145 @@
 import socket
 import ssl
-from typing import Optional
-from .utils import create_ssl_context, get_common_name, COLOR_ERROR, COLOR_RESET
+import datetime
+from typing import List, Optional
+from .utils import create_ssl_context, COLOR_ERROR, COLOR_RESET
 from . import utils
+from .credentials import Credentials
+from .sni import sni_name
+from .profiles import get_profile
 
 # Import necessary channel classes using relative path
 from .channel import SessionState, recv_loop
+from . import stapling
 
-# Certificate validation (enforces CRL checks)
-import certificate_validation
-from cryptography import x509
-from cryptography.hazmat.primitives import serialization
 
-def initiate_tls_handshake(ip: str, port: int) -> Optional[SessionState]:
-    """Client (Initiator) connects and performs mutual TLS handshake."""
+# Why a handshake failed, as recorded in handle_incoming_connection's `outcome`
+AUTH_FAILURE = "auth"            # the peer's certificate was missing, untrusted or failed validation
+TRANSPORT_FAILURE = "transport"  # the connection broke or never spoke TLS; says nothing about identity
+
+# OpenSSL reasons (besides SSLCertVerificationError) for a peer that didn't authenticate
+_AUTH_SSL_REASONS = frozenset({"PEER_DID_NOT_RETURN_A_CERTIFICATE", "CERTIFICATE_VERIFY_FAILED",
+                               "TLSV13_ALERT_CERTIFICATE_REQUIRED"})
+
+
+def _failure_kind(e: Exception) -> str:
+    if isinstance(e, ssl.SSLCertVerificationError) or \
+            (isinstance(e, ssl.SSLError) and getattr(e, "reason", None) in _AUTH_SSL_REASONS):
+        return AUTH_FAILURE
+    return TRANSPORT_FAILURE
+
+
+def _cert_not_after(cert) -> datetime.datetime:
+    """Returns the certificate's notAfter as a UTC-aware datetime."""
+    not_after = getattr(cert, "not_valid_after_utc", None)
+    if not_after is None:
+        not_after = cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    return not_after
+
+
+def _peer_common_name(cert) -> str:
+    """Returns the certificate subject CN, or 'Unknown' (as get_common_name does)."""
+    from cryptography.x509.oid import NameOID
+
+    attrs = cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+    return attrs[0].value if attrs else 'Unknown'
+
+
+def _presented_intermediates(ssl_conn) -> List[bytes]:
+    """DER of the certificates the peer served after its leaf (its intermediates).
+
+    SSLSocket/SSLObject expose the chain publicly only from Python 3.13; the
+    underlying _ssl object has had it since 3.10. Without it, only the CA's
+    local intermediates directory can complete the chain.
+    """
+    get_chain = getattr(ssl_conn, "get_unverified_chain", None)
+    if get_chain is None:
+        get_chain = getattr(getattr(ssl_conn, "_sslobj", None), "get_unverified_chain", None)
+    if get_chain is None:
+        return []
+    chain = list(get_chain() or [])[1:]
+    return [c if isinstance(c, bytes) else c.public_bytes(ssl._ssl.ENCODING_DER) for c in chain]
+
+
+def _validate_peer(ssl_conn, der: Optional[bytes], expected_name: Optional[str],
+                   credentials: Optional[Credentials] = None):
+    """Application-level validation after the TLS handshake (CN, validity, CRL/staple).
+
+    The context trusts only our CA (`credentials`' or CA_ROOT_PATH), so a
+    certificate that got this far already chains to it; see utils.VALIDATION_MODE.
+
+    Works on the DER the TLS layer already has and the in-memory CA, so no
+    PEM round-trip or CA file read happens per handshake.
+
+    Returns:
+        (peer_id, parsed peer certificate)
+
+    Raises:
+        ValueError: On a missing certificate, mismatch, expiry or revocation
+    """
+    # Certificate validation (enforces CRL checks). Deferred until a peer
+    # actually connects so the CLI reaches its prompt without loading cryptography.
+    import certificate_validation
+
+    if der is None:
+        raise ValueError("No peer certificate presented")
+    peer_cert_obj = certificate_validation.load_certificate(der)
+    peer_id = _peer_common_name(peer_cert_obj)
+    if credentials is not None:
+        anchor = credentials.anchor
+    else:
+        anchor = certificate_validation.load_trust_anchor(utils.CA_ROOT_PATH)
+
+    presented = _presented_intermediates(ssl_conn)
+
+    peer_staple = None
+    if utils.STAPLING:
+        peer_staple = stapling.exchange_staples(ssl_conn, stapling.current_staple())
+
+    # This will raise ValueError on mismatch/expiry/revocation. The signature was
+    # checked by OpenSSL against the same CA unless full re-verification is asked for.
+    certificate_validation.validate_cert(peer_cert_obj, anchor, expected_name or peer_id,
+                                         staple=peer_staple, intermediates=presented,
+                                         verify_signature=utils.VALIDATION_MODE == "full")
+    return peer_id, peer_cert_obj
+
+
+def _session(peer_id: str, ssl_conn, peer_cert_obj) -> SessionState:
+    """Builds the session record for a validated connection."""
+    cipher = ssl_conn.cipher()
+    return SessionState(peer_id, ssl_conn, not_after=_cert_not_after(peer_cert_obj),
+                        serial=peer_cert_obj.serial_number, cipher=cipher[0] if cipher else None,
+                        version=ssl_conn.version())
+
+
+def initiate_tls_handshake(ip: str, port: int, expected_peer_id: Optional[str] = None,
+                           profile=None, context: Optional[ssl.SSLContext] = None,
+                           credentials: Optional[Credentials] = None) -> Optional[SessionState]:
+    """Client (Initiator) connects and performs mutual TLS handshake.
+
+    If expected_peer_id is given, the peer certificate's CN must match it;
+    otherwise the CN presented by the peer is accepted as its identity.
+    `profile` picks the TLS profile (see app/profiles.py), default utils.TLS_PROFILE.
+    The identity comes from `credentials` (see app/credentials.py), default
+    the app.utils paths; a prebuilt client `context` is used as is.
+    """
     try:
+        profile = get_profile(profile or utils.TLS_PROFILE)
         raw_sock = socket.create_connection((ip, port), timeout=5)
-        context = create_ssl_context(is_server=False)
+        profile.apply_socket(raw_sock)
+        if context is None:
+            context = credentials.context(False, profile) if credentials else \
+                create_ssl_context(is_server=False, profile=profile)
         
-        # Performs the TLS Handshake
-        ssl_conn = context.wrap_socket(raw_sock, server_hostname=ip)
-
-        # Get the peer certificate in binary and also a subject dict for CN
-        der = ssl_conn.getpeercert(binary_form=True)
-        peer_cert_dict = ssl_conn.getpeercert()
-        peer_id = get_common_name(peer_cert_dict['subject'])
+        # Performs the TLS Handshake. The peer_id goes out as SNI so a listener
+        # serving several identities (app/sni.py) can present the right one;
+        # without one no SNI is sent (the host we dialled names no identity).
+        ssl_conn = context.wrap_socket(raw_sock, server_hostname=sni_name(expected_peer_id))
 
         # Validate certificate (this enforces CRL checks in certificate_validation)
         try:
-            if der is None:
-                raise ValueError("No peer certificate presented")
-            peer_cert_obj = x509.load_der_x509_certificate(der)
-            peer_pem = peer_cert_obj.public_bytes(serialization.Encoding.PEM)
-            with open(utils.CA_ROOT_PATH, 'rb') as f:
-                ca_pem = f.read()
-
-            # This will raise ValueError on mismatch/expiry/revocation
-            certificate_validation.validate_cert(peer_pem, ca_pem, peer_id)
+            peer_id, peer_cert_obj = _validate_peer(ssl_conn, ssl_conn.getpeercert(binary_form=True),
+                                                    expected_peer_id, credentials)
         except Exception as e:
             try:
                 ssl_conn.close()
@@ -45,7 +148,7 @@ def initiate_tls_handshake(ip: str, port: int) -> Optional[SessionState]:
             print(f"{COLOR_ERROR}[ERROR] TLS Handshake failed (Authentication failure): {e}{COLOR_RESET}")
             return None
 
-        return SessionState(peer_id, ssl_conn)
+        return _session(peer_id, ssl_conn, peer_cert_obj)
 
     except ssl.SSLError as e:
         print(f"{COLOR_ERROR}[ERROR] TLS Handshake failed (Authentication failure): {e}{COLOR_RESET}")
@@ -55,42 +158,65 @@ def initiate_tls_handshake(ip: str, port: int) -> Optional[SessionState]:
         return None
 
 
-def handle_incoming_connection(raw_conn, addr) -> Optional[SessionState]:
-    """Server (Responder) accepts connection and performs mutual TLS handshake."""
+def handle_incoming_connection(raw_conn, addr, context: Optional[ssl.SSLContext] = None,
+                               profile=None, credentials: Optional[Credentials] = None,
+                               outcome: Optional[dict] = None) -> Optional[SessionState]:
+    """Server (Responder) accepts connection and performs mutual TLS handshake.
+
+    A listener handling many connections passes its `credentials` or server
+    `context` so the context is built once (and its session-ticket keys stay
+    the same); otherwise a fresh one is created from the configured identity.
+    `profile` (default utils.TLS_PROFILE) sets the socket options and, without
+    a context, the TLS settings; a passed context should have been built with
+    the same profile.
+
+    On failure, a passed `outcome` dict gets "failure" set to AUTH_FAILURE or
+    TRANSPORT_FAILURE, so admission control scores only the peers that
+    failed to authenticate.
+
+    The handshake must finish within utils.HANDSHAKE_TIMEOUT seconds (a
+    timeout is a TRANSPORT_FAILURE); the returned session's socket blocks.
+    """
+    if outcome is None:
+        outcome = {}
     try:
-        context = create_ssl_context(is_server=True)
+        profile = get_profile(profile or utils.TLS_PROFILE)
+        profile.apply_socket(raw_conn)
+        if context is None:
+            context = credentials.context(True, profile) if credentials else \
+                create_ssl_context(is_server=True, profile=profile)
         print(f"\n[+] Incoming connection from {addr[0]}:{addr[1]}. Initiating TLS handshake...")
 
-        # Performs the TLS Handshake
+        # Performs the TLS Handshake; a peer that stalls it is dropped
+        raw_conn.settimeout(utils.HANDSHAKE_TIMEOUT)
         ssl_conn = context.wrap_socket(raw_conn, server_side=True)
 
         # Retrieve peer cert and perform validation (including CRL)
-        der = ssl_conn.getpeercert(binary_form=True)
-        peer_cert_dict = ssl_conn.getpeercert()
-        peer_id = get_common_name(peer_cert_dict['subject'])
-
         try:
-            if der is None:
-                raise ValueError("No peer certificate presented")
-            peer_cert_obj = x509.load_der_x509_certificate(der)
-            peer_pem = peer_cert_obj.public_bytes(serialization.Encoding.PEM)
-            with open(utils.CA_ROOT_PATH, 'rb') as f:
-                ca_pem = f.read()
-
-            certificate_validation.validate_cert(peer_pem, ca_pem, peer_id)
+            peer_id, peer_cert_obj = _validate_peer(ssl_conn, ssl_conn.getpeercert(binary_form=True), None,
+                                                    credentials)
         except Exception as e:
             try:
                 ssl_conn.close()
             except Exception:
                 pass
+            outcome["failure"] = AUTH_FAILURE
             print(f"{COLOR_ERROR}[ERROR] TLS Handshake failed (Authentication failure): {e}{COLOR_RESET}")
             return None
 
-        return SessionState(peer_id, ssl_conn)
+        ssl_conn.settimeout(None)
+        return _session(peer_id, ssl_conn, peer_cert_obj)
 
     except ssl.SSLError as e:
-        print(f"{COLOR_ERROR}[ERROR] TLS Handshake failed (Authentication failure): {e}{COLOR_RESET}")
+        raw_conn.close()
+        outcome["failure"] = _failure_kind(e)
+        if outcome["failure"] == AUTH_FAILURE:
+            print(f"{COLOR_ERROR}[ERROR] TLS Handshake failed (Authentication failure): {e}{COLOR_RESET}")
+        else:
+            print(f"{COLOR_ERROR}[ERROR] TLS Handshake failed: {e}{COLOR_RESET}")
         return None
     except Exception as e:
+        raw_conn.close()
+        outcome["failure"] = TRANSPORT_FAILURE
         print(f"[ERROR] Listener/Connection error: {e}")
-        return None
\ No newline at end of file
+        return None
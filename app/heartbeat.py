@@ -0,0 +1,167 @@
+"""
+Application-level heartbeats and dead-peer detection.
+
+A peer that vanishes without a FIN (NAT timeout, cable pull) leaves
+recv_loop blocked forever. The monitor gives every session one timer on a
+shared TimerWheel, so thousands of sessions cost no extra threads. Each time
+it fires, the timer:
+  - closes the session if nothing has arrived for `idle_timeout` seconds
+    (recv_loop then wakes up and runs its disconnect callback)
+  - otherwise sends a PING if nothing has arrived for `interval` seconds
+  - and reschedules itself
+
+The peer's recv_loop answers with a PONG; its round trip updates a smoothed
+RTT (EWMA, gain 1/8 as for TCP's SRTT) on the session and per peer_id.
+Any received data counts as liveness, so busy sessions are never pinged.
+
+Heartbeats are off unless HEARTBEAT_INTERVAL is set: a peer that predates
+control frames would show every PING as a chat message, so they are only
+safe once every peer answers them.
+"""
+
+import os
+import time
+import threading
+from typing import Callable, Dict, Optional
+
+from .channel import SessionState, control_frame
+from .utils import COLOR_ERROR, COLOR_RESET
+from .timerwheel import Timer, TimerWheel
+
+DEFAULT_HEARTBEAT_INTERVAL = 15.0
+RTT_GAIN = 0.125
+
+
+def _settings_from_env():
+    """(interval, idle timeout) from HEARTBEAT_INTERVAL/HEARTBEAT_TIMEOUT.
+
+    Settings HeartbeatMonitor would refuse turn heartbeats off with a
+    warning, so a typo in the environment can't stop the client starting.
+    """
+    try:
+        interval = float(os.environ.get("HEARTBEAT_INTERVAL", "0"))  # 0: no pings sent
+        timeout = float(os.environ.get("HEARTBEAT_TIMEOUT", str(3 * (interval or DEFAULT_HEARTBEAT_INTERVAL))))
+    except ValueError as e:
+        print(f"{COLOR_ERROR}[WARN] Heartbeats disabled: HEARTBEAT_INTERVAL/HEARTBEAT_TIMEOUT "
+              f"must be numbers ({e}){COLOR_RESET}")
+        return 0.0, 3 * DEFAULT_HEARTBEAT_INTERVAL
+    if interval < 0 or (interval > 0 and timeout <= interval):
+        print(f"{COLOR_ERROR}[WARN] Heartbeats disabled: HEARTBEAT_INTERVAL ({interval:g}) must be positive "
+              f"and shorter than HEARTBEAT_TIMEOUT ({timeout:g}){COLOR_RESET}")
+        return 0.0, 3 * DEFAULT_HEARTBEAT_INTERVAL
+    return interval, timeout
+
+
+HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT = _settings_from_env()
+
+
+class _Beat:
+    __slots__ = ("timer", "seq", "sent_at")
+
+    def __init__(self):
+        self.timer: Optional[Timer] = None
+        self.seq = 0
+        self.sent_at: Optional[float] = None  # When the unanswered PING `seq` was sent
+
+
+class HeartbeatMonitor:
+    """Pings quiet sessions and closes the ones that stopped answering.
+
+    `on_dead(session, idle_seconds)` is called before an unresponsive session
+    is closed. Pass `handle_pong` to recv_loop as its on_pong callback.
+    """
+    def __init__(self, wheel: TimerWheel, interval: float = HEARTBEAT_INTERVAL or DEFAULT_HEARTBEAT_INTERVAL,
+                 idle_timeout: float = HEARTBEAT_TIMEOUT,
+                 on_dead: Optional[Callable[[SessionState, float], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if interval <= 0 or idle_timeout <= interval:
+            raise ValueError("Heartbeat interval must be positive and shorter than the idle timeout")
+        self.wheel = wheel
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.on_dead = on_dead
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._beats: Dict[SessionState, _Beat] = {}
+        self._peer_rtt: Dict[str, float] = {}
+        self._stats = {"pings": 0, "pongs": 0, "skipped": 0, "timeouts": 0}
+
+    def add(self, session: SessionState):
+        """Starts supervising a session (no-op if already supervised)."""
+        with self._lock:
+            if session in self._beats:
+                return
+            beat = self._beats[session] = _Beat()
+            beat.timer = self.wheel.schedule(self.interval, lambda: self._check(session))
+
+    def remove(self, session: SessionState):
+        """Stops supervising a session (call when it ends for any reason)."""
+        with self._lock:
+            beat = self._beats.pop(session, None)
+        if beat is not None:
+            self.wheel.cancel(beat.timer)
+
+    def __len__(self) -> int:
+        return len(self._beats)
+
+    def _check(self, session: SessionState):
+        """Timer callback, on the wheel thread: must never block."""
+        with self._lock:
+            beat = self._beats.get(session)
+        if beat is None:
+            return
+        now = self._clock()
+        idle = now - session.last_rx
+        if idle >= self.idle_timeout or session.is_closed():
+            self.remove(session)
+            if not session.is_closed():
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                if self.on_dead:
+                    self.on_dead(session, idle)
+                session.close()
+            return
+        if idle >= self.interval:
+            seq = beat.seq + 1
+            try:
+                sent = session.send(control_frame(b"PING", seq), blocking=False)
+            except (OSError, ValueError):
+                sent = False  # recv_loop will notice the broken connection
+            with self._lock:
+                if sent:
+                    beat.seq, beat.sent_at = seq, now
+                    self._stats["pings"] += 1
+                else:
+                    self._stats["skipped"] += 1
+        # Next check when the session would next be due for a ping, at most one interval away
+        delay = max(self.interval - idle, 0.0) if idle < self.interval else self.interval
+        with self._lock:
+            if session in self._beats:
+                beat.timer = self.wheel.schedule(delay, lambda: self._check(session))
+
+    def handle_pong(self, session: SessionState, seq: int):
+        """Records the RTT of an answered PING (recv_loop's on_pong callback)."""
+        with self._lock:
+            beat = self._beats.get(session)
+            if beat is None or seq != beat.seq or beat.sent_at is None:
+                return
+            sample = self._clock() - beat.sent_at
+            beat.sent_at = None
+            self._stats["pongs"] += 1
+            session.rtt = sample if session.rtt is None else session.rtt + RTT_GAIN * (sample - session.rtt)
+            previous = self._peer_rtt.get(session.peer_id)
+            self._peer_rtt[session.peer_id] = sample if previous is None else \
+                previous + RTT_GAIN * (sample - previous)
+
+    def peer_rtt(self, peer_id: str) -> Optional[float]:
+        """Smoothed RTT (seconds) over all sessions with peer_id, if measured."""
+        with self._lock:
+            return self._peer_rtt.get(peer_id)
+
+    def stats(self) -> dict:
+        """Returns ping/pong/timeout counters, supervised sessions and per-peer RTT (ms)."""
+        with self._lock:
+            out = dict(self._stats)
+            out["sessions"] = len(self._beats)
+            out["rtt_ms"] = {peer: round(rtt * 1000.0, 3) for peer, rtt in self._peer_rtt.items()}
+        return out
@@ -0,0 +1,229 @@
+import time
+import select
+import datetime
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .utils import COLOR_ERROR, COLOR_RESET
+from .channel import SessionState
+from .handshake import initiate_tls_handshake
+
+PoolKey = Tuple[str, int, Optional[str], Optional[str]]  # host, port, peer_id, TLS profile
+
+
+class SessionPool:
+    """Reuses outbound TLS sessions keyed by (host, port, expected peer_id, TLS profile).
+
+    Sessions handed out by `acquire` are "in use" until they are given back
+    with `release` (kept for reuse) or `discard` (closed). A released session
+    is parked: its receiver keeps answering heartbeats but closes the session
+    if the peer sends chat, which nobody would see. Idle sessions are
+    health-checked before reuse and evicted once they have been idle for
+    `idle_timeout` seconds or the peer certificate has expired.
+    """
+    def __init__(self, max_per_peer: int = 2, max_total: int = 16, idle_timeout: float = 300.0,
+                 connect: Callable[..., Optional[SessionState]] = initiate_tls_handshake):
+        self.max_per_peer = max_per_peer
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._idle: Dict[PoolKey, List[Tuple[SessionState, float]]] = {}
+        self._in_use: Dict[int, PoolKey] = {}  # id(session) -> key
+        self._reaper: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._stats = {
+            "acquires": 0,
+            "reused": 0,
+            "connects": 0,
+            "connect_failures": 0,
+            "rejected_cap": 0,
+            "evicted_idle": 0,
+            "evicted_expired": 0,
+            "evicted_unhealthy": 0,
+        }
+
+    # --- Internal helpers (caller holds self._lock) ---
+    def _count(self, key: Optional[PoolKey] = None) -> int:
+        if key is None:
+            return len(self._in_use) + sum(len(v) for v in self._idle.values())
+        return (sum(1 for k in self._in_use.values() if k == key)
+                + len(self._idle.get(key, [])))
+
+    def _expired(self, session: SessionState, now: datetime.datetime) -> bool:
+        return session.not_after is not None and now >= session.not_after
+
+    def _is_healthy(self, session: SessionState) -> bool:
+        if session.is_closed():
+            return False
+        if session.receiver is not None and session.receiver.is_alive():
+            # recv_loop owns the socket and closes it as soon as the peer goes away
+            return True
+        try:
+            readable, _, _ = select.select([session.conn], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        # Nothing should arrive on an idle session without a reader: EOF,
+        # close_notify or stray data all mean it can't be reused safely
+        return not readable
+
+    def _evict_locked(self) -> List[SessionState]:
+        """Removes idle sessions past their idle timeout or cert expiry."""
+        now = time.monotonic()
+        utc_now = datetime.datetime.now(datetime.timezone.utc)
+        evicted = []
+        for key in list(self._idle):
+            keep = []
+            for session, idle_since in self._idle[key]:
+                if self._expired(session, utc_now):
+                    self._stats["evicted_expired"] += 1
+                    evicted.append(session)
+                elif now - idle_since >= self.idle_timeout:
+                    self._stats["evicted_idle"] += 1
+                    evicted.append(session)
+                else:
+                    keep.append((session, idle_since))
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        return evicted
+
+    def _evict_oldest_idle_locked(self) -> Optional[SessionState]:
+        """Frees one slot by dropping the least recently used idle session."""
+        oldest_key, oldest = None, None
+        for key, entries in self._idle.items():
+            if entries and (oldest is None or entries[0][1] < oldest[1]):
+                oldest_key, oldest = key, entries[0]
+        if oldest is None:
+            return None
+        self._idle[oldest_key].pop(0)
+        if not self._idle[oldest_key]:
+            del self._idle[oldest_key]
+        self._stats["evicted_idle"] += 1
+        return oldest[0]
+
+    # --- Public API ---
+    def acquire(self, host: str, port: int, peer_id: Optional[str] = None,
+                profile: Optional[str] = None) -> Optional[SessionState]:
+        """Returns a live session to (host, port, peer_id), reusing an idle one if possible.
+
+        Sessions are only reused for the same TLS profile (None: the configured default).
+        """
+        key = (host, port, peer_id, profile)
+        to_close = []
+        try:
+            with self._lock:
+                self._stats["acquires"] += 1
+                to_close.extend(self._evict_locked())
+
+                # Most recently released first: it is the least likely to have gone stale
+                entries = self._idle.get(key, [])
+                while entries:
+                    session, _ = entries.pop()
+                    if self._is_healthy(session):
+                        if not entries:
+                            self._idle.pop(key, None)
+                        session.parked = False
+                        self._in_use[id(session)] = key
+                        self._stats["reused"] += 1
+                        return session
+                    self._stats["evicted_unhealthy"] += 1
+                    to_close.append(session)
+                self._idle.pop(key, None)
+
+                if self._count(key) >= self.max_per_peer:
+                    self._stats["rejected_cap"] += 1
+                    print(f"{COLOR_ERROR}[ERROR] Session pool: per-peer limit ({self.max_per_peer}) reached for {host}:{port}{COLOR_RESET}")
+                    return None
+                if self._count() >= self.max_total:
+                    victim = self._evict_oldest_idle_locked()
+                    if victim is None:
+                        self._stats["rejected_cap"] += 1
+                        print(f"{COLOR_ERROR}[ERROR] Session pool: global limit ({self.max_total}) reached{COLOR_RESET}")
+                        return None
+                    to_close.append(victim)
+                # Reserve the slot while the handshake runs outside the lock
+                reservation = object()
+                self._in_use[id(reservation)] = key
+        finally:
+            for session in to_close:
+                session.close()
+
+        session = None
+        try:
+            session = self._connect(host, port, expected_peer_id=peer_id, profile=profile)
+        finally:
+            with self._lock:
+                self._in_use.pop(id(reservation), None)
+                if session is not None:
+                    self._in_use[id(session)] = key
+                    self._stats["connects"] += 1
+                else:
+                    self._stats["connect_failures"] += 1
+        return session
+
+    def release(self, session: SessionState):
+        """Returns an in-use session to the pool for later reuse."""
+        with self._lock:
+            key = self._in_use.pop(id(session), None)
+            keep = key is not None and not session.is_closed() \
+                and not self._expired(session, datetime.datetime.now(datetime.timezone.utc))
+            if keep:
+                session.parked = True  # Its receiver closes it if chat arrives meanwhile
+                self._idle.setdefault(key, []).append((session, time.monotonic()))
+        if not keep:
+            session.close()
+
+    def discard(self, session: SessionState):
+        """Closes a session and forgets it, whether in use or idle."""
+        with self._lock:
+            self._in_use.pop(id(session), None)
+            for key in list(self._idle):
+                self._idle[key] = [e for e in self._idle[key] if e[0] is not session]
+                if not self._idle[key]:
+                    del self._idle[key]
+        session.close()
+
+    def owns(self, session: SessionState) -> bool:
+        """True if the session was handed out by this pool and not yet released."""
+        with self._lock:
+            return id(session) in self._in_use
+
+    def evict(self) -> int:
+        """Evicts idle/expired sessions now. Returns the number closed."""
+        with self._lock:
+            evicted = self._evict_locked()
+        for session in evicted:
+            session.close()
+        return len(evicted)
+
+    def start_reaper(self, interval: float = 30.0):
+        """Starts a background thread that calls `evict` every `interval` seconds."""
+        if self._reaper is not None:
+            return
+
+        def _loop():
+            while not self._stopped.wait(interval):
+                self.evict()
+
+        self._reaper = threading.Thread(target=_loop, daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> dict:
+        """Returns counters plus current idle/in-use sizes and the reuse ratio."""
+        with self._lock:
+            out = dict(self._stats)
+            out["idle"] = sum(len(v) for v in self._idle.values())
+            out["in_use"] = len(self._in_use)
+        out["reuse_ratio"] = round(out["reused"] / out["acquires"], 3) if out["acquires"] else 0.0
+        return out
+
+    def close_all(self):
+        """Closes every idle session and stops the reaper. In-use sessions are left to their owners."""
+        self._stopped.set()
+        with self._lock:
+            idle = [s for entries in self._idle.values() for s, _ in entries]
+            self._idle.clear()
+        for session in idle:
+            session.close()
@@ -0,0 +1,99 @@
+"""
+Named TLS performance profiles.
+
+A profile bundles the context settings (TLS 1.2 cipher/AEAD order, TLS
+1.3-only) with the socket options applied to the connection before the
+handshake (TCP_NODELAY, buffer sizes):
+
+  default      the historical settings: TLS 1.2+, ECDHE with AES-GCM or
+               ChaCha20, no socket options
+  low-latency  TLS 1.3 only, TCP_NODELAY
+  bulk         AES-GCM (hardware accelerated on most hosts), large socket
+               buffers, Nagle left on so small writes are coalesced
+
+Key exchange uses OpenSSL's default groups in every profile: X25519 first
+(the group clients send a key share for, so no HelloRetryRequest round
+trip), then P-256 and the other NIST curves for peers without X25519.
+
+Python's ssl module cannot configure TLS 1.3 cipher suites, so the cipher
+string only affects TLS 1.2 negotiations: a TLS 1.3-only profile has none
+and always uses OpenSSL's suites in OpenSSL's order.
+Each side applies its own profile, so a listener and an initiator using
+different profiles still interoperate as long as their TLS versions overlap.
+"""
+
+import ssl
+import socket
+from typing import Dict, Optional, Tuple
+
+_AESGCM_FIRST = 'ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS'
+
+
+class TLSProfile:
+    """Context and socket settings applied together for one connection style."""
+    def __init__(self, name: str, ciphers: Optional[str] = _AESGCM_FIRST, tls13_only: bool = False,
+                 nodelay: bool = False, sndbuf: Optional[int] = None, rcvbuf: Optional[int] = None,
+                 description: str = ""):
+        self.name = name
+        self.ciphers = ciphers  # TLS 1.2 only; None leaves the context's list alone
+        self.tls13_only = tls13_only
+        self.nodelay = nodelay
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.description = description
+
+    def __repr__(self):
+        return f"TLSProfile({self.name!r})"
+
+    def apply_context(self, context: ssl.SSLContext, is_server: bool):
+        """Sets the profile's protocol and cipher options on a context."""
+        context.minimum_version = ssl.TLSVersion.TLSv1_3 if self.tls13_only else ssl.TLSVersion.TLSv1_2
+        if self.ciphers:
+            context.set_ciphers(self.ciphers)
+
+    def socket_options(self) -> Tuple[Tuple[int, int, int], ...]:
+        """The (level, option, value) triples apply_socket sets."""
+        opts = []
+        if self.nodelay:
+            opts.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+        if self.sndbuf:
+            opts.append((socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf))
+        if self.rcvbuf:
+            opts.append((socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf))
+        return tuple(opts)
+
+    def apply_socket(self, sock: socket.socket):
+        """Sets the profile's socket options; call before the handshake."""
+        for level, option, value in self.socket_options():
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError:
+                pass  # e.g. a socketpair in tests has no TCP options
+
+
+PROFILES: Dict[str, TLSProfile] = {
+    "default": TLSProfile("default", description="TLS 1.2+, ECDHE with AES-GCM/ChaCha20"),
+    "low-latency": TLSProfile(
+        "low-latency",
+        ciphers=None, tls13_only=True, nodelay=True,
+        description="TLS 1.3 only, TCP_NODELAY"),
+    "bulk": TLSProfile(
+        "bulk", ciphers='ECDHE+AESGCM:DHE+AESGCM:!aNULL:!MD5:!DSS',
+        sndbuf=1 << 20, rcvbuf=1 << 20,
+        description="AES-GCM, 1 MiB socket buffers"),
+}
+
+
+def get_profile(profile=None) -> TLSProfile:
+    """Resolves a profile name (or TLSProfile) to a TLSProfile; None means "default".
+
+    Raises:
+        ValueError: If no profile has that name
+    """
+    if isinstance(profile, TLSProfile):
+        return profile
+    name = profile or "default"
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown TLS profile '{name}' (choose from {', '.join(PROFILES)})")
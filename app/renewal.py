@@ -0,0 +1,233 @@
+"""
+Automatic certificate renewal with context hot-swap.
+
+ContextHolder keeps the Credentials (app/credentials.py) for our identity.
+Handshakes take their contexts from it instead of re-reading the files, and
+`reload()` builds replacements before swapping them in with one assignment.
+So a handshake either gets the old identity or the new one, never a
+half-written file. Established connections keep their own reference to the
+context they were made with and carry on unaffected.
+
+RenewalAgent renews our certificate once `fraction` of its lifetime has
+passed. By default it goes through ca_tool.issue_certificate (the CA daemon
+if one is running, else the local CA files) and asks the CA that signed the
+current certificate, so an identity issued by an intermediate stays with it
+and the root key can stay offline. Any issuer with the same signature, for
+example a test CA, can be passed instead. The new certificate is checked
+against our key before it atomically replaces the certificate file, and
+then the holder reloads. While renewal keeps failing (say, no CA is
+reachable) it retries with exponential backoff and reports each new error
+once.
+"""
+
+import os
+import datetime
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from .utils import COLOR_ERROR, COLOR_RESET, COLOR_SUCCESS, create_ssl_context
+from . import utils
+from .credentials import Credentials
+
+RENEW_FRACTION = float(os.environ.get("RENEW_AT_FRACTION", "0.66"))
+RENEW_VALID_DAYS = int(os.environ.get("RENEW_VALID_DAYS", "7"))
+RENEW_MAX_RETRY_INTERVAL = 3600.0
+
+# issuer(username, pubkey_pem, valid_days) -> (cert_pem, chain_pem, log_index)
+Issuer = Callable[[str, bytes, int], Tuple[bytes, bytes, Optional[int]]]
+
+
+class ContextHolder:
+    """Current Credentials for one identity; paths default to app.utils' at first use."""
+    def __init__(self, ca_path: Optional[str] = None, cert_path: Optional[str] = None,
+                 key_path: Optional[str] = None):
+        self.ca_path = ca_path
+        self.cert_path = cert_path
+        self.key_path = key_path
+        self.generation = 0  # Bumped by every reload
+        self._lock = threading.Lock()
+        self._credentials: Optional[Credentials] = None
+
+    @property
+    def credentials(self) -> Credentials:
+        """The identity new handshakes should use (pass to the handshake functions)."""
+        credentials = self._credentials
+        if credentials is None:
+            with self._lock:
+                if self._credentials is None:
+                    self._credentials = Credentials.from_config(self.ca_path, self.cert_path, self.key_path)
+                credentials = self._credentials
+        return credentials
+
+    def get(self, is_server: bool, profile=None):
+        """The current context for this side and profile (default utils.TLS_PROFILE)."""
+        return self.credentials.context(is_server, profile)
+
+    def reload(self):
+        """Re-reads the files, rebuilds every context in use and swaps them in at once.
+
+        Raises:
+            ssl.SSLError, OSError: If the files don't form a valid identity
+                (the current credentials stay in place)
+        """
+        with self._lock:
+            fresh = Credentials.from_config(self.ca_path, self.cert_path, self.key_path)
+            if self._credentials is not None:
+                for is_server, profile in self._credentials.built():
+                    fresh.context(is_server, profile)
+            self._credentials = fresh
+            self.generation += 1
+
+
+def _load_cert(path: str):
+    from cryptography import x509
+
+    with open(path, "rb") as f:
+        return x509.load_pem_x509_certificate(f.read())
+
+
+def _validity(cert) -> Tuple[datetime.datetime, datetime.datetime]:
+    not_before = getattr(cert, "not_valid_before_utc", None)
+    not_after = getattr(cert, "not_valid_after_utc", None)
+    if not_before is None:
+        not_before = cert.not_valid_before.replace(tzinfo=datetime.timezone.utc)
+        not_after = cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    return not_before, not_after
+
+
+def ca_tool_issuer(username: str, pubkey_pem: bytes, valid_days: int, issuer: Optional[str] = None):
+    """Default issuer: the CA daemon if running, else the local CA (see ca_tool.py).
+
+    `issuer` names the intermediate CA to sign with; None means the root.
+    """
+    import ca_tool
+
+    return ca_tool.issue_certificate(username, pubkey_pem, valid_days, issuer, op="renew")
+
+
+class RenewalAgent:
+    """Renews our certificate in the background before it expires.
+
+    `renew_now()` can also be called directly. Callbacks in `on_renewed` get
+    the new certificate PEM after the holder has switched to it. Without an
+    `issuer`, ca_tool_issuer renews with the CA that signed the current
+    certificate. Failed attempts are retried after `retry_interval` seconds,
+    doubling up to `max_retry_interval`.
+    """
+    def __init__(self, username: str, holder: ContextHolder, cert_path: Optional[str] = None,
+                 key_path: Optional[str] = None, fraction: float = RENEW_FRACTION,
+                 valid_days: int = RENEW_VALID_DAYS, issuer: Optional[Issuer] = None,
+                 retry_interval: float = 60.0, max_retry_interval: float = RENEW_MAX_RETRY_INTERVAL):
+        if not 0 < fraction < 1:
+            raise ValueError("Renewal fraction must be between 0 and 1")
+        self.username = username
+        self.holder = holder
+        self.cert_path = cert_path
+        self.key_path = key_path
+        self.fraction = fraction
+        self.valid_days = valid_days
+        self.issuer = issuer
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max(max_retry_interval, retry_interval)
+        self._failures = 0  # Consecutive failed background attempts
+        self.on_renewed: List[Callable[[bytes], None]] = []
+        self.renewals = 0
+        self.last_error: Optional[str] = None
+        self._renew_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _paths(self) -> Tuple[str, str]:
+        return self.cert_path or utils.USER_CERT_PATH, self.key_path or utils.USER_KEY_PATH
+
+    def renew_at(self) -> datetime.datetime:
+        """When the current certificate is due for renewal."""
+        not_before, not_after = _validity(_load_cert(self._paths()[0]))
+        return not_before + (not_after - not_before) * self.fraction
+
+    def seconds_until_due(self) -> float:
+        return (self.renew_at() - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+    def _public_key_pem(self, key_path: str) -> bytes:
+        from cryptography.hazmat.primitives import serialization
+
+        with open(key_path, "rb") as f:
+            key = serialization.load_pem_private_key(f.read(), password=None)
+        return key.public_key().public_bytes(serialization.Encoding.PEM,
+                                             serialization.PublicFormat.SubjectPublicKeyInfo)
+
+    def _issue(self, cert_path: str, pubkey_pem: bytes):
+        if self.issuer is not None:
+            return self.issuer(self.username, pubkey_pem, self.valid_days)
+        import build_ca
+
+        return ca_tool_issuer(self.username, pubkey_pem, self.valid_days,
+                              build_ca.issuer_of(_load_cert(cert_path)))
+
+    def renew_now(self) -> bytes:
+        """Gets a new certificate for our key, installs it and swaps the contexts.
+
+        Returns:
+            The new certificate PEM
+
+        Raises:
+            Exception: Whatever the issuer or the validation raised; the old
+                certificate and contexts stay in place
+        """
+        cert_path, key_path = self._paths()
+        with self._renew_lock:
+            cert_pem, chain_pem, _ = self._issue(cert_path, self._public_key_pem(key_path))
+            tmp = cert_path + ".renew"
+            with open(tmp, "wb") as f:
+                f.write(cert_pem + chain_pem)
+            try:
+                # Fails on a certificate that doesn't match our key, before anything is replaced
+                create_ssl_context(is_server=True, ca_path=self.holder.ca_path, cert_path=tmp, key_path=key_path)
+                os.replace(tmp, cert_path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            self.holder.reload()
+            self.renewals += 1
+            self.last_error = None
+        for callback in self.on_renewed:
+            try:
+                callback(cert_pem)
+            except Exception:
+                pass
+        return cert_pem
+
+    def _step(self) -> float:
+        """Renews if due. Returns seconds until the next check."""
+        try:
+            due = self.seconds_until_due()
+            if due > 0:
+                return due
+            self.renew_now()
+            self._failures = 0
+            print(f"\n{COLOR_SUCCESS}[INFO] Certificate renewed; new handshakes use it now.{COLOR_RESET}")
+            return max(self.seconds_until_due(), 1.0)
+        except Exception as e:
+            if str(e) != self.last_error:  # The same failure every retry would flood the console
+                print(f"\n{COLOR_ERROR}[ERROR] Certificate renewal failed: {e} "
+                      f"(retrying in the background){COLOR_RESET}")
+            self.last_error = str(e)
+            delay = min(self.retry_interval * 2 ** self._failures, self.max_retry_interval)
+            self._failures = min(self._failures + 1, 32)
+            return delay
+
+    def start(self):
+        """Renews from a background thread until stop() is called."""
+        if self._thread is not None:
+            return
+
+        def _loop():
+            delay = self._step()
+            while not self._stop.wait(delay):
+                delay = self._step()
+
+        self._thread = threading.Thread(target=_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,135 @@
+import os
+import datetime
+import threading
+from typing import Callable, Dict, Iterable, Optional, Set
+
+import crl
+from .channel import SessionState
+from .timerwheel import Timer, TimerWheel
+
+
+class SessionIndex:
+    """Live sessions indexed by peer certificate serial and expiry.
+
+    Serials map to their sessions so a revocation touches only the affected
+    sessions; each session's certificate expiry is a single timer on the
+    shared wheel, so nothing polls sessions individually.
+    """
+    def __init__(self, wheel: TimerWheel,
+                 on_close: Optional[Callable[[SessionState, str], None]] = None):
+        self.wheel = wheel
+        self.on_close = on_close
+        self._lock = threading.Lock()
+        self._by_serial: Dict[int, Set[SessionState]] = {}
+        self._expiry_timers: Dict[SessionState, Timer] = {}
+
+    def add(self, session: SessionState):
+        """Tracks a session. Sessions without serial/expiry info are ignored."""
+        with self._lock:
+            if session in self._expiry_timers or session.serial is None:
+                return
+            self._by_serial.setdefault(session.serial, set()).add(session)
+            timer = None
+            if session.not_after is not None:
+                delay = (session.not_after - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+                timer = self.wheel.schedule(delay, lambda: self._close(session, "certificate expired"))
+            self._expiry_timers[session] = timer
+
+    def remove(self, session: SessionState):
+        """Stops tracking a session (call when it ends for any reason)."""
+        with self._lock:
+            if session not in self._expiry_timers:
+                return
+            self.wheel.cancel(self._expiry_timers.pop(session))
+            peers = self._by_serial.get(session.serial)
+            if peers is not None:
+                peers.discard(session)
+                if not peers:
+                    del self._by_serial[session.serial]
+
+    def _close(self, session: SessionState, reason: str):
+        self.remove(session)
+        session.close()
+        if self.on_close:
+            self.on_close(session, reason)
+
+    def revoke(self, serials: Iterable[int]) -> int:
+        """Closes every session whose peer cert serial is in serials. Returns how many."""
+        with self._lock:
+            doomed = []
+            for serial in serials:
+                doomed.extend(self._by_serial.get(int(serial), ()))
+        for session in doomed:
+            self._close(session, "certificate revoked")
+        return len(doomed)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._expiry_timers)
+
+
+class CrlWatcher:
+    """Watches the CRL file and tears down sessions with newly revoked peers.
+
+    Change detection is one stat() per interval. When the file changes its
+    signature is verified before anything is acted on, and only serials not
+    seen before are pushed to the SessionIndex. Deltas that arrive by other
+    means (e.g. from the CA) can be applied directly with push().
+    """
+    def __init__(self, index: SessionIndex, ca_path: str, interval: float = 2.0):
+        self.index = index
+        self.ca_path = ca_path
+        self.interval = interval
+        self._known: Set[int] = set()
+        self._stamp = None
+        self._ca_pub = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ca_public_key(self):
+        if self._ca_pub is None:
+            from cryptography import x509
+
+            with open(self.ca_path, "rb") as f:
+                self._ca_pub = x509.load_pem_x509_certificate(f.read()).public_key()
+        return self._ca_pub
+
+    def poll(self) -> int:
+        """Checks the CRL once. Returns the number of sessions closed."""
+        try:
+            st = os.stat(crl.CRL_PATH)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return 0
+        if stamp == self._stamp:
+            return 0
+        try:
+            if not crl.verify_crl_signature(self._ca_public_key()):
+                return 0  # Unsigned or half-written; retry when it changes again
+            revoked = set(crl.get_revoked_serials())
+        except Exception:
+            return 0
+        self._stamp = stamp
+        return self.push(revoked)
+
+    def push(self, serials: Iterable[int]) -> int:
+        """Applies a revocation delta. Returns the number of sessions closed."""
+        new = {int(s) for s in serials} - self._known
+        self._known |= new
+        return self.index.revoke(new)
+
+    def start(self):
+        """Polls from a background daemon thread."""
+        if self._thread is not None:
+            return
+
+        def _loop():
+            while not self._stop.wait(self.interval):
+                self.poll()
+
+        self.poll()
+        self._thread = threading.Thread(target=_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
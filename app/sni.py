@@ -0,0 +1,146 @@
+"""
+One listener, many identities: the server certificate is chosen by SNI.
+
+Initiators that know whom they are calling send the target peer_id as the
+TLS server name (see `sni_name`). SniRouter keeps a prebuilt server context
+per identity (app/credentials.py) and its SNI callback switches the
+handshake to the one named, so one process and one port can front hundreds
+of identities. Peer IDs are matched case-insensitively, like host names.
+A handshake without a server name (an initiator that didn't give a peer_id)
+gets the default identity, and so does one with a name we don't serve: an
+initiator from before SNI routing sends whatever host it dialled. An
+initiator that named a peer_id checks the certificate's CN itself, so it
+still rejects the default identity it gets instead.
+"""
+
+import re
+import os
+import ssl
+import glob
+import threading
+from typing import Dict, List, Optional
+
+from . import utils
+from .credentials import Credentials
+from .utils import create_ssl_context
+from .profiles import get_profile
+
+# Host-name shaped peer_ids only; others (spaces, IP literals) are sent without SNI
+_SNI_NAME = re.compile(r"^(?=.{1,253}$)[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,62})(?:\.[A-Za-z0-9_][A-Za-z0-9_-]{0,62})*$")
+
+
+def sni_name(peer_id: Optional[str]) -> Optional[str]:
+    """The server name an initiator sends for peer_id, or None if it can't be one."""
+    if not peer_id or not _SNI_NAME.match(peer_id) or peer_id.replace(".", "").isdigit():
+        return None
+    return peer_id
+
+
+class SniRouter:
+    """Serves several identities on one listener, choosing the certificate by SNI.
+
+    The first identity added is the default unless `default` names another.
+    Identities can be added while the listener runs.
+    """
+    def __init__(self, default: Optional[str] = None, profile=None):
+        self.default = default
+        self.profile = get_profile(profile or utils.TLS_PROFILE)
+        self._lock = threading.Lock()
+        self._identities: Dict[str, Credentials] = {}  # lower-cased name -> credentials
+        self._contexts: Dict[str, ssl.SSLContext] = {}  # lower-cased name -> server context
+        self._names: Dict[int, str] = {}  # id(context) -> name, to tell which identity served
+        self._front: Optional[ssl.SSLContext] = None
+        self._stats = {"selected": 0, "default": 0, "unknown": 0}
+
+    def add(self, credentials: Credentials) -> str:
+        """Registers an identity under its certificate CN; returns the name.
+
+        Raises:
+            ValueError: If an identity with the same name (ignoring case) exists
+        """
+        name = credentials.name
+        context = credentials.context(True, self.profile)  # Built now, not during a handshake
+        with self._lock:
+            if name.lower() in self._identities:
+                raise ValueError(f"Identity already served: {name}")
+            # Copy-on-write: the SNI callback reads these without the lock
+            self._identities = {**self._identities, name.lower(): credentials}
+            self._contexts = {**self._contexts, name.lower(): context}
+            self._names = {**self._names, id(context): name}
+            if self.default is None:
+                self.default = name
+        return name
+
+    def load_keys_dir(self, keys_dir: str = "keys", ca_path: Optional[str] = None,
+                      names: Optional[List[str]] = None) -> int:
+        """Adds every `<name>_cert.pem`/`<name>_key.pem` pair in keys_dir (or only `names`).
+
+        Returns:
+            How many identities were added
+        """
+        if names is None:
+            names = sorted(os.path.basename(p)[:-len("_cert.pem")]
+                           for p in glob.glob(os.path.join(keys_dir, "*_cert.pem")))
+        for name in names:
+            self.add(Credentials(ca_path or utils.CA_ROOT_PATH, os.path.join(keys_dir, f"{name}_cert.pem"),
+                                 os.path.join(keys_dir, f"{name}_key.pem")))
+        return len(names)
+
+    def names(self) -> List[str]:
+        names = self._names
+        return sorted(names[id(context)] for context in self._contexts.values())
+
+    def __len__(self) -> int:
+        return len(self._identities)
+
+    def credentials(self, name: Optional[str] = None) -> Credentials:
+        """The credentials serving name (default: the default identity).
+
+        Raises:
+            KeyError: If no such identity is served
+        """
+        return self._identities[(name or self.default or "").lower()]
+
+    def context(self) -> ssl.SSLContext:
+        """The listener's context: the default identity, with the SNI callback.
+
+        Raises:
+            ValueError: If no identity has been added, or the default isn't one of them
+        """
+        with self._lock:
+            if self._front is None:
+                if not self._identities:
+                    raise ValueError("No identities to serve")
+                default = self._identities.get(self.default.lower())
+                if default is None:
+                    raise ValueError(f"Default identity is not served: {self.default}")
+                # A separate context, so the shared per-identity ones keep no callback
+                self._front = create_ssl_context(is_server=True, cert_path=default.cert_path,
+                                                 key_path=default.key_path, profile=self.profile,
+                                                 cadata=default.ca_pem.decode("ascii"))
+                self._front.sni_callback = self._select
+                self._names = {**self._names, id(self._front): self.default}
+            return self._front
+
+    def _select(self, ssl_obj, server_name: Optional[str], _front):
+        """SNI callback, called by OpenSSL during the handshake."""
+        if server_name is None:
+            self._stats["default"] += 1
+            return None
+        context = self._contexts.get(server_name.lower())
+        if context is None:
+            self._stats["unknown"] += 1  # Served by the default identity
+            return None
+        ssl_obj.context = context
+        self._stats["selected"] += 1
+        return None
+
+    def served_identity(self, conn) -> Optional[str]:
+        """Which of our identities a connection accepted through this router presented."""
+        return self._names.get(id(conn.context))
+
+    def stats(self) -> dict:
+        """Identities served and how handshakes were routed (by name, default, unknown name)."""
+        out = dict(self._stats)
+        out["identities"] = len(self._identities)
+        return out
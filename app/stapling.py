@@ -0,0 +1,118 @@
+import json
+import struct
+import datetime
+import threading
+from typing import Optional
+
+import status_responder
+
+STAPLE_TIMEOUT = 5.0
+_LENGTH = struct.Struct("!I")
+
+
+class StapleFetcher:
+    """Keeps a fresh signed status statement for our own certificate.
+
+    Refetches once half of the current statement's lifetime has passed and
+    retries every `retry_interval` seconds while the responder is unreachable.
+    """
+    def __init__(self, cert_path: str, responder: str = status_responder.DEFAULT_RESPONDER,
+                 retry_interval: float = 30.0):
+        self.cert_path = cert_path
+        self.host, self.port = status_responder.parse_address(responder)
+        self.retry_interval = retry_interval
+        self._statement: Optional[dict] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _own_serial(self) -> int:
+        from cryptography import x509
+
+        with open(self.cert_path, "rb") as f:
+            return x509.load_pem_x509_certificate(f.read()).serial_number
+
+    def refresh(self) -> float:
+        """Fetches a new statement. Returns seconds until the next refresh."""
+        try:
+            statement = status_responder.fetch_statement(self._own_serial(), self.host, self.port)
+            this_update = status_responder.parse_time(statement["this_update"])
+            next_update = status_responder.parse_time(statement["next_update"])
+        except Exception:
+            return self.retry_interval
+        self._statement = statement
+        return max(1.0, (next_update - this_update).total_seconds() / 2)
+
+    def current(self) -> Optional[dict]:
+        """Returns the latest statement if it hasn't expired yet."""
+        statement = self._statement
+        if statement is None:
+            return None
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if status_responder.parse_time(statement["next_update"]) <= now:
+            return None
+        return statement
+
+    def start(self):
+        """Fetches in a background thread until stop() is called."""
+        def _loop():
+            delay = self.refresh()
+            while not self._stop.wait(delay):
+                delay = self.refresh()
+
+        self._thread = threading.Thread(target=_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# Process-wide fetcher used by the handshake functions when stapling is enabled
+_fetcher: Optional[StapleFetcher] = None
+
+
+def start_fetcher(cert_path: str) -> StapleFetcher:
+    """Starts the process-wide fetcher for our own certificate."""
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = StapleFetcher(cert_path)
+        _fetcher.start()
+    return _fetcher
+
+
+def current_staple() -> Optional[dict]:
+    """Our current statement, or None if we have no fresh one."""
+    return _fetcher.current() if _fetcher else None
+
+
+def _read_exact(conn, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed during staple exchange")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def exchange_staples(conn, own_staple: Optional[dict]) -> Optional[dict]:
+    """Sends our statement and reads the peer's over a freshly established channel.
+
+    Each side sends one length-prefixed JSON frame (length 0 = no staple)
+    before any chat data, so both peers must have stapling enabled.
+
+    Returns:
+        The peer's statement, or None if it didn't staple one
+    """
+    payload = json.dumps(own_staple, sort_keys=True).encode("utf-8") if own_staple else b""
+    previous_timeout = conn.gettimeout()
+    conn.settimeout(STAPLE_TIMEOUT)
+    try:
+        conn.sendall(_LENGTH.pack(len(payload)) + payload)
+        (length,) = _LENGTH.unpack(_read_exact(conn, _LENGTH.size))
+        if length > status_responder.MAX_STATEMENT_BYTES:
+            raise ValueError("Stapled status statement too large")
+        if length == 0:
+            return None
+        return json.loads(_read_exact(conn, length).decode("utf-8"))
+    finally:
+        conn.settimeout(previous_timeout)
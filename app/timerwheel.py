@@ -0,0 +1,105 @@
+import math
+import time
+import threading
+from typing import Callable, List, Optional
+
+
+class Timer:
+    """Handle for a scheduled callback; pass it to TimerWheel.cancel()."""
+    __slots__ = ("deadline", "callback", "rounds", "cancelled")
+
+    def __init__(self, deadline: float, callback: Callable[[], None], rounds: int):
+        self.deadline = deadline
+        self.callback = callback
+        self.rounds = rounds
+        self.cancelled = False
+
+
+class TimerWheel:
+    """Hashed timing wheel: O(1) schedule/cancel, one thread for all timers.
+
+    Time is divided into `tick`-second buckets arranged in a ring of `slots`.
+    A timer further away than one revolution carries a rounds counter that
+    is decremented each time the cursor passes its slot. Timers fire on the
+    wheel thread, up to one tick late, so callbacks must be quick.
+    """
+    def __init__(self, tick: float = 1.0, slots: int = 512, clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self._clock = clock
+        self._slots: List[List[Timer]] = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._last_tick = clock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pending = 0
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """Runs callback roughly `delay` seconds from now."""
+        with self._lock:
+            # Count ticks from the last processed tick so timers never fire early
+            now = self._clock()
+            ticks = max(1, math.ceil((now - self._last_tick + max(0.0, delay)) / self.tick))
+            n = len(self._slots)
+            timer = Timer(now + delay, callback, (ticks - 1) // n)
+            self._slots[(self._cursor + ticks) % n].append(timer)
+            self._pending += 1
+            return timer
+
+    def cancel(self, timer: Optional[Timer]):
+        """Cancels a timer. Safe to call more than once or after it fired."""
+        if timer is None:
+            return
+        # Checked and set under the lock, like advance() does, so racing
+        # cancels (or a cancel racing the firing tick) count the timer once
+        with self._lock:
+            if not timer.cancelled:
+                timer.cancelled = True
+                self._pending -= 1
+
+    def advance(self) -> int:
+        """Processes every tick that has elapsed. Returns the number of callbacks run."""
+        due = []
+        with self._lock:
+            n = len(self._slots)
+            while self._clock() - self._last_tick >= self.tick:
+                self._last_tick += self.tick
+                self._cursor = (self._cursor + 1) % n
+                slot = self._slots[self._cursor]
+                keep = []
+                for timer in slot:
+                    if timer.cancelled:
+                        continue
+                    if timer.rounds > 0:
+                        timer.rounds -= 1
+                        keep.append(timer)
+                    else:
+                        timer.cancelled = True  # Fired; makes a later cancel() a no-op
+                        self._pending -= 1
+                        due.append(timer)
+                self._slots[self._cursor] = keep
+        for timer in due:
+            try:
+                timer.callback()
+            except Exception:
+                pass  # One bad callback must not stall the wheel
+        return len(due)
+
+    def __len__(self):
+        """Number of timers still pending."""
+        return self._pending
+
+    def start(self):
+        """Drives the wheel from a background daemon thread."""
+        if self._thread is not None:
+            return
+
+        def _loop():
+            while not self._stop.wait(self.tick):
+                self.advance()
+
+        self._thread = threading.Thread(target=_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -1,6 +1,8 @@
 import os
 import ssl
 
+from .profiles import get_profile
+
 # --- CLI Color Codes ---
 COLOR_ME = '\033[96m'      # Cyan for my outgoing messages
 COLOR_PEER = '\033[92m'    # Green for incoming peer messages
@@ -17,6 +19,26 @@ CA_ROOT_PATH = "ca/root_cert.pem"
 USER_CERT_PATH = os.path.join("keys", f"{MY_USER_ID}_cert.pem")
 USER_KEY_PATH = os.path.join("keys", f"{MY_USER_ID}_key.pem")
 
+# Exchange signed status statements (see status_responder.py) after the handshake.
+# Both peers must agree: the staple frames precede any chat data.
+STAPLING = os.environ.get("STAPLING", "0") == "1"
+
+# How peer certificates are checked after the handshake:
+#   "tls"  - OpenSSL already verified the chain against CA_ROOT_PATH (and only
+#            that CA), so Python skips the signature re-check and only applies
+#            identity, validity and revocation policy.
+#   "full" - additionally re-verify the CA signature in Python.
+VALIDATION_MODE = os.environ.get("VALIDATION_MODE", "tls")
+
+# Seconds an accepted connection gets to complete its handshake. Until then it
+# holds an admission slot (see app/admission.py), so a client that connects and
+# never sends a ClientHello must not keep it for good.
+HANDSHAKE_TIMEOUT = float(os.environ.get("HANDSHAKE_TIMEOUT", "5"))
+
+# TLS performance profile (see app/profiles.py) for listeners and outbound
+# connections that don't ask for one: "default", "low-latency" or "bulk".
+TLS_PROFILE = os.environ.get("TLS_PROFILE", "default")
+
 def get_common_name(subject_list):
     """Parses the certificate subject list to find and return the Common Name (CN)."""
     for entry in subject_list:
@@ -25,45 +47,58 @@ def get_common_name(subject_list):
                 return item[1]
     return 'Unknown'
 
-def create_ssl_context(is_server=False):
+def create_ssl_context(is_server=False, ca_path=None, cert_path=None, key_path=None, profile=None,
+                       cadata=None):
     """Creates the SSL context with enhanced security settings.
     
     Args:
         is_server: Whether this context is for server-side or client-side
+        ca_path: Optional override for CA_ROOT_PATH
+        cert_path: Optional override for USER_CERT_PATH
+        key_path: Optional override for USER_KEY_PATH
+        profile: Optional TLS profile name or TLSProfile (default: TLS_PROFILE)
+        cadata: Optional CA certificate (PEM text) already in memory; replaces ca_path
         
     Returns:
         Configured SSL context with mutual TLS authentication
         
     Raises:
         FileNotFoundError: If certificate files are not found
+        ValueError: If the profile is unknown
     """
     
+    # Callers juggling several identities (e.g. loadgen) pass explicit paths
+    ca_path = ca_path or CA_ROOT_PATH
+    cert_path = cert_path or USER_CERT_PATH
+    key_path = key_path or USER_KEY_PATH
+
     # Verify certificate files exist
-    if not os.path.exists(CA_ROOT_PATH):
-        raise FileNotFoundError(f"CA certificate not found: {CA_ROOT_PATH}")
-    if not os.path.exists(USER_CERT_PATH):
-        raise FileNotFoundError(f"User certificate not found: {USER_CERT_PATH}")
-    if not os.path.exists(USER_KEY_PATH):
-        raise FileNotFoundError(f"User key not found: {USER_KEY_PATH}")
+    if cadata is None and not os.path.exists(ca_path):
+        raise FileNotFoundError(f"CA certificate not found: {ca_path}")
+    if not os.path.exists(cert_path):
+        raise FileNotFoundError(f"User certificate not found: {cert_path}")
+    if not os.path.exists(key_path):
+        raise FileNotFoundError(f"User key not found: {key_path}")
     
+    # Passing cafile/cadata keeps the system trust store out: our CA must be the
+    # only anchor OpenSSL accepts, since the "tls" validation mode relies on it.
+    trust = {"cadata": cadata} if cadata is not None else {"cafile": ca_path}
     if is_server:
-        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH, **trust)
         context.verify_mode = ssl.CERT_REQUIRED
     else:
-        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, **trust)
         context.verify_mode = ssl.CERT_REQUIRED
         # Disable hostname verification since we're using certificate CN for identity
         # In production, you might want to use subjectAltName instead
         context.check_hostname = False 
 
-    # Enhanced security settings
-    context.minimum_version = ssl.TLSVersion.TLSv1_2  # Minimum TLS 1.2
-    
-    # Prefer cipher suites with forward secrecy (ECDHE)
-    # This provides perfect forward secrecy (PFS)
-    context.set_ciphers('ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS')
+    # Enhanced security settings: TLS 1.2+ (1.3 only in some profiles) and
+    # forward-secret (ECDHE/DHE) AEAD cipher suites, ordered per profile
+    get_profile(profile or TLS_PROFILE).apply_context(context, is_server)
     
-    # Load trusted CA root and user's identity chain
-    context.load_verify_locations(CA_ROOT_PATH)
-    context.load_cert_chain(certfile=USER_CERT_PATH, keyfile=USER_KEY_PATH)
+    # Load the user's identity chain (the CA root was loaded above). A cert file
+    # issued by an intermediate CA holds the leaf followed by the intermediate;
+    # OpenSSL serves all of it so the peer can build the path to the root.
+    context.load_cert_chain(certfile=cert_path, keyfile=key_path)
     return context
\ No newline at end of file
@@ -0,0 +1,417 @@
+"""
+Multi-process responder: N forked workers share LISTEN_TCP_PORT via SO_REUSEPORT.
+
+TLS handshakes are CPU-bound and the GIL keeps a threaded listener on one
+core. Here every worker binds its own listening socket on the same port and
+the kernel spreads incoming connections across them; each worker runs the
+handshake and the session's receive loop itself.
+
+The server SSLContext is built once in the supervisor before forking, so
+every worker (including restarted ones) inherits the same OpenSSL context and
+therefore the same session-ticket keys: a ticket issued by one worker resumes
+on any other. Python's ssl module has no API to set ticket keys explicitly,
+so sharing the context across fork is how they are distributed.
+
+The supervisor restarts workers that exit and aggregates the counters each
+worker reports over a pipe.
+
+With an SniRouter (app/sni.py) the workers serve several identities on the
+one port, each handshake presenting the identity its initiator named.
+
+Usage:
+  python -m app.workers                 # one worker per CPU
+  python -m app.workers --workers 4 --port 7000
+  python -m app.workers --all-identities  # every identity in keys/, chosen by SNI
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import select
+import signal
+import socket
+import ssl
+import argparse
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .utils import COLOR_ERROR, COLOR_RESET, COLOR_SUCCESS, LISTEN_TCP_PORT, create_ssl_context
+from . import utils
+from .channel import SessionRegistry, recv_loop
+from .handshake import handle_incoming_connection, TRANSPORT_FAILURE
+from .admission import AdmissionController
+from .profiles import get_profile
+from .timerwheel import TimerWheel
+from .heartbeat import HeartbeatMonitor, HEARTBEAT_INTERVAL
+from .sni import SniRouter
+
+DEFAULT_WORKERS = int(os.environ.get("LISTEN_WORKERS", "0")) or (os.cpu_count() or 1)
+COUNTERS = ("handshakes", "failures", "resumed", "rejected", "bytes_in", "msgs_in")
+
+
+def supported() -> bool:
+    """Whether this platform can run forked SO_REUSEPORT workers."""
+    return hasattr(os, "fork") and hasattr(socket, "SO_REUSEPORT")
+
+
+class _Worker:
+    """Body of one worker process: accept, handshake, receive, report."""
+    def __init__(self, slot: int, host: str, port: int, context, report_fd: int,
+                 admission: Callable[[], AdmissionController] = AdmissionController, profile=None,
+                 router: Optional[SniRouter] = None):
+        self.slot = slot
+        self.router = router
+        self.profile = get_profile(profile)
+        self.host = host
+        self.port = port
+        self.context = context
+        self.report_fd = report_fd
+        self.registry = SessionRegistry()
+        # Per worker: limits apply to the share of connections the kernel gives it
+        self.admission = admission()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.identities: Dict[str, int] = {}  # Handshakes per served identity (with a router)
+        self._lock = threading.Lock()
+        self.wheel = TimerWheel()
+        self.heartbeats = HeartbeatMonitor(self.wheel) if HEARTBEAT_INTERVAL > 0 else None
+
+    def report(self):
+        live = self.registry.stats()
+        with self._lock:
+            out = dict(self.counters)
+            out["identities"] = dict(self.identities)
+        out["bytes_in"] += live["bytes_in"]
+        out["msgs_in"] += live["msgs_in"]
+        out.update(slot=self.slot, pid=os.getpid(), sessions=live["sessions"])
+        try:
+            # One line is well under PIPE_BUF, so concurrent reports never interleave.
+            # Counters are cumulative, so a report dropped on a full pipe costs nothing.
+            os.write(self.report_fd, (json.dumps(out) + "\n").encode())
+        except OSError:
+            pass
+
+    def _serve(self, raw_conn, addr):
+        outcome, session = {}, None
+        try:
+            session = handle_incoming_connection(raw_conn, addr, context=self.context, profile=self.profile,
+                                                 outcome=outcome)
+        finally:
+            # Only failed authentication counts towards a ban; a dropped connection is no verdict
+            self.admission.release(addr[0], authenticated=None if outcome.get("failure") == TRANSPORT_FAILURE
+                                   else session is not None)
+        with self._lock:
+            if session is None:
+                self.counters["failures"] += 1
+            else:
+                self.counters["handshakes"] += 1
+                self.counters["resumed"] += int(session.conn.session_reused)
+                if self.router is not None:
+                    name = self.router.served_identity(session.conn)
+                    self.identities[name] = self.identities.get(name, 0) + 1
+        self.report()
+        if session is None:
+            return
+        self.registry.add(session)
+        if self.heartbeats:
+            self.heartbeats.add(session)
+        recv_loop(session.conn, session.peer_id, session=session,
+                  on_pong=self.heartbeats.handle_pong if self.heartbeats else None)
+        if self.heartbeats:
+            self.heartbeats.remove(session)
+        self.registry.remove(session)
+        with self._lock:
+            self.counters["bytes_in"] += session.bytes_in
+            self.counters["msgs_in"] += session.msgs_in
+        self.report()
+
+    def run(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.profile.apply_socket(sock)  # Buffer sizes must be set before listen() to take full effect
+        sock.bind((self.host, self.port))
+        sock.listen(128)
+        sock.settimeout(1.0)
+        os.set_blocking(self.report_fd, False)  # A slow supervisor must not stall accept()
+        parent = os.getppid()
+        self.wheel.start()
+        self.report()
+        while os.getppid() == parent:  # Orphaned workers exit on their own
+            try:
+                raw_conn, addr = sock.accept()
+            except socket.timeout:
+                continue
+            if self.admission.admit(addr[0]) is not None:
+                raw_conn.close()  # Rejected before spending a handshake on it
+                with self._lock:
+                    self.counters["rejected"] += 1
+                self.report()
+                continue
+            threading.Thread(target=self._serve, args=(raw_conn, addr), daemon=True).start()
+
+
+class WorkerSupervisor:
+    """Forks and supervises the listener workers.
+
+    `stats()` sums the workers' counters: handshakes, failures, resumed
+    (handshakes that used a session ticket), rejected (by admission control),
+    bytes_in, msgs_in and live sessions, plus how often workers had to be
+    restarted. With a `router` the workers serve all of its identities
+    (instead of `context`) and `stats()["identities"]` counts handshakes per
+    identity.
+    """
+    def __init__(self, workers: int = DEFAULT_WORKERS, port: int = LISTEN_TCP_PORT, host: str = "0.0.0.0",
+                 context=None, restart_delay: float = 1.0,
+                 admission: Callable[[], AdmissionController] = AdmissionController, profile=None,
+                 router: Optional[SniRouter] = None):
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.context = context
+        self.restart_delay = restart_delay
+        self.admission = admission  # Builds each worker's own admission controller
+        self.profile = get_profile(profile or utils.TLS_PROFILE)
+        self.router = router
+        self.restarts = 0
+        self._pids: Dict[int, int] = {}  # pid -> slot
+        self._pipes: Dict[int, int] = {}  # read fd -> slot
+        self._buffers: Dict[int, bytes] = {}
+        self._latest: Dict[int, dict] = {}  # slot -> last report of its current process
+        self._retired = dict.fromkeys(COUNTERS, 0)  # totals of workers that have exited
+        self._retired_identities: Dict[str, int] = {}
+        self._started_at: Dict[int, float] = {}
+        self._placeholder: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Builds the shared server context and forks the workers.
+
+        Raises:
+            OSError: If fork or SO_REUSEPORT is unavailable or the port can't be bound
+        """
+        if not supported():
+            raise OSError(errno.ENOTSUP, "Forked listener workers need fork() and SO_REUSEPORT")
+        # Built before fork so all workers share one context and its ticket keys
+        if self.router is not None:
+            self.context = self.router.context()  # Every identity's context is prebuilt too
+        self.context = self.context or create_ssl_context(is_server=True, profile=self.profile)
+        # Joins the port's reuseport group without listening: fails early if the
+        # port is taken, resolves port 0, and keeps the port reserved across restarts
+        self._placeholder = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._placeholder.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self._placeholder.bind((self.host, self.port))
+        self.port = self._placeholder.getsockname()[1]
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+    def _spawn(self, slot: int):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(read_fd)
+                for fd in list(self._pipes):
+                    os.close(fd)
+                self._placeholder.close()
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor handles Ctrl-C
+                _Worker(slot, self.host, self.port, self.context, write_fd, self.admission, self.profile,
+                        self.router).run()
+            except BaseException as e:
+                print(f"{COLOR_ERROR}[ERROR] Worker {slot} failed: {e}{COLOR_RESET}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(write_fd)
+        with self._lock:
+            self._pids[pid] = slot
+            self._pipes[read_fd] = slot
+            self._buffers[read_fd] = b""
+            self._latest.pop(slot, None)
+            self._started_at[slot] = time.monotonic()
+
+    def _read_reports(self, timeout: float):
+        fds = list(self._pipes)
+        if not fds:
+            time.sleep(timeout)
+            return
+        ready, _, _ = select.select(fds, [], [], timeout)
+        for fd in ready:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                self._close_pipe(fd)
+                continue
+            data = self._buffers[fd] + chunk
+            *lines, self._buffers[fd] = data.split(b"\n")
+            for line in lines:
+                try:
+                    report = json.loads(line)
+                except ValueError:
+                    continue
+                with self._lock:
+                    self._latest[self._pipes[fd]] = report
+
+    def _close_pipe(self, fd: int):
+        with self._lock:
+            self._pipes.pop(fd, None)
+            self._buffers.pop(fd, None)
+        os.close(fd)
+
+    def _reap(self):
+        while self._pids:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            with self._lock:
+                slot = self._pids.pop(pid, None)
+                if slot is None:
+                    continue
+                last = self._latest.pop(slot, {})
+                for key in COUNTERS:
+                    self._retired[key] += last.get(key, 0)
+                for name, count in last.get("identities", {}).items():
+                    self._retired_identities[name] = self._retired_identities.get(name, 0) + count
+            if self._stopped.is_set():
+                continue
+            self.restarts += 1
+            print(f"{COLOR_ERROR}[INFO] Worker {slot} (pid {pid}) exited; restarting.{COLOR_RESET}")
+            # A worker that dies straight away shouldn't turn into a fork loop
+            wait = self._started_at[slot] + self.restart_delay - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._spawn(slot)
+
+    def poll(self, timeout: float = 0.5):
+        """One supervision step: collect reports, reap and restart workers."""
+        self._read_reports(timeout)
+        self._reap()
+
+    def serve_forever(self):
+        """Supervises until stop() is called."""
+        while not self._stopped.is_set():
+            self.poll()
+
+    def pids(self) -> List[int]:
+        with self._lock:
+            return list(self._pids)
+
+    def stats(self) -> dict:
+        """Aggregated worker counters."""
+        with self._lock:
+            out = dict(self._retired)
+            identities = dict(self._retired_identities)
+            reports = list(self._latest.values())
+            out["workers"] = len(self._pids)
+        out["sessions"] = 0
+        for report in reports:
+            for key in COUNTERS:
+                out[key] += report.get(key, 0)
+            out["sessions"] += report.get("sessions", 0)
+            for name, count in report.get("identities", {}).items():
+                identities[name] = identities.get(name, 0) + count
+        out["identities"] = identities
+        out["restarts"] = self.restarts
+        out["per_worker"] = sorted(reports, key=lambda r: r["slot"])
+        return out
+
+    def stop(self, timeout: float = 5.0):
+        """Terminates the workers and waits for them to exit."""
+        self._stopped.set()
+        for pid in self.pids():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        while self._pids and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid in self.pids():
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        with self._lock:
+            self._pids.clear()
+        for fd in list(self._pipes):
+            self._close_pipe(fd)
+        if self._placeholder is not None:
+            self._placeholder.close()
+            self._placeholder = None
+
+
+def print_stats(stats: dict):
+    print(f"Workers: {stats['workers']} (restarts={stats['restarts']}) | handshakes={stats['handshakes']} "
+          f"resumed={stats['resumed']} failures={stats['failures']} rejected={stats['rejected']} | "
+          f"sessions={stats['sessions']} in={stats['msgs_in']} msgs/{stats['bytes_in']} B")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process First Contact responder (SO_REUSEPORT).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Worker processes (default: LISTEN_WORKERS or CPU count, {DEFAULT_WORKERS})")
+    parser.add_argument("--port", type=int, default=LISTEN_TCP_PORT, help=f"TCP port (default: {LISTEN_TCP_PORT})")
+    parser.add_argument("--host", default="0.0.0.0", help="Bind address (default: 0.0.0.0)")
+    parser.add_argument("--profile", default=None, help="TLS profile: default, low-latency or bulk "
+                                                        "(default: TLS_PROFILE or 'default')")
+    parser.add_argument("--stats-interval", type=float, default=10.0,
+                        help="Seconds between aggregated stats lines, 0 to disable (default: 10)")
+    parser.add_argument("--identity", action="append", default=None,
+                        help="Serve this identity from keys/ (repeatable; selected by SNI, the first is the default)")
+    parser.add_argument("--all-identities", action="store_true",
+                        help="Serve every identity in keys/, selected by SNI (default identity: USER_ID)")
+    args = parser.parse_args()
+
+    router = None
+    if args.identity or args.all_identities:
+        router = SniRouter(default=None if args.identity else utils.MY_USER_ID, profile=args.profile)
+        try:
+            router.load_keys_dir("keys", names=args.identity)
+            router.context()
+        except (OSError, ValueError, ssl.SSLError) as e:
+            print(f"{COLOR_ERROR}FATAL: Could not load identities: {e}{COLOR_RESET}")
+            raise SystemExit(1)
+        print(f"Serving {len(router)} identities: {', '.join(router.names()[:10])}"
+              f"{' ...' if len(router) > 10 else ''}")
+    try:
+        supervisor = WorkerSupervisor(workers=args.workers, port=args.port, host=args.host, profile=args.profile,
+                                      router=router)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        supervisor.start()
+    except (OSError, FileNotFoundError, ValueError) as e:
+        print(f"{COLOR_ERROR}FATAL: Could not start listener workers: {e}{COLOR_RESET}")
+        supervisor.stop()
+        raise SystemExit(1)
+
+    def _terminate(signum, frame):
+        raise KeyboardInterrupt  # Same clean shutdown as Ctrl-C
+
+    signal.signal(signal.SIGTERM, _terminate)
+    print(f"{COLOR_SUCCESS}Listening on port {supervisor.port} with {args.workers} workers.{COLOR_RESET}")
+    next_stats = time.monotonic() + args.stats_interval
+    try:
+        while True:
+            supervisor.poll()
+            if args.stats_interval and time.monotonic() >= next_stats:
+                print_stats(supervisor.stats())
+                next_stats = time.monotonic() + args.stats_interval
+    except KeyboardInterrupt:
+        print()
+    finally:
+        supervisor.stop()
+        print_stats(supervisor.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+CPU cost of a mutual-TLS handshake, without sockets or threads.
+
+Both ends run in this process over ssl.MemoryBIO (tests/utils/memtls.py)
+with the contexts app.utils.create_ssl_context builds, on a
+production-shaped RSA-2048 CA made with the real CA tooling. No kernel,
+scheduler or network time is included, so the numbers are stable enough to
+compare profiles and validation modes between commits:
+  - tls:        median ms for the TLS handshake alone (both ends' CPU)
+  - validated:  the same plus app.handshake's peer checks on both ends,
+                in utils.VALIDATION_MODE "tls" and "full"
+
+Usage:
+  python benchmarks/handshake_cpu.py
+  python benchmarks/handshake_cpu.py --handshakes 500 --json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import statistics
+import importlib.util
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.validation import _make_identities  # noqa: E402
+
+
+def _load(name: str):
+    path = os.path.join(REPO_ROOT, "tests", "utils", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(f"tests_utils_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _pair(transport):
+    a, b = transport.DirectTransport(), transport.DirectTransport()
+    a.attach_peer(b)
+    b.attach_peer(a)
+    return a, b
+
+
+def measure(paths, profile: str, handshakes: int) -> dict:
+    from app import utils
+    from app.utils import create_ssl_context
+
+    memtls, transport = _load("memtls"), _load("transport")
+    s_cert, s_key = paths["Bench-Server"]
+    c_cert, c_key = paths["Bench-Client"]
+    server_ctx = create_ssl_context(is_server=True, ca_path=paths["ca"], cert_path=s_cert, key_path=s_key,
+                                    profile=profile)
+    client_ctx = create_ssl_context(is_server=False, ca_path=paths["ca"], cert_path=c_cert, key_path=c_key,
+                                    profile=profile)
+    utils.CA_ROOT_PATH = paths["ca"]
+
+    def run(validate: bool):
+        samples = []
+        for _ in range(handshakes):
+            start = time.perf_counter()
+            client, server = memtls.connect(client_ctx, server_ctx, _pair(transport))
+            if validate:
+                memtls.validate(client, "Bench-Server")
+                memtls.validate(server)
+            samples.append((time.perf_counter() - start) * 1000.0)
+        return round(statistics.median(samples), 3), client.obj.version(), client.obj.cipher()[0]
+
+    tls_ms, version, cipher = run(validate=False)
+    result = {"version": version, "cipher": cipher, "tls_ms": tls_ms}
+    for mode in ("tls", "full"):
+        utils.VALIDATION_MODE = mode
+        with contextlib.redirect_stdout(io.StringIO()):
+            result[f"validated_{mode}_ms"] = run(validate=True)[0]
+    return result
+
+
+def run(handshakes: int = 200, profiles=None):
+    from app import utils
+    from app.profiles import PROFILES
+
+    workdir = tempfile.mkdtemp(prefix="fcp_hs_cpu_")
+    cwd = os.getcwd()
+    saved = (utils.CA_ROOT_PATH, utils.VALIDATION_MODE)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            paths = _make_identities(workdir)
+        results = {name: measure(paths, name, handshakes) for name in (profiles or PROFILES)}
+    finally:
+        utils.CA_ROOT_PATH, utils.VALIDATION_MODE = saved
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"handshakes": handshakes, "profiles": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure handshake CPU cost in memory.")
+    parser.add_argument("--handshakes", type=int, default=200, help="Handshakes per measurement (default: 200)")
+    parser.add_argument("--profile", action="append", help="Only these profiles (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Emit the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.handshakes, args.profile)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"=== IN-MEMORY HANDSHAKE CPU (RSA-2048 CA, {report['handshakes']} handshakes, median) ===")
+    for name, r in report["profiles"].items():
+        print(f"{name:<12} {r['version']:<8} {r['cipher']:<28} tls={r['tls_ms']:7.3f} ms  "
+              f"+validation(tls)={r['validated_tls_ms']:7.3f} ms  +validation(full)={r['validated_full_ms']:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
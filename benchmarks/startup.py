@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark and regression budget.
+
+Measures, in fresh interpreters:
+  - import cost of `app.cli` and `ca_tool` (via `python -X importtime`)
+  - time-to-prompt: spawn `python -m app.cli` until it prints its `> ` prompt
+  - time-to-first-handshake: spawn a process that imports the handshake code
+    and completes one mutual-TLS handshake (incl. certificate validation)
+  - `ca_tool.py --help`, the argument-parsing cold path `setup.py` pays for
+
+Exits non-zero if a median exceeds its budget.
+
+Usage:
+  python benchmarks/startup.py
+  python benchmarks/startup.py --runs 10 --json
+  python benchmarks/startup.py --importtime          # show the heaviest imports
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import contextlib
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Medians above these (milliseconds) fail the run. Generous enough for a
+# loaded CI box; the import of cryptography alone used to blow through them.
+BUDGETS_MS = {
+    "import_app_cli": 200.0,
+    "import_ca_tool": 100.0,
+    "time_to_prompt": 600.0,
+    "ca_tool_help": 400.0,
+    "time_to_first_handshake": 2000.0,
+}
+
+# Heavy modules that must not be loaded just to start the CLI or parse ca_tool args
+DEFERRED_MODULES = ("cryptography", "certificate_validation", "build_ca")
+
+_HANDSHAKE_CHILD = r"""
+import socket, sys, threading
+from app import utils
+from app.handshake import initiate_tls_handshake
+
+ca, c_cert, c_key, s_cert, s_key = sys.argv[1:6]
+listener = socket.socket()
+listener.bind(("127.0.0.1", 0))
+listener.listen(1)
+
+def serve():
+    raw, _ = listener.accept()
+    ctx = utils.create_ssl_context(is_server=True, ca_path=ca, cert_path=s_cert, key_path=s_key)
+    conn = ctx.wrap_socket(raw, server_side=True)
+    conn.read(1)
+
+threading.Thread(target=serve, daemon=True).start()
+utils.CA_ROOT_PATH, utils.USER_CERT_PATH, utils.USER_KEY_PATH = ca, c_cert, c_key
+session = initiate_tls_handshake("127.0.0.1", listener.getsockname()[1])
+print("HANDSHAKE_OK" if session else "HANDSHAKE_FAILED", flush=True)
+"""
+
+
+def _env(**extra) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.update(extra)
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_profile(statement: str, cwd: str = REPO_ROOT):
+    """Runs `python -X importtime -c statement`.
+
+    Returns:
+        (total_ms, {module: cumulative_ms}) for the imports it triggered
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=cwd, env=_env(), capture_output=True, text=True, check=True)
+    modules = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name_field = line[len("import time:"):].split("|")
+        ms = int(cumulative) / 1000.0
+        name = name_field.strip()
+        modules[name] = ms
+        # Nesting is shown by indentation; top-level imports add up to the total
+        if len(name_field) - len(name_field.lstrip()) == 1:
+            total += ms
+    return total, modules
+
+
+def time_to_prompt(workdir: str) -> float:
+    """Milliseconds from spawning `python -m app.cli` to its first prompt."""
+    env = _env(USER_ID="Bench-Prompt", LISTEN_TCP_PORT=str(_free_port()), DISCOVERY="0")
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "app.cli"], cwd=workdir, env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        seen = b""
+        while not seen.endswith(b"> "):
+            ch = proc.stdout.read(1)
+            if not ch:
+                raise RuntimeError("app.cli exited before showing its prompt")
+            seen += ch
+        elapsed = (time.perf_counter() - start) * 1000.0
+        proc.stdin.write(b"exit\n")
+        proc.stdin.flush()
+    finally:
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return elapsed
+
+
+def time_to_first_handshake(workdir: str, paths) -> float:
+    """Milliseconds from spawning a fresh interpreter to a validated handshake."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", _HANDSHAKE_CHILD, *paths], cwd=workdir,
+                            env=_env(), capture_output=True, text=True, timeout=30)
+    elapsed = (time.perf_counter() - start) * 1000.0
+    if "HANDSHAKE_OK" not in result.stdout:
+        raise RuntimeError(f"handshake failed: {result.stdout}{result.stderr}")
+    return elapsed
+
+
+def ca_tool_help() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(REPO_ROOT, "ca_tool.py"), "--help"],
+                   env=_env(), capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000.0
+
+
+def _make_identities(workdir: str):
+    """Creates a CA and two identities in workdir with the real CA tooling."""
+    from build_ca import create_ca, issue_cert
+    from ca_tool import generate_user_keypair
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        create_ca()
+        paths = [os.path.abspath("ca/root_cert.pem")]
+        for name in ("Bench-Client", "Bench-Server"):
+            with open(generate_user_keypair(name), "rb") as f:
+                cert_pem = issue_cert(name, f.read(), valid_days=1)
+            cert_path = os.path.abspath(os.path.join("keys", f"{name}_cert.pem"))
+            with open(cert_path, "wb") as f:
+                f.write(cert_pem)
+            paths += [cert_path, os.path.abspath(os.path.join("keys", f"{name}_key.pem"))]
+        return paths
+    finally:
+        os.chdir(cwd)
+
+
+def deferred_modules_loaded(statement: str):
+    """Returns the heavy modules that `statement` pulls in eagerly."""
+    probe = (f"import sys; {statement}; "
+             f"print(','.join(sorted({{m.split('.')[0] for m in sys.modules}} & set({DEFERRED_MODULES!r}))))")
+    result = subprocess.run([sys.executable, "-c", probe], cwd=REPO_ROOT, env=_env(),
+                            capture_output=True, text=True, check=True)
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def run(runs: int = 5):
+    """Runs every measurement `runs` times and returns the report dict."""
+    workdir = tempfile.mkdtemp(prefix="fcp_startup_")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            paths = _make_identities(workdir)
+        samples = {name: [] for name in BUDGETS_MS}
+        for _ in range(runs):
+            samples["import_app_cli"].append(import_profile("import app.cli")[0])
+            samples["import_ca_tool"].append(import_profile("import ca_tool")[0])
+            samples["time_to_prompt"].append(time_to_prompt(workdir))
+            samples["ca_tool_help"].append(ca_tool_help())
+            samples["time_to_first_handshake"].append(time_to_first_handshake(workdir, paths))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"runs": runs, "metrics": {}, "eager_heavy_imports": {}}
+    for name, values in samples.items():
+        median = statistics.median(values)
+        report["metrics"][name] = {
+            "median_ms": round(median, 1),
+            "min_ms": round(min(values), 1),
+            "budget_ms": BUDGETS_MS[name],
+            "ok": median <= BUDGETS_MS[name],
+        }
+    for statement in ("import app.cli", "import ca_tool"):
+        report["eager_heavy_imports"][statement] = deferred_modules_loaded(statement)
+    report["ok"] = (all(m["ok"] for m in report["metrics"].values())
+                    and not any(report["eager_heavy_imports"].values()))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark with regression budgets.")
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions per measurement (default: 5)")
+    parser.add_argument("--json", action="store_true", help="Emit the report as JSON")
+    parser.add_argument("--importtime", action="store_true", help="Only print the heaviest imports")
+    parser.add_argument("--top", type=int, default=15, help="Modules to show with --importtime")
+    args = parser.parse_args()
+
+    if args.importtime:
+        for statement in ("import app.cli", "import ca_tool"):
+            total, modules = import_profile(statement)
+            print(f"\n{statement}: {total:.1f} ms")
+            for name, ms in sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+                print(f"  {ms:8.1f} ms  {name}")
+        return
+
+    report = run(args.runs)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"=== STARTUP BENCHMARK ({report['runs']} runs) ===")
+        for name, m in report["metrics"].items():
+            status = "✓" if m["ok"] else "✗"
+            print(f"{status} {name:<24} median={m['median_ms']:>7.1f} ms  min={m['min_ms']:>7.1f} ms  "
+                  f"budget={m['budget_ms']:.0f} ms")
+        for statement, eager in report["eager_heavy_imports"].items():
+            status = "✓" if not eager else "✗"
+            print(f"{status} {statement!r} defers heavy imports" + (f" (eager: {', '.join(eager)})" if eager else ""))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Per-handshake certificate validation cost.
+
+Compares the two utils.VALIDATION_MODE settings on a production-shaped
+(RSA-2048) CA built with the real CA tooling:
+  - full: Python re-verifies the CA signature on the peer certificate
+  - tls:  trusts OpenSSL's chain verification and applies only the
+          identity, validity and revocation checks
+
+and, end to end, the wall time of complete mutual-TLS handshakes in each
+mode (the saving is a small slice of a handshake, so expect noise there).
+
+Usage:
+  python benchmarks/validation.py
+  python benchmarks/validation.py --iterations 5000 --handshakes 200 --json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import contextlib
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def _make_identities(workdir: str):
+    """Creates an RSA CA and two identities in workdir; returns their paths."""
+    from build_ca import create_ca, issue_cert
+    from ca_tool import generate_user_keypair
+
+    os.chdir(workdir)
+    create_ca()
+    paths = {"ca": os.path.abspath("ca/root_cert.pem")}
+    for name in ("Bench-Client", "Bench-Server"):
+        with open(generate_user_keypair(name), "rb") as f:
+            cert_pem = issue_cert(name, f.read(), valid_days=1)
+        cert_path = os.path.abspath(os.path.join("keys", f"{name}_cert.pem"))
+        with open(cert_path, "wb") as f:
+            f.write(cert_pem)
+        paths[name] = (cert_path, os.path.abspath(os.path.join("keys", f"{name}_key.pem")))
+    return paths
+
+
+def time_validation(paths, iterations: int):
+    """Microseconds per validate_cert call, per mode."""
+    import ssl
+    import certificate_validation
+
+    with open(paths["Bench-Server"][0]) as f:
+        der = ssl.PEM_cert_to_DER_cert(f.read())
+    anchor = certificate_validation.load_trust_anchor(paths["ca"])
+    results = {}
+    for mode in ("full", "tls"):
+        verify = mode == "full"
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                certificate_validation.validate_cert(der, anchor, "Bench-Server", verify_signature=verify)
+            elapsed = time.perf_counter() - start
+        results[mode] = elapsed / iterations * 1e6
+    return results
+
+
+def time_handshakes(paths, handshakes: int):
+    """Milliseconds per complete mutual-TLS handshake, per client validation mode."""
+    from app import utils
+    from app.handshake import initiate_tls_handshake
+
+    s_cert, s_key = paths["Bench-Server"]
+    c_cert, c_key = paths["Bench-Client"]
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(64)
+    port = listener.getsockname()[1]
+    server_ctx = utils.create_ssl_context(is_server=True, ca_path=paths["ca"], cert_path=s_cert, key_path=s_key)
+
+    def serve():
+        # TLS only on the server side, so the difference is the client's validation
+        while True:
+            try:
+                raw, addr = listener.accept()
+            except OSError:
+                return
+            try:
+                conn = server_ctx.wrap_socket(raw, server_side=True)
+                conn.close()
+            except (OSError, ValueError):
+                pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    utils.CA_ROOT_PATH, utils.USER_CERT_PATH, utils.USER_KEY_PATH = paths["ca"], c_cert, c_key
+    results = {}
+    try:
+        for mode in ("full", "tls"):
+            utils.VALIDATION_MODE = mode
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                for _ in range(handshakes):
+                    session = initiate_tls_handshake("127.0.0.1", port, expected_peer_id="Bench-Server")
+                    if session is None:
+                        raise RuntimeError(f"handshake failed in {mode} mode")
+                    session.close()
+                elapsed = time.perf_counter() - start
+            results[mode] = elapsed / handshakes * 1000.0
+    finally:
+        listener.close()
+    return results
+
+
+def run(iterations: int = 2000, handshakes: int = 100):
+    workdir = tempfile.mkdtemp(prefix="fcp_validation_")
+    cwd = os.getcwd()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            paths = _make_identities(workdir)
+        validation = time_validation(paths, iterations)
+        handshake = time_handshakes(paths, handshakes)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "iterations": iterations,
+        "handshakes": handshakes,
+        "validate_cert_us": {k: round(v, 1) for k, v in validation.items()},
+        "validate_cert_saved_pct": round(100.0 * (1 - validation["tls"] / validation["full"]), 1),
+        "handshake_ms": {k: round(v, 3) for k, v in handshake.items()},
+        "handshake_saved_pct": round(100.0 * (1 - handshake["tls"] / handshake["full"]), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full vs TLS-trusting certificate validation.")
+    parser.add_argument("--iterations", type=int, default=2000, help="validate_cert calls per mode (default: 2000)")
+    parser.add_argument("--handshakes", type=int, default=100, help="Handshakes per mode (default: 100)")
+    parser.add_argument("--json", action="store_true", help="Emit the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.iterations, args.handshakes)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print("=== CERTIFICATE VALIDATION BENCHMARK (RSA-2048 CA) ===")
+    v, h = report["validate_cert_us"], report["handshake_ms"]
+    print(f"validate_cert: full={v['full']:.1f} us  tls={v['tls']:.1f} us  "
+          f"(saved {report['validate_cert_saved_pct']}%)")
+    print(f"handshake:     full={h['full']:.3f} ms  tls={h['tls']:.3f} ms  "
+          f"(saved {report['handshake_saved_pct']}%)")
+
+
+if __name__ == "__main__":
+    main()
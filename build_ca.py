@@ -4,6 +4,42 @@ from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 import datetime, os
 
+INTERMEDIATES_DIR = os.path.join("ca", "intermediates")
+INTERMEDIATE_CN_PREFIX = "First Contact Issuing CA "
+
+def intermediate_paths(name):
+    """Returns (cert_path, key_path) for the intermediate CA called name."""
+    return (os.path.join(INTERMEDIATES_DIR, f"{name}_cert.pem"),
+            os.path.join(INTERMEDIATES_DIR, f"{name}_key.pem"))
+
+def load_issuer(issuer=None):
+    """Loads (key, cert) of the root CA, or of the named intermediate CA."""
+    if issuer is None:
+        cert_path, key_path = "ca/root_cert.pem", "ca/root_key.pem"
+    else:
+        cert_path, key_path = intermediate_paths(issuer)
+        if not os.path.exists(cert_path):
+            raise FileNotFoundError(f"Intermediate CA not found: {cert_path}")
+    with open(key_path, "rb") as f:
+        key = serialization.load_pem_private_key(f.read(), password=None)
+    with open(cert_path, "rb") as f:
+        cert = x509.load_pem_x509_certificate(f.read())
+    return key, cert
+
+def issuer_of(cert):
+    """Name of the intermediate CA that issued cert, or None if the root (or anyone else) did."""
+    cn = cert.issuer.get_attributes_for_oid(NameOID.COMMON_NAME)
+    if cn and cn[0].value.startswith(INTERMEDIATE_CN_PREFIX):
+        return cn[0].value[len(INTERMEDIATE_CN_PREFIX):]
+    return None
+
+def issuer_chain_pem(issuer=None):
+    """PEM certificates to serve after a leaf issued by issuer (empty for the root)."""
+    if issuer is None:
+        return b""
+    with open(intermediate_paths(issuer)[0], "rb") as f:
+        return f.read()
+
 def create_ca():
     key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
     subject = issuer = x509.Name([
@@ -36,11 +72,59 @@ def create_ca():
         f.write(cert.public_bytes(serialization.Encoding.PEM))
     print("CA created at ./ca/root_cert.pem")
 
-def issue_cert(username, user_pubkey_pem, valid_days: int = 30):
-    with open("ca/root_key.pem", "rb") as f:
-        ca_key = serialization.load_pem_private_key(f.read(), password=None)
-    with open("ca/root_cert.pem", "rb") as f:
-        ca_cert = x509.load_pem_x509_certificate(f.read())
+def create_intermediate(name, valid_days: int = 180):
+    """Creates an issuing CA signed by the root, so the root key can stay offline.
+
+    The intermediate may only sign leaves (path_length=0). Its key and cert
+    are written to ca/intermediates/<name>_key.pem and <name>_cert.pem.
+    """
+    root_key, root_cert = load_issuer()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    subject = x509.Name([
+        x509.NameAttribute(NameOID.COUNTRY_NAME, "US"),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, "FirstContactCA"),
+        x509.NameAttribute(NameOID.COMMON_NAME, f"{INTERMEDIATE_CN_PREFIX}{name}"),
+    ])
+    root_not_after = getattr(root_cert, "not_valid_after_utc", None) or root_cert.not_valid_after
+    not_after = min(datetime.datetime.utcnow() + datetime.timedelta(days=valid_days),
+                    root_not_after.replace(tzinfo=None))
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(root_cert.subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(datetime.datetime.utcnow())
+        .not_valid_after(not_after)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+        .add_extension(x509.KeyUsage(digital_signature=True, content_commitment=False, key_encipherment=False, data_encipherment=False, key_agreement=False, key_cert_sign=True, crl_sign=True, encipher_only=False, decipher_only=False), critical=True)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(root_key.public_key()), critical=False)
+        .sign(root_key, hashes.SHA256())
+    )
+    cert_path, key_path = intermediate_paths(name)
+    os.makedirs(INTERMEDIATES_DIR, exist_ok=True)
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    print(f"Intermediate CA created at ./{cert_path}")
+    return cert_path
+
+def issue_cert(username, user_pubkey_pem, valid_days: int = 30, issuer=None, ca_key=None, ca_cert=None):
+    """Issues a leaf certificate, signed by the root or by the named intermediate CA.
+
+    Returns only the leaf PEM; append issuer_chain_pem(issuer) to it in the
+    file the peer serves so the other side can build the chain. Long-running
+    callers pass the signing `ca_key` and `ca_cert` (see load_issuer) to skip
+    reading them from disk.
+    """
+    if ca_key is None or ca_cert is None:
+        ca_key, ca_cert = load_issuer(issuer)
 
     user_pubkey = serialization.load_pem_public_key(user_pubkey_pem)
     subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, username)])
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Long-running CA signing service.
+
+Keeps the CA key material loaded and serves issue, renew and revoke
+requests over a local Unix socket. Every request goes through one queue
+drained by a single writer thread, which takes whatever is waiting as a
+batch: leaf certificates are signed back to back with the preloaded keys,
+all revocations in the batch become one CRL commit with one signature, and
+issued certificates reach the Merkle log through a LogSequencer (one append
+and one signed tree head per log batch). Each logged certificate is then
+recorded in the inventory (inventory.py).
+
+Protocol: one JSON object per line, any number per connection.
+  {"op": "issue", "username": "...", "pubkey_pem": "...", "valid_days": 30, "issuer": null}
+  {"op": "renew", ...}                      same fields; valid_days defaults to 7
+  {"op": "revoke", "serials": [1234], "reason": "keyCompromise"}
+  {"op": "stats"}
+Responses carry the result fields, or {"error": "..."}.
+
+Usage:
+  python ca_daemon.py                          # serve on ca/ca.sock
+  python ca_daemon.py --socket /tmp/fcp-ca.sock --batch-delay 0.01 --log-delay 0.05
+"""
+
+import os
+import json
+import time
+import queue
+import signal
+import socket
+import sqlite3
+import argparse
+import threading
+import collections
+import socketserver
+from concurrent.futures import Future
+from typing import Optional
+
+import crl
+from inventory import Inventory
+from sequencer import LogSequencer
+
+SOCKET_PATH = os.environ.get("CA_SOCKET", os.path.join("ca", "ca.sock"))
+DEFAULT_BATCH_DELAY = 0.0   # Batch whatever is already queued; raise to trade latency for bigger batches
+DEFAULT_MAX_BATCH = 256
+DEFAULT_LOG_DELAY = 0.05
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+STATS_WINDOW = 4096
+OPS = ("issue", "renew", "revoke")
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class _Job:
+    __slots__ = ("op", "request", "future", "enqueued")
+
+    def __init__(self, op: str, request: dict):
+        self.op = op
+        self.request = request
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class CAService:
+    """Single-writer request queue over preloaded CA keys."""
+    def __init__(self, batch_delay: float = DEFAULT_BATCH_DELAY, max_batch: int = DEFAULT_MAX_BATCH,
+                 log_delay: float = DEFAULT_LOG_DELAY):
+        from build_ca import load_issuer
+
+        self.batch_delay = batch_delay
+        self.max_batch = max_batch
+        root_key, root_cert = load_issuer()
+        self._root_key = root_key
+        self._issuers = {None: (root_key, root_cert, b"")}  # name -> (key, cert, chain PEM)
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self.sequencer = LogSequencer(max_merge_delay=log_delay, ca_key=root_key)
+        self.inventory = Inventory()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = time.monotonic()
+        self._stats_lock = threading.Lock()
+        self._requests = collections.Counter()
+        self._completed = 0
+        self._errors = 0
+        self._batches = 0
+        self._batched_jobs = 0
+        self._crl_commits = 0
+        self._queue_latency = collections.deque(maxlen=STATS_WINDOW)
+
+    def submit(self, request: dict) -> Future:
+        """Queues an issue/renew/revoke request. The Future resolves to its response."""
+        op = request.get("op")
+        if op not in OPS:
+            raise ValueError(f"Unknown operation: {op}")
+        job = _Job(op, request)
+        job.future.add_done_callback(self._count_done)
+        with self._stats_lock:
+            self._requests[op] += 1
+        self._queue.put(job)
+        return job.future
+
+    def handle(self, request: dict, timeout: float = 60.0) -> dict:
+        """Runs one request to completion (stats are answered directly)."""
+        if request.get("op") == "stats":
+            return self.stats()
+        return self.submit(request).result(timeout)
+
+    def _count_done(self, future: Future):
+        with self._stats_lock:
+            if future.exception() is None:
+                self._completed += 1
+            else:
+                self._errors += 1
+
+    # --- writer thread ---------------------------------------------------
+
+    def _next_batch(self):
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)  # Stop once this batch is done
+                break
+            batch.append(job)
+        return batch
+
+    def _signer(self, issuer):
+        if issuer not in self._issuers:
+            from build_ca import issuer_chain_pem, load_issuer
+            key, cert = load_issuer(issuer)
+            self._issuers[issuer] = (key, cert, issuer_chain_pem(issuer))
+        return self._issuers[issuer]
+
+    def _sign(self, job: _Job):
+        from cryptography import x509
+        from build_ca import issue_cert
+
+        req = job.request
+        issuer = req.get("issuer")
+        key, cert, chain_pem = self._signer(issuer)
+        valid_days = int(req.get("valid_days") or (7 if job.op == "renew" else 30))
+        cert_pem = issue_cert(req["username"], req["pubkey_pem"].encode("ascii"), valid_days=valid_days,
+                              issuer=issuer, ca_key=key, ca_cert=cert)
+        serial = x509.load_pem_x509_certificate(cert_pem).serial_number
+        return {"cert_pem": cert_pem.decode("ascii"), "chain_pem": chain_pem.decode("ascii"), "serial": serial}
+
+    def _commit_revocations(self, jobs):
+        by_reason = collections.defaultdict(list)
+        for job in jobs:
+            by_reason[job.request.get("reason") or "unspecified"].append(job)
+        for reason, group in by_reason.items():
+            try:
+                serials = [[int(s) for s in job.request.get("serials", [])] for job in group]
+                added = set(crl.revoke_many([s for job_serials in serials for s in job_serials],
+                                            reason=reason, ca_key=self._root_key))
+            except Exception as e:
+                for job in group:
+                    job.future.set_exception(e)
+                continue
+            self._crl_commits += 1
+            for job, job_serials in zip(group, serials):
+                mine = []
+                for serial in job_serials:
+                    if serial in added:  # Each new revocation is credited to the first job naming it
+                        added.discard(serial)
+                        mine.append(serial)
+                job.future.set_result({"revoked": mine, "already_revoked": len(job_serials) - len(mine)})
+
+    def _process(self, batch):
+        started = time.monotonic()
+        with self._stats_lock:
+            self._batches += 1
+            self._batched_jobs += len(batch)
+            self._queue_latency.extend(started - job.enqueued for job in batch)
+
+        revocations = []
+        for job in batch:
+            if job.op == "revoke":
+                revocations.append(job)
+                continue
+            try:
+                result = self._sign(job)
+            except Exception as e:
+                job.future.set_exception(e)
+                continue
+            # Answer once the leaf is in the log; the writer moves on meanwhile
+            logged = self.sequencer.submit(result["cert_pem"].encode("ascii"))
+            logged.add_done_callback(lambda f, job=job, result=result: self._logged(job, result, f))
+        if revocations:
+            self._commit_revocations(revocations)
+
+    def _logged(self, job: _Job, result: dict, logged: Future):
+        if logged.exception() is None:
+            result["index"] = logged.result()["index"]
+        else:
+            result["index"] = None
+            result["log_error"] = str(logged.exception())
+        try:
+            self.inventory.add(result["cert_pem"].encode("ascii"), job.op, job.request.get("issuer"), result["index"])
+        except sqlite3.Error as e:
+            print(f"Warning: certificate inventory not updated: {e}")
+        job.future.set_result(result)
+
+    def start(self):
+        """Starts the writer and log sequencer threads."""
+        if self._thread is not None:
+            return
+        self.sequencer.start()
+
+        def _loop():
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._process(batch)
+
+        self._thread = threading.Thread(target=_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Finishes queued requests, then stops the writer and the sequencer."""
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.sequencer.stop(timeout)
+        self.inventory.close()
+
+    def stats(self) -> dict:
+        """Throughput, batching and queue-latency figures since start."""
+        with self._stats_lock:
+            uptime = time.monotonic() - self._started_at
+            latency = sorted(self._queue_latency)
+            return {
+                "uptime_s": round(uptime, 3),
+                "queue_depth": self._queue.qsize(),
+                "requests": dict(self._requests),
+                "completed": self._completed,
+                "errors": self._errors,
+                "throughput_per_s": round(self._completed / uptime, 2) if uptime > 0 else 0.0,
+                "batches": self._batches,
+                "avg_batch": round(self._batched_jobs / self._batches, 2) if self._batches else 0.0,
+                "crl_commits": self._crl_commits,
+                "log": dict(self.sequencer.stats),
+                "queue_latency_ms": {
+                    "p50": round(_percentile(latency, 50) * 1000, 3) if latency else None,
+                    "p99": round(_percentile(latency, 99) * 1000, 3) if latency else None,
+                    "max": round(latency[-1] * 1000, 3) if latency else None,
+                },
+            }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_REQUEST_BYTES)
+            if not line:
+                return
+            try:
+                response = self.server.service.handle(json.loads(line.decode("utf-8")))
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write(json.dumps(response, sort_keys=True).encode("utf-8") + b"\n")
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class DaemonServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        # socketserver's default of 5 is too small for a burst of issuers: a full
+        # Unix socket backlog fails their connect() with EAGAIN instead of queueing
+        request_queue_size = 128
+
+        def __init__(self, path: str, service: CAService):
+            if os.path.exists(path):
+                try:
+                    request({"op": "stats"}, path=path, timeout=1.0)
+                except (OSError, ValueError):
+                    os.remove(path)  # Left behind by a daemon that didn't shut down cleanly
+                else:
+                    raise RuntimeError(f"A CA daemon is already listening on {path}")
+            super().__init__(path, _Handler)
+            os.chmod(path, 0o600)  # Only the CA operator may ask for signatures
+            self.service = service
+
+
+def request(payload: dict, path: str = SOCKET_PATH, timeout: float = 60.0) -> dict:
+    """Sends one request to a running daemon and returns its response.
+
+    Raises:
+        OSError: If no daemon is listening on path
+        ValueError: If the daemon reported an error
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("Unix domain sockets are not available on this platform")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline(MAX_REQUEST_BYTES)
+    if not line:
+        raise OSError("CA daemon closed the connection")
+    response = json.loads(line.decode("utf-8"))
+    if "error" in response:
+        raise ValueError(f"CA daemon error: {response['error']}")
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running CA signing service.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help=f"Unix socket path (default: {SOCKET_PATH})")
+    parser.add_argument("--batch-delay", type=float, default=DEFAULT_BATCH_DELAY,
+                        help="Seconds to wait for more requests before processing a batch (default: 0)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help=f"Requests per batch (default: {DEFAULT_MAX_BATCH})")
+    parser.add_argument("--log-delay", type=float, default=DEFAULT_LOG_DELAY,
+                        help=f"Merkle log max-merge-delay in seconds (default: {DEFAULT_LOG_DELAY})")
+    args = parser.parse_args()
+
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        print("Error: the CA daemon needs Unix domain sockets; use ca_tool.py directly.")
+        raise SystemExit(1)
+
+    service = CAService(batch_delay=args.batch_delay, max_batch=args.max_batch, log_delay=args.log_delay)
+    service.start()
+    server = DaemonServer(args.socket, service)
+
+    def _terminate(signum, frame):
+        raise KeyboardInterrupt  # Same clean shutdown as Ctrl-C
+
+    signal.signal(signal.SIGTERM, _terminate)
+    print(f"CA daemon listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.server_close()
+        service.stop(timeout=10)
+        try:
+            os.remove(args.socket)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,23 @@
 import sys
 import os
+import json
+import time
 import argparse
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import serialization
 
-from build_ca import create_ca, issue_cert 
 import crl
 import merkle_log
-from cryptography import x509
-from cryptography.hazmat.primitives import serialization
+
+# build_ca and cryptography are imported by the commands that need them, so
+# argument parsing (and `--help`) doesn't pay for loading the crypto stack.
+# When a CA daemon (ca_daemon.py) is running, issue/renew/revoke are sent to
+# it and nothing here touches the CA key; otherwise they run locally. Either
+# way they are recorded in the certificate inventory (inventory.py).
 
 
 def generate_user_keypair(username: str):
     """Generates an RSA key pair for a user and saves them in the keys/ directory."""
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives import serialization
     
     # 1. Generate RSA Private Key
     # NOTE: Key size must match CA's expectations (2048 here, same as build_ca.py)
@@ -46,6 +51,112 @@ def generate_user_keypair(username: str):
     return pub_path
 
 
+def user_serials(username: str, inv=None):
+    """Serials of username's unexpired, unrevoked certificates, newest first.
+
+    Looked up in the inventory; a user it doesn't know (e.g. issued before it
+    existed) falls back to keys/<username>_cert.pem. Empty if neither has one.
+    """
+    import inventory
+
+    if inv is None:
+        with inventory.Inventory() as inv:
+            return user_serials(username, inv)
+    serials = [int(row["serial"], 16) for row in inv.for_user(username, active_only=True)]
+    if serials or inv.for_user(username):
+        return serials
+    cert_path = os.path.join("keys", f"{username}_cert.pem")
+    if not os.path.exists(cert_path):
+        return []
+    from cryptography import x509
+    with open(cert_path, "rb") as f:
+        return [x509.load_pem_x509_certificate(f.read()).serial_number]
+
+
+def read_revocation_batch(path: str):
+    """Reads serials and usernames (one per line, '#' comments) from path.
+
+    Decimal or 0x-prefixed hex tokens are serials; anything else is a
+    username, resolved by user_serials().
+
+    Returns:
+        (serials, missing): serials to revoke, and usernames without a certificate
+    """
+    import inventory
+
+    serials, missing = [], []
+    with open(path, "r", encoding="utf-8") as f, inventory.Inventory() as inv:
+        for line in f:
+            token = line.split("#", 1)[0].strip()
+            if not token:
+                continue
+            if token.isdigit():
+                serials.append(int(token))
+                continue
+            if token.lower().startswith("0x"):
+                try:
+                    serials.append(int(token, 16))
+                    continue
+                except ValueError:
+                    pass
+            found = user_serials(token, inv)
+            if not found:
+                missing.append(token)
+            serials.extend(found)
+    return serials, missing
+
+
+def _daemon_request(payload: dict):
+    """Sends payload to the CA daemon. Returns None if no daemon is running."""
+    import ca_daemon
+
+    if not os.path.exists(ca_daemon.SOCKET_PATH):
+        return None
+    try:
+        return ca_daemon.request(payload)
+    except OSError as e:
+        print(f"Warning: CA daemon not reachable ({e}); running locally")
+        return None
+
+
+def issue_certificate(username: str, user_pubkey_pem: bytes, valid_days: int, issuer=None, op: str = "issue"):
+    """Issues a certificate through the CA daemon if one is running, else locally.
+
+    Returns:
+        (cert_pem, chain_pem, log_index); log_index is None if the Merkle append failed
+
+    Raises:
+        ValueError: If the daemon rejected the request
+        FileNotFoundError: If the issuing CA doesn't exist (local mode)
+    """
+    response = _daemon_request({"op": op, "username": username, "pubkey_pem": user_pubkey_pem.decode("ascii"),
+                                "valid_days": valid_days, "issuer": issuer})
+    if response is not None:
+        return response["cert_pem"].encode("ascii"), response["chain_pem"].encode("ascii"), response.get("index")
+
+    from build_ca import issue_cert, issuer_chain_pem
+    cert_pem = issue_cert(username, user_pubkey_pem, valid_days=valid_days, issuer=issuer)
+    try:
+        index = merkle_log.append_cert(cert_pem)["index"]
+    except Exception:
+        index = None
+    import inventory
+    inventory.record_issued([(cert_pem, op, issuer, index)])
+    return cert_pem, issuer_chain_pem(issuer), index
+
+
+def revoke_serials(serials, reason: str = "unspecified"):
+    """Revokes serials through the CA daemon if one is running, else locally.
+
+    Returns:
+        The serials that were newly revoked
+    """
+    response = _daemon_request({"op": "revoke", "serials": [int(s) for s in serials], "reason": reason})
+    if response is not None:
+        return response["revoked"]
+    return crl.revoke_many(serials, reason=reason)
+
+
 # =========================================================
 # Main CA Tool CLI Logic
 # =========================================================
@@ -57,6 +168,11 @@ def main():
     # Command: Init
     subparsers.add_parser("init", help="Initializes the Root CA.")
     
+    # Command: Init-Intermediate
+    inter_parser = subparsers.add_parser("init-intermediate", help="Creates an issuing CA signed by the root.")
+    inter_parser.add_argument("name", help="Name of the intermediate CA (e.g., issuer-1).")
+    inter_parser.add_argument("--days", type=int, default=180, help="Validity in days (default: 180).")
+
     # Command: GenKeys
     genkeys_parser = subparsers.add_parser("genkeys", help="Generates user key pairs.")
     genkeys_parser.add_argument("username", help="The username for the keypair (e.g., Pilot-Alpha).")
@@ -64,22 +180,50 @@ def main():
     # Command: Issue
     issue_parser = subparsers.add_parser("issue", help="Issues a certificate for an existing public key.")
     issue_parser.add_argument("username", help="The username whose public key to certify.")
+    issue_parser.add_argument("--issuer", default=None, help="Sign with this intermediate CA instead of the root.")
 
     # Command: Revoke
     revoke_parser = subparsers.add_parser("revoke", help="Revokes a user's certificate.")
     revoke_parser.add_argument("username", help="The username whose certificate to revoke.")
 
+    # Command: Revoke-Batch
+    batch_parser = subparsers.add_parser("revoke-batch", help="Revokes many certificates with one CRL signature.")
+    batch_parser.add_argument("file", help="File with one serial or username per line.")
+    batch_parser.add_argument("--reason", default="unspecified", help="Revocation reason recorded in the CRL.")
+
     # Command: CRL
     subparsers.add_parser("crl", help="Print the current Certificate Revocation List.")
 
+    # Command: Stats
+    subparsers.add_parser("stats", help="Show throughput and queue statistics of the running CA daemon.")
+
+    # Command: Expiring
+    expiring_parser = subparsers.add_parser("expiring", help="List unrevoked certificates that expire soon.")
+    expiring_parser.add_argument("--hours", type=float, default=24.0, help="Look-ahead window (default: 24).")
+
+    # Command: Inventory
+    inventory_parser = subparsers.add_parser("inventory", help="Summarize the certificate inventory.")
+    inventory_parser.add_argument("--import", dest="import_keys", action="store_true",
+                                  help="First record certificates in keys/ that the inventory lacks.")
+
     # Command: Renew
     renew_parser = subparsers.add_parser("renew", help="Renew a user's certificate (short-lived).")
     renew_parser.add_argument("username", help="The username whose certificate to renew.")
+    renew_parser.add_argument("--issuer", default=None, help="Sign with this intermediate CA instead of the root.")
     
     args = parser.parse_args()
 
     if args.command == "init":
+        from build_ca import create_ca
         create_ca()
+
+    elif args.command == "init-intermediate":
+        from build_ca import create_intermediate
+        try:
+            create_intermediate(args.name, valid_days=args.days)
+        except FileNotFoundError as e:
+            print(f"Error: {e}. Run 'init' first.")
+            sys.exit(1)
         
     elif args.command == "genkeys":
         generate_user_keypair(args.username)
@@ -102,34 +246,59 @@ def main():
         except Exception:
             valid_days = 30
 
-        cert_pem = issue_cert(args.username, user_pubkey_pem, valid_days=valid_days)
+        try:
+            cert_pem, chain_pem, index = issue_certificate(args.username, user_pubkey_pem, valid_days, args.issuer)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
         
+        # The cert file carries the leaf followed by any intermediate, which is what TLS serves
         with open(cert_path, "wb") as f:
-            f.write(cert_pem)
+            f.write(cert_pem + chain_pem)
             
-        # Append to transparency log
-        try:
-            info = merkle_log.append_cert(cert_pem)
-            print(f"Appended cert to Merkle log index={info['index']} root={info['root']}")
-        except Exception:
+        # Appended to the transparency log by issue_certificate
+        if index is not None:
+            print(f"Appended cert to Merkle log index={index}")
+        else:
             print("Warning: failed to append cert to Merkle log")
 
         print(f"Issued certificate for {args.username} at {cert_path}")
 
     elif args.command == "revoke":
-        # Revoke certificate for username (looks up certificate and revokes its serial)
-        cert_path = os.path.join("keys", f"{args.username}_cert.pem")
-        if not os.path.exists(cert_path):
-            print(f"Error: Certificate not found for {args.username} at {cert_path}")
+        # Revokes every unexpired certificate of username, renewed ones included
+        serials = user_serials(args.username)
+        if not serials:
+            print(f"Error: No active certificate found for {args.username}")
             sys.exit(1)
-        with open(cert_path, "rb") as f:
-            cert = x509.load_pem_x509_certificate(f.read())
-        serial = cert.serial_number
-        ok = crl.revoke(serial)
-        if ok:
-            print(f"Revoked certificate serial={serial} for {args.username}")
-        else:
-            print(f"Certificate serial={serial} was already revoked")
+        try:
+            added = set(revoke_serials(serials))
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        for serial in serials:
+            if serial in added:
+                print(f"Revoked certificate serial={serial} for {args.username}")
+            else:
+                print(f"Certificate serial={serial} was already revoked")
+
+    elif args.command == "revoke-batch":
+        if not os.path.exists(args.file):
+            print(f"Error: Batch file not found: {args.file}")
+            sys.exit(1)
+        start = time.perf_counter()
+        serials, missing = read_revocation_batch(args.file)
+        try:
+            added = revoke_serials(serials, reason=args.reason)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        elapsed = time.perf_counter() - start
+        for username in missing:
+            print(f"Warning: no certificate found for {username}")
+        per_1k = elapsed / len(serials) * 1000 if serials else 0.0
+        print(f"Revoked {len(added)} certificate(s); {len(serials) - len(added)} duplicate or already revoked, "
+              f"{len(missing)} unresolved")
+        print(f"Took {elapsed * 1000:.1f} ms ({per_1k * 1000:.1f} ms per 1k revocations)")
 
     elif args.command == "crl":
         # Print CRL
@@ -141,6 +310,31 @@ def main():
         except Exception as e:
             print("Error reading CRL:", e)
 
+    elif args.command == "stats":
+        import ca_daemon
+        try:
+            stats = ca_daemon.request({"op": "stats"})
+        except (OSError, ValueError) as e:
+            print(f"Error: no CA daemon at {ca_daemon.SOCKET_PATH} ({e})")
+            sys.exit(1)
+        print(json.dumps(stats, indent=2, sort_keys=True))
+
+    elif args.command == "expiring":
+        import datetime
+        import inventory
+        with inventory.Inventory() as inv:
+            rows = inv.expiring(datetime.timedelta(hours=args.hours))
+        for row in rows:
+            print(f" - {row['username']} serial=0x{row['serial']} not_after={row['not_after']}")
+        print(f"{len(rows)} certificate(s) expire within {args.hours:g}h")
+
+    elif args.command == "inventory":
+        import inventory
+        with inventory.Inventory() as inv:
+            if args.import_keys:
+                print(f"Read {inv.import_certificates()} certificate(s) from keys/")
+            print(json.dumps(inv.audit(), indent=2, sort_keys=True))
+
     elif args.command == "renew":
         # Renew certificate for username: re-issue a cert for existing public key
         pub_key_path = os.path.join("keys", f"{args.username}_pub.pem")
@@ -156,10 +350,10 @@ def main():
                 valid_days = int(os.environ.get("RENEW_VALID_DAYS", "7"))
             except Exception:
                 valid_days = 7
-            cert_pem = issue_cert(args.username, user_pubkey_pem, valid_days=valid_days)
+            cert_pem, chain_pem, _ = issue_certificate(args.username, user_pubkey_pem, valid_days,
+                                                       args.issuer, op="renew")
             with open(cert_path, "wb") as f:
-                f.write(cert_pem)
-            merkle_log.append_cert(cert_pem)
+                f.write(cert_pem + chain_pem)
             print(f"Renewed certificate for {args.username}, saved to {cert_path}")
         except Exception as e:
             print(f"Renewal failed: {e}")
@@ -1,17 +1,83 @@
-from cryptography import x509
-from cryptography.hazmat.primitives.asymmetric import padding, rsa, ed25519
-from cryptography.hazmat.primitives import hashes, serialization
 import datetime
+import functools
 import os
+import threading
 import crl
+import status_responder
 
 
-def validate_cert(peer_cert_pem, ca_cert_pem, expected_name):
-    peer_cert = x509.load_pem_x509_certificate(peer_cert_pem)
-    ca_cert = x509.load_pem_x509_certificate(ca_cert_pem)
+def load_certificate(data):
+    """Returns an x509.Certificate from a certificate object, PEM bytes or DER bytes."""
+    from cryptography import x509
+
+    if isinstance(data, x509.Certificate):
+        return data
+    if data.lstrip().startswith(b"-----BEGIN"):
+        return x509.load_pem_x509_certificate(data)
+    return x509.load_der_x509_certificate(data)
+
+
+class TrustAnchor:
+    """A parsed CA certificate and its public key, reused across validations.
+
+    `intermediates_dir` is where issuing CAs below this root are looked up
+    (see ChainBuilder); anchors loaded from a file use <ca dir>/intermediates.
+    """
+    def __init__(self, cert, intermediates_dir=None):
+        self.cert = cert
+        self.public_key = cert.public_key()
+        self.intermediates_dir = intermediates_dir
+        self._chain = None
+
+    @property
+    def chain(self) -> "ChainBuilder":
+        if self._chain is None:
+            self._chain = ChainBuilder(self, self.intermediates_dir)
+        return self._chain
+
+
+@functools.lru_cache(maxsize=16)
+def _anchor_from_bytes(data: bytes) -> TrustAnchor:
+    return TrustAnchor(load_certificate(data))
+
+
+_anchor_files = {}  # path -> ((mtime_ns, size), TrustAnchor)
+_anchor_lock = threading.Lock()
+
+
+def load_trust_anchor(path: str) -> TrustAnchor:
+    """Loads the CA certificate at path once and keeps it in memory.
+
+    The file is re-read only if its mtime or size changes (e.g. the CA was
+    re-initialized), so a handshake costs one stat() rather than a read and
+    two parses.
+    """
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _anchor_lock:
+        cached = _anchor_files.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+    with open(path, "rb") as f:
+        anchor = TrustAnchor(load_certificate(f.read()),
+                             intermediates_dir=os.path.join(os.path.dirname(path), "intermediates"))
+    with _anchor_lock:
+        _anchor_files[path] = (stamp, anchor)
+    return anchor
+
+
+def _as_anchor(ca) -> TrustAnchor:
+    if isinstance(ca, TrustAnchor):
+        return ca
+    if isinstance(ca, (bytes, bytearray)):
+        return _anchor_from_bytes(bytes(ca))
+    return TrustAnchor(ca)
+
+
+def _verify_signature(peer_cert, ca_pub):
+    """Checks that peer_cert was signed by ca_pub. Raises ValueError if not."""
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
 
-    # Verify signature. Support RSA and Ed25519 public keys used in tests and CA.
-    ca_pub = ca_cert.public_key()
     try:
         sig_hash = getattr(peer_cert, "signature_hash_algorithm", None)
 
@@ -44,6 +110,200 @@ def validate_cert(peer_cert_pem, ca_cert_pem, expected_name):
     except Exception as e:
         raise ValueError(f"Certificate signature verification failed: {e}")
 
+
+def _utc(dt):
+    """Returns dt as a UTC-aware datetime (naive values are taken to be UTC)."""
+    if getattr(dt, 'tzinfo', None) is None:
+        return dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc)
+
+
+def _key_id_matches(cert, issuer) -> bool:
+    """True unless both key identifiers are present and differ."""
+    from cryptography import x509
+
+    try:
+        aki = cert.extensions.get_extension_for_class(x509.AuthorityKeyIdentifier).value.key_identifier
+        ski = issuer.extensions.get_extension_for_class(x509.SubjectKeyIdentifier).value.digest
+    except x509.ExtensionNotFound:
+        return True
+    return aki is None or aki == ski
+
+
+class ChainBuilder:
+    """Finds the verified intermediate CA that issued a leaf, below one trust anchor.
+
+    Each intermediate's link to the anchor (signature, CA basic constraint)
+    is verified once and cached by the intermediate's SHA-256 fingerprint, so
+    a handshake with an intermediate-issued leaf only pays for the leaf
+    signature. Candidates come from the chain the peer presented and from
+    `intermediates_dir`, which is rescanned only when it changes.
+    """
+    def __init__(self, anchor: TrustAnchor, intermediates_dir=None):
+        self.anchor = anchor
+        self.intermediates_dir = intermediates_dir
+        self._lock = threading.Lock()
+        self._verified = {}     # fingerprint -> TrustAnchor for the intermediate
+        self._rejected = set()  # fingerprints that failed verification
+        self._local = {}        # subject -> [certificates] from intermediates_dir
+        self._dir_stamp = None
+
+    def _scan_local(self):
+        try:
+            stamp = os.stat(self.intermediates_dir).st_mtime_ns if self.intermediates_dir else None
+        except OSError:
+            stamp = None
+        if stamp == self._dir_stamp:
+            return
+        local = {}
+        if stamp is not None:
+            for name in sorted(os.listdir(self.intermediates_dir)):
+                if not name.endswith("_cert.pem"):
+                    continue
+                try:
+                    with open(os.path.join(self.intermediates_dir, name), "rb") as f:
+                        cert = load_certificate(f.read())
+                except (OSError, ValueError):
+                    continue
+                local.setdefault(cert.subject, []).append(cert)
+        self._local = local
+        self._dir_stamp = stamp
+
+    def _verified_link(self, cert):
+        """Returns the TrustAnchor for cert if the anchor issued it as a CA, else None."""
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes
+
+        fp = cert.fingerprint(hashes.SHA256())
+        if fp in self._verified:
+            return self._verified[fp]
+        if fp in self._rejected:
+            return None
+        try:
+            if cert.issuer != self.anchor.cert.subject:
+                raise ValueError("not issued by the trust anchor")
+            if not cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca:
+                raise ValueError("not a CA certificate")
+            _verify_signature(cert, self.anchor.public_key)
+        except (ValueError, x509.ExtensionNotFound):
+            self._rejected.add(fp)
+            return None
+        link = self._verified[fp] = TrustAnchor(cert)
+        return link
+
+    def issuer_for(self, leaf, presented=()):
+        """Returns the TrustAnchor of the intermediate that issued leaf.
+
+        Returns None if the anchor issued leaf directly.
+
+        Raises:
+            ValueError: If no valid intermediate below the anchor issued leaf
+        """
+        if leaf.issuer == self.anchor.cert.subject:
+            return None
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            self._scan_local()
+            candidates = [load_certificate(c) for c in presented] + self._local.get(leaf.issuer, [])
+            for cert in candidates:
+                if cert.subject != leaf.issuer or not _key_id_matches(leaf, cert):
+                    continue
+                link = self._verified_link(cert)
+                if link is None:
+                    continue
+                # Validity is checked on every use; only the signature check is cached
+                not_before = getattr(cert, "not_valid_before_utc", None) or cert.not_valid_before
+                not_after = getattr(cert, "not_valid_after_utc", None) or cert.not_valid_after
+                if _utc(not_before) <= now <= _utc(not_after):
+                    return link
+        raise ValueError(f"No trusted intermediate CA found for issuer {leaf.issuer.rfc4514_string()}")
+
+
+def verify_issuer(cert, ca_cert, intermediates=()):
+    """Checks only that cert was signed by the CA, directly or via a trusted intermediate.
+
+    Returns:
+        The issuing intermediate's TrustAnchor, or None if the CA signed cert
+
+    Raises:
+        ValueError: If no trusted issuer signed cert
+    """
+    cert = load_certificate(cert)
+    anchor = _as_anchor(ca_cert)
+    issuer = anchor.chain.issuer_for(cert, intermediates)
+    _verify_signature(cert, issuer.public_key if issuer is not None else anchor.public_key)
+    return issuer
+
+
+def _check_crl(ca_pub, serials):
+    """Fails closed if the CRL exists but is unsigned, or lists any of serials."""
+    # Only enforce CRL if a CRL file exists
+    if not os.path.exists(crl.CRL_PATH):
+        return
+    # Verify CRL signature first
+    try:
+        if not crl.verify_crl_signature(ca_pub):
+            raise ValueError("CRL signature invalid or missing")
+    except Exception as e:
+        # If CRL exists but verification fails, fail closed
+        raise ValueError(f"CRL verification failed: {e}")
+    for serial in serials:
+        if crl.is_revoked(int(serial)):
+            raise ValueError("Certificate has been revoked (CRL)")
+
+
+def _crl_lists(ca_pub, serials) -> bool:
+    """Whether a CRL that verifies lists any of serials; a missing or unverifiable CRL lists nothing."""
+    if not os.path.exists(crl.CRL_PATH):
+        return False
+    try:
+        if not crl.verify_crl_signature(ca_pub):
+            return False
+        revoked = set(crl.get_revoked_serials())
+    except Exception:
+        return False
+    return any(int(serial) in revoked for serial in serials)
+
+
+def validate_cert(peer_cert, ca_cert, expected_name, staple=None, verify_signature=True,
+                  intermediates=()):
+    """Validates a peer certificate against the CA, expected CN, validity and revocation.
+
+    `peer_cert` may be an x509.Certificate, DER or PEM bytes; `ca_cert` may
+    additionally be a TrustAnchor (see load_trust_anchor), which avoids
+    re-parsing the CA for every handshake.
+
+    Set `verify_signature=False` only when the certificate came out of a TLS
+    handshake whose context trusts exactly this CA with CERT_REQUIRED:
+    OpenSSL has then already verified the signature, and only the checks it
+    doesn't do (CN binding, validity policy, CRL/staple) are repeated here.
+
+    If `staple` (a signed status statement from status_responder) is given
+    and verifies, it stands in for the CRL's fail-closed checks: a missing or
+    unverifiable local CRL no longer rejects the peer. A serial the local
+    signed CRL lists is still rejected, since the staple may predate that
+    revocation by up to its validity; "revoked" from either source wins. A
+    missing, stale or invalid staple falls back to the CRL.
+
+    Leaves issued by an intermediate CA are accepted if the intermediate is
+    in `intermediates` (e.g. the chain the peer presented) or in the anchor's
+    intermediates directory, and was itself issued by the anchor. The
+    intermediate's serial is checked against the CRL as well.
+    """
+    # Imported on first use so importing this module (via app.handshake) stays cheap
+    from cryptography import x509
+
+    peer_cert = load_certificate(peer_cert)
+    anchor = _as_anchor(ca_cert)
+
+    # Find the issuing intermediate, if any; its link to the anchor is verified once and cached
+    ca_pub = anchor.public_key
+    issuer = anchor.chain.issuer_for(peer_cert, intermediates)
+
+    # Verify signature. Support RSA and Ed25519 public keys used in tests and CA.
+    if verify_signature:
+        _verify_signature(peer_cert, issuer.public_key if issuer else ca_pub)
+
     # Check subject name matches expected
     cn = peer_cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)[0].value
     if cn != expected_name:
@@ -51,41 +311,32 @@ def validate_cert(peer_cert_pem, ca_cert_pem, expected_name):
 
     # Check validity (use UTC-aware properties when available to avoid deprecation warnings)
     # Use timezone-aware UTC datetimes for comparison to avoid deprecation and tz issues
-    def _to_utc(dt):
-        if dt is None:
-            return None
-        if getattr(dt, 'tzinfo', None) is None:
-            return dt.replace(tzinfo=datetime.timezone.utc)
-        return dt.astimezone(datetime.timezone.utc)
-
     now = datetime.datetime.now(datetime.timezone.utc)
-    not_before = _to_utc(getattr(peer_cert, "not_valid_before_utc", None) or peer_cert.not_valid_before)
-    not_after = _to_utc(getattr(peer_cert, "not_valid_after_utc", None) or peer_cert.not_valid_after)
+    not_before = _utc(getattr(peer_cert, "not_valid_before_utc", None) or peer_cert.not_valid_before)
+    not_after = _utc(getattr(peer_cert, "not_valid_after_utc", None) or peer_cert.not_valid_after)
     if not (not_before <= now <= not_after):
         raise ValueError("Certificate expired or not yet valid")
 
-    # Check against CRL if present
-    try:
-        serial = int(peer_cert.serial_number)
-        # Only enforce CRL if a CRL file exists
-        if os.path.exists(crl.CRL_PATH):
-            # Verify CRL signature first
-            try:
-                ca_pub = ca_cert.public_key()
-                if not crl.verify_crl_signature(ca_pub):
-                    raise ValueError("CRL signature invalid or missing")
-            except Exception as e:
-                # If CRL exists but verification fails, fail closed
-                raise ValueError(f"CRL verification failed: {e}")
-
-            if crl.is_revoked(serial):
+    # A valid stapled statement answers the revocation question with one signature check
+    if staple is not None:
+        try:
+            status = status_responder.verify_statement(staple, ca_pub, peer_cert.serial_number)
+        except ValueError as e:
+            print(f"Ignoring stapled status for {expected_name}: {e}")
+        else:
+            if status == "revoked":
+                raise ValueError("Certificate has been revoked (stapled status)")
+            # A "good" staple can be up to STATUS_VALIDITY old; a revocation the CRL already has wins
+            if _crl_lists(ca_pub, [peer_cert.serial_number]):
                 raise ValueError("Certificate has been revoked (CRL)")
-    except ValueError:
-        # Re-raise validation errors
-        raise
-    except Exception:
-        # If an unexpected error occurred during CRL checking, fail closed
-        raise
+            # Staples speak for the leaf only; an intermediate still needs the CRL
+            if issuer:
+                _check_crl(ca_pub, [issuer.cert.serial_number])
+            print(f"{expected_name} certificate valid and trusted.")
+            return True
+
+    # Check against CRL if present (leaf and issuing intermediate)
+    _check_crl(ca_pub, [peer_cert.serial_number] + ([issuer.cert.serial_number] if issuer else []))
 
     print(f"{expected_name} certificate valid and trusted.")
     return True
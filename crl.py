@@ -1,9 +1,10 @@
 import json
 import os
 import datetime
-from typing import List
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
+from typing import Iterable, List
+
+# cryptography is imported inside the signing functions: revocation lookups
+# and tools that only read the CRL shouldn't pay for loading it.
 
 CRL_PATH = os.path.join("ca", "crl.json")
 CRL_SIG_PATH = os.path.join("ca", "crl.sig")
@@ -23,13 +24,22 @@ def _save_raw_crl(data: dict):
         json.dump(data, f, indent=2, sort_keys=True)
 
 
-def sign_crl():
-    """Signs the CRL JSON and writes signature to CRL_SIG_PATH."""
-    if not os.path.exists(CA_KEY_PATH):
-        raise FileNotFoundError("CA private key not found for CRL signing")
-    raw = json.dumps(_load_raw_crl(), sort_keys=True).encode("utf-8")
-    with open(CA_KEY_PATH, "rb") as f:
-        key = serialization.load_pem_private_key(f.read(), password=None)
+def sign_crl(data: dict = None, ca_key=None):
+    """Signs the CRL JSON and writes signature to CRL_SIG_PATH.
+
+    Pass the CRL just saved as `data` to skip reading it back from disk, and
+    an already loaded `ca_key` to skip reading the key.
+    """
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    raw = json.dumps(data if data is not None else _load_raw_crl(), sort_keys=True).encode("utf-8")
+    key = ca_key
+    if key is None:
+        if not os.path.exists(CA_KEY_PATH):
+            raise FileNotFoundError("CA private key not found for CRL signing")
+        with open(CA_KEY_PATH, "rb") as f:
+            key = serialization.load_pem_private_key(f.read(), password=None)
     sig = key.sign(raw, padding.PKCS1v15(), hashes.SHA256())
     with open(CRL_SIG_PATH, "wb") as f:
         f.write(sig)
@@ -37,6 +47,9 @@ def sign_crl():
 
 def verify_crl_signature(ca_pubkey) -> bool:
     """Verify CRL signature given CA public key object."""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
     if not os.path.exists(CRL_SIG_PATH):
         return False
     raw = json.dumps(_load_raw_crl(), sort_keys=True).encode("utf-8")
@@ -49,17 +62,39 @@ def verify_crl_signature(ca_pubkey) -> bool:
         return False
 
 
-def revoke(serial: int, reason: str = "unspecified"):
+def revoke_many(serials: Iterable[int], reason: str = "unspecified", ca_key=None) -> List[int]:
+    """Revokes a batch of serials with a single CRL write and a single signature.
+
+    Serials already on the CRL, or repeated within the batch, are skipped.
+
+    Returns:
+        The serials that were newly revoked, in input order
+    """
     data = _load_raw_crl()
-    now = datetime.datetime.utcnow().isoformat() + "Z"
-    # avoid duplicate
-    if any(int(x.get("serial")) == int(serial) for x in data.get("revoked", [])):
-        return False
-    data.setdefault("revoked", []).append({"serial": int(serial), "revoked_at": now, "reason": reason})
-    data["updated_at"] = now
-    _save_raw_crl(data)
-    sign_crl()
-    return True
+    entries = data.setdefault("revoked", [])
+    seen = {int(x.get("serial")) for x in entries}
+    revoked_at = datetime.datetime.utcnow()
+    now = revoked_at.isoformat() + "Z"
+    added = []
+    for serial in serials:
+        serial = int(serial)
+        if serial in seen:
+            continue
+        seen.add(serial)
+        entries.append({"serial": serial, "revoked_at": now, "reason": reason})
+        added.append(serial)
+    if added:
+        data["updated_at"] = now
+        _save_raw_crl(data)
+        sign_crl(data, ca_key=ca_key)
+        import inventory
+        inventory.record_revoked(added, reason, revoked_at)
+    return added
+
+
+def revoke(serial: int, reason: str = "unspecified"):
+    """Revokes one serial. Returns False if it was already revoked."""
+    return bool(revoke_many([serial], reason))
 
 
 def get_revoked_serials() -> List[int]:
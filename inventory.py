@@ -0,0 +1,229 @@
+"""
+SQLite inventory of the certificates this CA has issued.
+
+One row per certificate, written when it is issued or renewed (ca_tool,
+ca_daemon) and updated when it is revoked (crl.revoke_many). Serials are
+stored as lower-case hex text, since they are up to 159 bits and SQLite
+integers are 64. Times are UTC 'YYYY-MM-DDTHH:MM:SSZ' strings, which sort
+chronologically. Indexes on username, serial, fingerprint and not_after
+make revoke-by-user, expiry sweeps and audits lookups instead of scans of
+keys/.
+
+The PEM files in keys/ and the Merkle log stay the source of truth for
+peers; `Inventory.import_certificates` rebuilds the table from them for a
+CA that predates it.
+"""
+
+import os
+import sqlite3
+import hashlib
+import datetime
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+INVENTORY_PATH = os.environ.get("CA_INVENTORY", os.path.join("ca", "inventory.sqlite3"))
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS certificates (
+    serial TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    issuer TEXT,
+    op TEXT NOT NULL,
+    not_before TEXT NOT NULL,
+    not_after TEXT NOT NULL,
+    issued_at TEXT NOT NULL,
+    log_index INTEGER,
+    revoked_at TEXT,
+    revocation_reason TEXT
+);
+CREATE INDEX IF NOT EXISTS certificates_username ON certificates (username, not_after);
+CREATE UNIQUE INDEX IF NOT EXISTS certificates_fingerprint ON certificates (fingerprint);
+CREATE INDEX IF NOT EXISTS certificates_not_after ON certificates (not_after);
+"""
+
+
+def _time(dt: datetime.datetime) -> str:
+    """dt (aware, or naive UTC) as stored; naive datetimes are taken as UTC."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc)
+    return dt.strftime(_TIME_FORMAT)
+
+
+def _crl_time(value: Optional[str]) -> Optional[str]:
+    """A CRL entry's revoked_at (isoformat with microseconds and "Z") as stored."""
+    if not value:
+        return None
+    try:
+        return _time(datetime.datetime.fromisoformat(value.rstrip("Z")))
+    except ValueError:
+        return value
+
+
+def serial_hex(serial: int) -> str:
+    return format(int(serial), "x")
+
+
+def _row(cert_pem: bytes, op: str, issuer: Optional[str], log_index: Optional[int]) -> tuple:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.x509.oid import NameOID
+
+    cert = x509.load_pem_x509_certificate(cert_pem)
+    cn = cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+    der = cert.public_bytes(serialization.Encoding.DER)
+    # Older cryptography releases only have the naive (UTC) accessors, which _time takes as UTC
+    not_before = getattr(cert, "not_valid_before_utc", None) or cert.not_valid_before
+    not_after = getattr(cert, "not_valid_after_utc", None) or cert.not_valid_after
+    return (serial_hex(cert.serial_number), cn[0].value if cn else "Unknown", hashlib.sha256(der).hexdigest(),
+            issuer, op, _time(not_before), _time(not_after),
+            _time(datetime.datetime.now(datetime.timezone.utc)), log_index)
+
+
+class Inventory:
+    """The inventory database at path (default INVENTORY_PATH), created on first use.
+
+    One connection, shared by the threads of a process under a lock; other
+    processes (the CA daemon, ca_tool) wait for each other's writes.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or INVENTORY_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[dict]:
+        with self._lock:
+            return [dict(r) for r in self._db.execute(sql, params)]
+
+    def add_many(self, entries: Iterable[Tuple[bytes, str, Optional[str], Optional[int]]]) -> int:
+        """Records (cert_pem, op, issuer, log_index) entries in one transaction.
+
+        A certificate already recorded keeps its row; only a missing log
+        index is filled in. Returns how many entries were given.
+        """
+        rows = [_row(pem, op, issuer, index) for pem, op, issuer, index in entries]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO certificates (serial, username, fingerprint, issuer, op, not_before, not_after,"
+                " issued_at, log_index) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (serial) DO UPDATE SET log_index = COALESCE(log_index, excluded.log_index)", rows)
+        return len(rows)
+
+    def add(self, cert_pem: bytes, op: str = "issue", issuer: Optional[str] = None,
+            log_index: Optional[int] = None):
+        """Records one issued (op "issue") or renewed ("renew") certificate."""
+        self.add_many([(cert_pem, op, issuer, log_index)])
+
+    def mark_revoked(self, serials: Iterable[int], reason: str = "unspecified",
+                     revoked_at: Optional[datetime.datetime] = None) -> int:
+        """Marks serials revoked (first revocation wins). Returns how many rows changed."""
+        revoked_at = _time(revoked_at or datetime.datetime.now(datetime.timezone.utc))
+        return self._set_revoked([(revoked_at, reason, serial_hex(s)) for s in serials])
+
+    def _set_revoked(self, rows: List[tuple]) -> int:
+        with self._lock, self._db:
+            cur = self._db.executemany(
+                "UPDATE certificates SET revoked_at = ?, revocation_reason = ? WHERE serial = ? AND revoked_at IS NULL",
+                rows)
+            return cur.rowcount
+
+    def by_serial(self, serial: int) -> Optional[dict]:
+        rows = self._query("SELECT * FROM certificates WHERE serial = ?", (serial_hex(serial),))
+        return rows[0] if rows else None
+
+    def by_fingerprint(self, fingerprint: str) -> Optional[dict]:
+        """The certificate whose SHA-256 (of the DER encoding) is fingerprint."""
+        rows = self._query("SELECT * FROM certificates WHERE fingerprint = ?", (fingerprint.lower(),))
+        return rows[0] if rows else None
+
+    def for_user(self, username: str, active_only: bool = False, now: Optional[datetime.datetime] = None) -> List[dict]:
+        """username's certificates, newest expiry first; active_only skips revoked and expired ones."""
+        if not active_only:
+            return self._query("SELECT * FROM certificates WHERE username = ? ORDER BY not_after DESC", (username,))
+        now = _time(now or datetime.datetime.now(datetime.timezone.utc))
+        return self._query("SELECT * FROM certificates WHERE username = ? AND not_after > ? AND revoked_at IS NULL"
+                           " ORDER BY not_after DESC", (username, now))
+
+    def expiring(self, within: datetime.timedelta, now: Optional[datetime.datetime] = None) -> List[dict]:
+        """Unrevoked certificates that expire between now and now + within, soonest first."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        return self._query("SELECT * FROM certificates WHERE not_after > ? AND not_after <= ? AND revoked_at IS NULL"
+                           " ORDER BY not_after", (_time(now), _time(now + within)))
+
+    def audit(self, now: Optional[datetime.datetime] = None) -> dict:
+        """Counts by state, and the certificates that never made it into the Merkle log."""
+        now = _time(now or datetime.datetime.now(datetime.timezone.utc))
+        with self._lock:
+            counts = dict(self._db.execute(
+                "SELECT COUNT(*) AS certificates, COUNT(DISTINCT username) AS users,"
+                " COUNT(revoked_at) AS revoked,"
+                " COALESCE(SUM(revoked_at IS NULL AND not_after <= ?), 0) AS expired,"
+                " COALESCE(SUM(revoked_at IS NULL AND not_after > ?), 0) AS active"
+                " FROM certificates", (now, now)).fetchone())
+        counts["unlogged"] = [r["serial"] for r in self._query(
+            "SELECT serial FROM certificates WHERE log_index IS NULL ORDER BY issued_at")]
+        return counts
+
+    def import_certificates(self, keys_dir: str = "keys") -> int:
+        """Records every keys_dir/*_cert.pem not in the inventory yet, with its log
+        index and CRL state. Returns how many certificates were read.
+        """
+        import glob
+        import crl
+        import merkle_log
+
+        pems = []
+        for path in sorted(glob.glob(os.path.join(keys_dir, "*_cert.pem"))):
+            with open(path, "rb") as f:
+                try:
+                    pems.append(merkle_log.leaf_pem(f.read()))
+                except ValueError:
+                    continue
+        # Only keys/' leaves are looked up while streaming the log
+        wanted = {merkle_log._hash(pem) for pem in pems}
+        index = {}
+        if os.path.exists(merkle_log.LOG_PATH):
+            for i, leaf in enumerate(merkle_log.LogReader()):
+                if leaf in wanted:
+                    index.setdefault(leaf, i)
+        entries = [(pem, "issue", None, index.get(merkle_log._hash(pem))) for pem in pems]
+        self.add_many(entries)
+        self._set_revoked([(_crl_time(e.get("revoked_at")), e.get("reason") or "unspecified", serial_hex(e["serial"]))
+                           for e in crl._load_raw_crl().get("revoked", [])])
+        return len(entries)
+
+
+def record_issued(entries: Iterable[Tuple[bytes, str, Optional[str], Optional[int]]], path: Optional[str] = None):
+    """Adds (cert_pem, op, issuer, log_index) entries; a failure is reported, not raised."""
+    try:
+        with Inventory(path) as inv:
+            inv.add_many(entries)
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Warning: certificate inventory not updated: {e}")
+
+
+def record_revoked(serials: Iterable[int], reason: str, revoked_at: Optional[datetime.datetime] = None,
+                   path: Optional[str] = None):
+    """Marks serials revoked in the inventory; a failure is reported, not raised."""
+    try:
+        with Inventory(path) as inv:
+            inv.mark_revoked(serials, reason, revoked_at)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: certificate inventory not updated: {e}")
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Load generator for First Contact listeners.
+
+Mints K test identities with the CA tooling, then drives N concurrent
+initiators against a target host:port (normally an `app.workers` listener)
+with a weighted mix of operations:
+
+  - handshake: TCP connect, mutual TLS handshake, clean close
+  - burst:     handshake, send a burst of messages, clean close
+  - drop:      handshake, then reset the TCP connection (no close_notify)
+
+Usage:
+  python loadgen.py 127.0.0.1:7000
+  python loadgen.py 127.0.0.1:7000 --identities 8 --concurrency 32 --duration 30
+  python loadgen.py 127.0.0.1:7000 --mix handshake=5,burst=3,drop=2 --rate 50 --json
+
+The interactive `app.cli.TLSClient` listener holds one session at a time and
+turns away connections while it has one, so against it anything above
+--concurrency 1 mostly measures those refusals.
+"""
+
+import os
+import sys
+import ssl
+import json
+import math
+import time
+import random
+import socket
+import struct
+import argparse
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MIX = {"handshake": 6, "burst": 3, "drop": 1}
+OPERATIONS = ("handshake", "burst", "drop")
+# Reused identities are re-issued when their cert has less than this left (seconds);
+# main() takes LOADGEN_MIN_CERT_REMAINING instead when it is set
+MIN_CERT_REMAINING = 3600
+
+
+def _cert_remaining(cert_path: str) -> float:
+    """Seconds until the certificate at cert_path expires (negative once expired)."""
+    import datetime
+    from cryptography import x509
+
+    with open(cert_path, "rb") as f:
+        cert = x509.load_pem_x509_certificate(f.read())
+    not_after = getattr(cert, "not_valid_after_utc", None)
+    if not_after is None:
+        not_after = cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    return (not_after - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+
+def mint_identities(count: int, prefix: str = "loadgen", valid_days: int = 1,
+                    min_remaining: Optional[float] = None) -> List[Tuple[str, str, str]]:
+    """Creates (or reuses) `count` test identities signed by the local CA.
+
+    Uses the same key generation and issuance code as `ca_tool.py`, so the
+    CA must already be initialized (`python ca_tool.py init`). Test certs are
+    not appended to the Merkle log. A reused identity whose cert expires
+    within `min_remaining` seconds (default MIN_CERT_REMAINING) gets a fresh
+    one for its existing key.
+
+    Returns:
+        List of (username, cert_path, key_path) tuples
+    """
+    from build_ca import issue_cert
+    from ca_tool import generate_user_keypair
+
+    if min_remaining is None:
+        min_remaining = MIN_CERT_REMAINING
+    identities = []
+    for i in range(count):
+        username = f"{prefix}-{i:04d}"
+        key_path = os.path.join("keys", f"{username}_key.pem")
+        cert_path = os.path.join("keys", f"{username}_cert.pem")
+        pub_path = os.path.join("keys", f"{username}_pub.pem")
+
+        reusable = (os.path.exists(key_path) and os.path.exists(cert_path)
+                    and _cert_remaining(cert_path) > min_remaining)
+        if not reusable:
+            if not (os.path.exists(key_path) and os.path.exists(pub_path)):
+                pub_path = generate_user_keypair(username)
+            with open(pub_path, "rb") as f:
+                cert_pem = issue_cert(username, f.read(), valid_days=valid_days)
+            with open(cert_path, "wb") as f:
+                f.write(cert_pem)
+        identities.append((username, cert_path, key_path))
+    return identities
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """Parses an operation mix such as 'handshake=5,burst=3,drop=2'.
+
+    Raises:
+        ValueError: On an unknown operation, a weight that isn't a
+            non-negative integer, or a mix whose weights are all zero
+    """
+    mix = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' (expected one of {', '.join(OPERATIONS)})")
+        try:
+            mix[name] = int(weight) if weight else 1
+        except ValueError:
+            raise ValueError(f"Weight of '{name}' must be an integer, not '{weight.strip()}'")
+        if mix[name] < 0:
+            raise ValueError(f"Weight of '{name}' must not be negative")
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Operation mix must contain at least one positive weight")
+    return mix
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of `samples` (which must already be sorted)."""
+    if not samples:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(samples)))
+    return samples[min(rank, len(samples)) - 1]
+
+
+class LoadStats:
+    """Thread-safe accumulator for latencies, counts and errors."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.handshake_latencies: List[float] = []
+        self.op_latencies: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.messages = 0
+        self.errors = Counter()
+
+    def record_handshake(self, seconds: float):
+        with self._lock:
+            self.handshake_latencies.append(seconds)
+
+    def record_op(self, op: str, seconds: float, messages: int = 0):
+        with self._lock:
+            self.op_latencies[op].append(seconds)
+            self.messages += messages
+
+    def record_error(self, op: str, exc: BaseException):
+        with self._lock:
+            self.errors[f"{op}:{type(exc).__name__}"] += 1
+
+    def report(self, elapsed: float) -> dict:
+        """Summarizes the run as a JSON-serializable dict."""
+        with self._lock:
+            def _summary(samples):
+                ordered = sorted(samples)
+                return {
+                    "count": len(ordered),
+                    "p50_ms": _ms(percentile(ordered, 50)),
+                    "p90_ms": _ms(percentile(ordered, 90)),
+                    "p99_ms": _ms(percentile(ordered, 99)),
+                    "max_ms": _ms(ordered[-1] if ordered else None),
+                }
+
+            ok_ops = sum(len(v) for v in self.op_latencies.values())
+            failed_ops = sum(self.errors.values())
+            elapsed = max(elapsed, 1e-9)
+            return {
+                "elapsed_s": round(elapsed, 3),
+                "ops_ok": ok_ops,
+                "ops_failed": failed_ops,
+                "ops_per_s": round(ok_ops / elapsed, 2),
+                "handshakes_per_s": round(len(self.handshake_latencies) / elapsed, 2),
+                "messages_per_s": round(self.messages / elapsed, 2),
+                "handshake_latency": _summary(self.handshake_latencies),
+                "op_latency": {op: _summary(v) for op, v in self.op_latencies.items() if v},
+                "errors": dict(self.errors.most_common()),
+            }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000.0, 3)
+
+
+class LoadGenerator:
+    """Drives concurrent initiators against a single listener."""
+    def __init__(self, host: str, port: int, identities: List[Tuple[str, str, str]],
+                 mix: Optional[Dict[str, int]] = None, burst: int = 10,
+                 message_size: int = 64, seed: Optional[int] = None,
+                 ca_path: Optional[str] = None):
+        from app.utils import create_ssl_context
+
+        self.host = host
+        self.port = port
+        self.mix = mix or dict(DEFAULT_MIX)
+        self.burst = burst
+        self.payload = b"x" * message_size
+        self.seed = seed
+        self.stats = LoadStats()
+        # One context per identity; SSLContext objects are safe to share across threads
+        self.contexts = [
+            create_ssl_context(is_server=False, ca_path=ca_path, cert_path=cert, key_path=key)
+            for _, cert, key in identities
+        ]
+        if not self.contexts:
+            raise ValueError("At least one identity is required")
+
+    def _handshake(self, context: ssl.SSLContext) -> ssl.SSLSocket:
+        start = time.perf_counter()
+        raw_sock = socket.create_connection((self.host, self.port), timeout=5)
+        try:
+            ssl_conn = context.wrap_socket(raw_sock, server_hostname=self.host)
+        except Exception:
+            raw_sock.close()
+            raise
+        self.stats.record_handshake(time.perf_counter() - start)
+        return ssl_conn
+
+    def _run_op(self, op: str, context: ssl.SSLContext):
+        start = time.perf_counter()
+        sent = 0
+        ssl_conn = self._handshake(context)
+        try:
+            if op == "burst":
+                for _ in range(self.burst):
+                    ssl_conn.write(self.payload)
+                    sent += 1
+            elif op == "drop":
+                # SO_LINGER with a zero timeout turns close() into a TCP RST
+                ssl_conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        finally:
+            ssl_conn.close()
+        self.stats.record_op(op, time.perf_counter() - start, messages=sent)
+
+    def _worker(self, index: int, deadline: float, max_ops: Optional[int], interval: float):
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        ops, weights = zip(*self.mix.items())
+        next_start = time.monotonic()
+        done = 0
+        while time.monotonic() < deadline and (max_ops is None or done < max_ops):
+            if interval:
+                delay = next_start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                # Don't let a slow period turn into a catch-up burst
+                next_start = max(next_start + interval, time.monotonic())
+            op = rng.choices(ops, weights)[0]
+            context = self.contexts[rng.randrange(len(self.contexts))]
+            try:
+                self._run_op(op, context)
+            except Exception as e:
+                self.stats.record_error(op, e)
+            done += 1
+
+    def run(self, concurrency: int = 4, duration: float = 10.0,
+            ops_per_worker: Optional[int] = None, rate: Optional[float] = None) -> dict:
+        """Runs the load and returns the report dict.
+
+        Args:
+            concurrency: Number of concurrent initiator threads
+            duration: Maximum run time in seconds
+            ops_per_worker: Optional cap on operations per initiator
+            rate: Optional target rate (ops/s) across all initiators
+        """
+        interval = (concurrency / rate) if rate else 0.0
+        start = time.monotonic()
+        deadline = start + duration
+        threads = [
+            threading.Thread(target=self._worker, args=(i, deadline, ops_per_worker, interval), daemon=True)
+            for i in range(concurrency)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.stats.report(time.monotonic() - start)
+
+
+def print_report(report: dict):
+    """Prints a human-readable summary of a load run."""
+    print(f"\n=== LOAD REPORT ({report['elapsed_s']}s) ===")
+    print(f"Operations ok/failed: {report['ops_ok']}/{report['ops_failed']}")
+    print(f"Rates: {report['ops_per_s']} ops/s | {report['handshakes_per_s']} handshakes/s | "
+          f"{report['messages_per_s']} messages/s")
+
+    def _line(label, s):
+        print(f"  {label:<10} n={s['count']:<7} p50={s['p50_ms']}ms p90={s['p90_ms']}ms "
+              f"p99={s['p99_ms']}ms max={s['max_ms']}ms")
+
+    print("Latency:")
+    _line("handshake", report["handshake_latency"])
+    for op, s in report["op_latency"].items():
+        _line(op, s)
+    if report["errors"]:
+        print("Errors:")
+        for key, count in report["errors"].items():
+            print(f"  {key}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capacity test a First Contact listener.")
+    parser.add_argument("target", help="Listener address as host:port")
+    parser.add_argument("--identities", type=int, default=4, help="Number of test identities to mint (default: 4)")
+    parser.add_argument("--prefix", default="loadgen", help="Username prefix for minted identities")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent initiators (default: 4)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Run time in seconds (default: 10)")
+    parser.add_argument("--ops", type=int, default=None, help="Optional cap on operations per initiator")
+    parser.add_argument("--rate", type=float, default=None, help="Target total ops/s (default: unpaced)")
+    parser.add_argument("--mix", default=None, help="Operation weights, e.g. handshake=6,burst=3,drop=1")
+    parser.add_argument("--burst", type=int, default=10, help="Messages per burst (default: 10)")
+    parser.add_argument("--size", type=int, default=64, help="Message size in bytes (default: 64)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a repeatable operation sequence")
+    parser.add_argument("--json", action="store_true", help="Emit the report as JSON")
+    args = parser.parse_args()
+
+    host, _, port_str = args.target.rpartition(":")
+    try:
+        port = int(port_str)
+    except ValueError:
+        parser.error("target must be host:port")
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        min_remaining = int(os.environ.get("LOADGEN_MIN_CERT_REMAINING", str(MIN_CERT_REMAINING)))
+    except ValueError:
+        parser.error("LOADGEN_MIN_CERT_REMAINING must be a whole number of seconds")
+
+    identities = mint_identities(args.identities, prefix=args.prefix, min_remaining=min_remaining)
+    gen = LoadGenerator(host or "127.0.0.1", port, identities, mix=mix,
+                        burst=args.burst, message_size=args.size, seed=args.seed)
+    report = gen.run(concurrency=args.concurrency, duration=args.duration,
+                     ops_per_worker=args.ops, rate=args.rate)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(0 if report["ops_ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
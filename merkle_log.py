@@ -1,9 +1,44 @@
 import os
 import json
 import hashlib
-from typing import List
+import itertools
+import contextlib
+from collections import deque
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import merkle_tiles
 
 LOG_PATH = os.path.join("ca", "merkle_log.json")
+LOCK_PATH = os.path.join("ca", "merkle_log.lock")
+_PEM_END = b"-----END CERTIFICATE-----"
+# Leaves per chunk when the root is recomputed in parallel (a power of two)
+ROOT_CHUNK = int(os.environ.get("MERKLE_ROOT_CHUNK", str(1 << 14)))
+
+
+@contextlib.contextmanager
+def _locked():
+    """Exclusive lock on the log across threads and processes."""
+    os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+    with open(LOCK_PATH, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
 
 
 def _load_log() -> dict:
@@ -15,14 +50,30 @@ def _load_log() -> dict:
 
 def _save_log(data: dict):
     os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    with open(LOG_PATH, "w", encoding="utf-8") as f:
+    # Readers never see a half-written log
+    tmp = LOG_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp, LOG_PATH)
 
 
 def _hash(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
 
+def leaf_pem(data: bytes) -> bytes:
+    """The leaf certificate of a keys/ file (leaf PEM + chain), byte for byte as it was logged.
+
+    Raises:
+        ValueError: If data holds no PEM certificate
+    """
+    end = data.find(_PEM_END)
+    if end < 0:
+        raise ValueError("No PEM certificate found")
+    end += len(_PEM_END)
+    return data[:end + 1] if data[end:end + 1] == b"\n" else data[:end]
+
+
 def _compute_root(leaves: List[str]) -> str:
     if not leaves:
         return None
@@ -38,14 +89,180 @@ def _compute_root(leaves: List[str]) -> str:
     return nodes[0]
 
 
+def _chunk_root(leaves: List[str], levels: int) -> str:
+    """Root of an aligned chunk of 2**levels leaf slots (a short last chunk duplicates its tail)."""
+    nodes = leaves
+    for _ in range(levels):
+        nodes = [_hash((nodes[i] + (nodes[i+1] if i+1 < len(nodes) else nodes[i])).encode())
+                 for i in range(0, len(nodes), 2)]
+    return nodes[0]
+
+
+def parallel_root(leaves: Iterable[str], workers: Optional[int] = None,
+                  chunk_size: int = ROOT_CHUNK) -> Tuple[Optional[str], int]:
+    """Recomputes the root of a stream of leaves, chunk by chunk, on several processes.
+
+    Chunks are aligned to a power of two, so their roots are exactly the
+    tree's nodes at that height and the root over them equals
+    _compute_root() over all leaves. At most a few chunks per worker are in
+    flight, so memory stays bounded however long the log is.
+
+    Returns:
+        (root, number of leaves); root is None for an empty log
+
+    Raises:
+        ValueError: If chunk_size isn't a power of two (>= 2)
+    """
+    if chunk_size < 2 or chunk_size & (chunk_size - 1):
+        raise ValueError(f"Chunk size must be a power of two: {chunk_size}")
+    levels = chunk_size.bit_length() - 1
+    workers = workers or os.cpu_count() or 1
+    it = iter(leaves)
+    first = list(itertools.islice(it, chunk_size))
+    second = list(itertools.islice(it, chunk_size))
+    if not second:  # Fits in one chunk: not worth a process
+        return _compute_root(first), len(first)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunks = itertools.chain([first, second], iter(lambda: list(itertools.islice(it, chunk_size)), []))
+    roots, pending, size = [], deque(), 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            if pool is None:
+                roots.append(_chunk_root(chunk, levels))
+                continue
+            pending.append(pool.submit(_chunk_root, chunk, levels))
+            while len(pending) > 2 * workers:
+                roots.append(pending.popleft().result())
+        roots.extend(f.result() for f in pending)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return _compute_root(roots), size
+
+
+class LogReader:
+    """Reads the log file incrementally: iterating yields the leaves in order.
+
+    Memory use is one read block, not the whole log. The other top-level
+    fields (e.g. "root") are collected in `fields` as they are passed; read
+    them after iterating, since "root" may follow "leaves" in the file.
+    """
+    def __init__(self, path: str = LOG_PATH, block_size: int = 1 << 16):
+        self.path = path
+        self.block_size = block_size
+        self.fields = {}
+        self.count = 0
+
+    def __iter__(self) -> Iterator[str]:
+        decoder = json.JSONDecoder()
+        with open(self.path, "r", encoding="utf-8") as f:
+            buf, pos = "", 0
+
+            def fill() -> bool:
+                nonlocal buf, pos
+                data = f.read(self.block_size)
+                buf, pos = buf[pos:] + data, 0
+                return bool(data)
+
+            def peek(skip: str = " \t\r\n") -> str:
+                """Skips the given characters; returns the next one ("" at end of file)."""
+                nonlocal pos
+                while True:
+                    while pos < len(buf) and buf[pos] in skip:
+                        pos += 1
+                    if pos < len(buf):
+                        return buf[pos]
+                    if not fill():
+                        return ""
+
+            def value():
+                nonlocal pos
+                while True:
+                    try:
+                        obj, end = decoder.raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        if not fill():
+                            raise ValueError(f"Truncated or malformed Merkle log: {self.path}")
+                        continue
+                    if end == len(buf) and fill():  # A number may continue in the next block
+                        continue
+                    pos = end
+                    return obj
+
+            def expect(char: str):
+                nonlocal pos
+                if peek() != char:
+                    raise ValueError(f"Malformed Merkle log: expected {char!r} in {self.path}")
+                pos += 1
+
+            expect("{")
+            while True:
+                c = peek(" \t\r\n,")
+                if c == "}":
+                    break
+                if c == "":
+                    raise ValueError(f"Truncated Merkle log: {self.path}")
+                key = value()
+                expect(":")
+                if key != "leaves":
+                    peek()
+                    self.fields[key] = value()
+                    continue
+                expect("[")
+                while True:
+                    c = peek(" \t\r\n,")
+                    if c == "]":
+                        pos += 1
+                        break
+                    if c == "":
+                        raise ValueError(f"Truncated Merkle log: {self.path}")
+                    leaf = value()
+                    self.count += 1
+                    yield leaf
+
+
+def publish_tiles(ob: dict = None, ca_key=None):
+    """Extends the tiled copy of the log (see merkle_tiles) and signs a checkpoint.
+
+    Tiles missed by an earlier failure are caught up, since writing always
+    resumes from the last checkpoint.
+    """
+    ob = ob if ob is not None else _load_log()
+    try:
+        return merkle_tiles.TileWriter().update(ob.get("leaves", []), ob.get("root"), ca_key=ca_key)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Merkle tiles not updated: {e}")
+        return None
+
+
+def append_certs(cert_pems: Iterable[bytes], ca_key=None) -> dict:
+    """Appends a batch of cert PEMs under the log lock, with one root computation,
+    one write and one signed checkpoint.
+
+    Returns:
+        {"first_index", "count", "size", "root", "checkpoint"}; checkpoint is
+        None if the tiles couldn't be published
+    """
+    leaves = [_hash(pem) for pem in cert_pems]
+    with _locked():
+        ob = _load_log()
+        first = len(ob.setdefault("leaves", []))
+        ob["leaves"].extend(leaves)
+        ob["root"] = _compute_root(ob["leaves"]) if ob["leaves"] else None
+        _save_log(ob)
+        checkpoint = publish_tiles(ob, ca_key=ca_key)
+    return {"first_index": first, "count": len(leaves), "size": len(ob["leaves"]),
+            "root": ob["root"], "checkpoint": checkpoint}
+
+
 def append_cert(cert_pem: bytes) -> dict:
     """Appends cert PEM to the log. Returns metadata including index and new root."""
-    ob = _load_log()
-    leaf = _hash(cert_pem)
-    ob.setdefault("leaves", []).append(leaf)
-    ob["root"] = _compute_root(ob["leaves"]) if ob["leaves"] else None
-    _save_log(ob)
-    return {"index": len(ob["leaves"])-1, "root": ob["root"]}
+    info = append_certs([cert_pem])
+    return {"index": info["first_index"], "root": info["root"]}
 
 
 def get_root() -> str:
@@ -0,0 +1,257 @@
+"""
+Tiled, static-servable layout of the Merkle transparency log.
+
+The log in ca/merkle_log.json is also materialized under ca/tiles/ in the
+style of Certificate Transparency tiled logs:
+
+  tile/<L>/<N>        full tile: 256 consecutive 32-byte hashes
+  tile/<L>/<N>.p/<W>  partial tile: the first W hashes of tile N
+  checkpoint          signed {origin, size, root, timestamp}
+
+Level L holds the roots of complete subtrees of 256**L leaves (level 0 is
+the leaves themselves). Those subtrees never change as the log grows, so
+tile files are written once and never rewritten; only the checkpoint is
+replaced. Tile indices are written in groups of three digits with an 'x'
+prefix on all but the last (1234067 -> x001/x234/067).
+
+Hashes match merkle_log: nodes are sha256(left_hex + right_hex) and an odd
+node at the right edge is paired with itself.
+"""
+
+import os
+import json
+import hashlib
+import datetime
+from typing import Callable, List, Optional
+
+import crl
+
+TILES_DIR = os.path.join("ca", "tiles")
+CHECKPOINT_NAME = "checkpoint"
+ORIGIN = "first-contact/merkle-log"
+TILE_HEIGHT = 8
+TILE_WIDTH = 1 << TILE_HEIGHT
+HASH_SIZE = 32
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _hash_pair(left: str, right: str) -> str:
+    return hashlib.sha256((left + right).encode()).hexdigest()
+
+
+def _subtree_root(nodes: List[str]) -> str:
+    """Root of a complete (power-of-two sized) run of nodes."""
+    while len(nodes) > 1:
+        nodes = [_hash_pair(nodes[i], nodes[i + 1]) for i in range(0, len(nodes), 2)]
+    return nodes[0]
+
+
+def tile_path(level: int, index: int, width: int = TILE_WIDTH) -> str:
+    """Relative path of a tile, e.g. tile/0/x001/234 or tile/1/005.p/17."""
+    digits = f"{index:03d}"
+    digits = "0" * (-len(digits) % 3) + digits
+    groups = [digits[i:i + 3] for i in range(0, len(digits), 3)]
+    path = "/".join(["tile", str(level)] + ["x" + g for g in groups[:-1]] + [groups[-1]])
+    if width < TILE_WIDTH:
+        path += f".p/{width}"
+    return path
+
+
+def _level_width(size: int, level: int) -> int:
+    """Number of complete level-`level` subtrees in a tree of `size` leaves."""
+    return size // (TILE_WIDTH ** level)
+
+
+def _sign(key, raw: bytes) -> bytes:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+    if isinstance(key, rsa.RSAPrivateKey):
+        return key.sign(raw, padding.PKCS1v15(), hashes.SHA256())
+    return key.sign(raw)
+
+
+def _verify(pubkey, sig: bytes, raw: bytes):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+    if isinstance(pubkey, rsa.RSAPublicKey):
+        pubkey.verify(sig, raw, padding.PKCS1v15(), hashes.SHA256())
+    else:
+        pubkey.verify(sig, raw)
+
+
+def _payload(checkpoint: dict) -> bytes:
+    body = {k: v for k, v in checkpoint.items() if k != "sig"}
+    return json.dumps(body, sort_keys=True).encode("utf-8")
+
+
+def load_ca_key():
+    """Loads the CA private key used to sign checkpoints."""
+    from cryptography.hazmat.primitives import serialization
+
+    if not os.path.exists(crl.CA_KEY_PATH):
+        raise FileNotFoundError("CA private key not found for checkpoint signing")
+    with open(crl.CA_KEY_PATH, "rb") as f:
+        return serialization.load_pem_private_key(f.read(), password=None)
+
+
+def sign_checkpoint(size: int, root: Optional[str], ca_key, timestamp: Optional[datetime.datetime] = None) -> dict:
+    """Creates a signed tree head for a log of `size` leaves."""
+    timestamp = timestamp or datetime.datetime.now(datetime.timezone.utc)
+    checkpoint = {
+        "origin": ORIGIN,
+        "size": int(size),
+        "root": root,
+        "timestamp": timestamp.strftime(_TIME_FORMAT),
+    }
+    checkpoint["sig"] = _sign(ca_key, _payload(checkpoint)).hex()
+    return checkpoint
+
+
+def verify_checkpoint(checkpoint: dict, ca_pubkey) -> dict:
+    """Checks a checkpoint's origin and signature and returns it.
+
+    Raises:
+        ValueError: If it is malformed, for another log, or badly signed
+    """
+    try:
+        sig = bytes.fromhex(checkpoint["sig"])
+        int(checkpoint["size"])
+        origin = checkpoint["origin"]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed checkpoint: {e}")
+    if origin != ORIGIN:
+        raise ValueError(f"Checkpoint is for another log: {origin}")
+    try:
+        _verify(ca_pubkey, sig, _payload(checkpoint))
+    except Exception as e:
+        raise ValueError(f"Checkpoint signature invalid: {e}")
+    return checkpoint
+
+
+class TileWriter:
+    """Extends the tile tree of a growing log without rewriting existing tiles."""
+    def __init__(self, base_dir: str = TILES_DIR):
+        self.base_dir = base_dir
+
+    def _path(self, level: int, index: int, width: int = TILE_WIDTH) -> str:
+        return os.path.join(self.base_dir, *tile_path(level, index, width).split("/"))
+
+    def _read(self, level: int, index: int, width: int = TILE_WIDTH) -> List[str]:
+        with open(self._path(level, index, width), "rb") as f:
+            data = f.read()
+        return [data[i:i + HASH_SIZE].hex() for i in range(0, len(data), HASH_SIZE)]
+
+    def _write(self, level: int, index: int, hashes: List[str]):
+        path = self._path(level, index, len(hashes))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(bytes.fromhex(h) for h in hashes))
+        try:
+            os.link(tmp, path)  # Never replaces an existing tile
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+
+    def checkpoint(self) -> Optional[dict]:
+        """The current checkpoint, or None if no tiles were written yet."""
+        try:
+            with open(os.path.join(self.base_dir, CHECKPOINT_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _nodes(self, level: int, old_size: int, new_size: int, leaves: List[str]) -> dict:
+        """New complete level nodes keyed by index, built from the tiles below."""
+        start, stop = _level_width(old_size, level), _level_width(new_size, level)
+        if level == 0:
+            return {i: leaves[i] for i in range(start, stop)}
+        return {j: _subtree_root(self._read(level - 1, j)) for j in range(start, stop)}
+
+    def extend(self, leaves: List[str], old_size: int):
+        """Writes the tiles covering leaves[old_size:]."""
+        new_size = len(leaves)
+        level = 0
+        while _level_width(new_size, level) > 0:
+            new_nodes = self._nodes(level, old_size, new_size, leaves)
+            old_width = _level_width(old_size, level)
+            new_width = _level_width(new_size, level)
+            for tile in sorted({i // TILE_WIDTH for i in new_nodes}):
+                first = tile * TILE_WIDTH
+                # Earlier nodes of this tile are already in its previous partial tile
+                prev = min(old_width - first, TILE_WIDTH) if old_width > first else 0
+                hashes = self._read(level, tile, prev) if prev else []
+                hashes += [new_nodes[i] for i in range(first + prev, min(new_width, first + TILE_WIDTH))]
+                self._write(level, tile, hashes)
+            level += 1
+
+    def update(self, leaves: List[str], root: Optional[str], ca_key=None) -> dict:
+        """Brings the tiles up to date with leaves and publishes a signed checkpoint.
+
+        Returns:
+            The new checkpoint
+        """
+        current = self.checkpoint()
+        old_size = current["size"] if current else 0
+        if old_size > len(leaves):
+            raise ValueError("Log is smaller than its last checkpoint")
+        self.extend(leaves, old_size)
+        checkpoint = sign_checkpoint(len(leaves), root, ca_key or load_ca_key())
+        path = os.path.join(self.base_dir, CHECKPOINT_NAME)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+        return checkpoint
+
+
+def compute_root(size: int, read_tile: Callable[[str], bytes]) -> Optional[str]:
+    """Recomputes the root of a `size`-leaf log from its tiles.
+
+    `read_tile` maps a tile path (see tile_path) to its bytes, e.g. a local
+    read or an HTTP GET against a static mirror; each tile is fetched once.
+    """
+    if size == 0:
+        return None
+    cache = {}
+
+    def stored(level: int, index: int, width: int) -> str:
+        """Hash of a complete subtree kept in the tiles."""
+        tile = index // TILE_WIDTH
+        # Use the full tile if it exists in this tree, else the partial one
+        tile_width = min(width - tile * TILE_WIDTH, TILE_WIDTH)
+        key = (level, tile, tile_width)
+        if key not in cache:
+            data = read_tile(tile_path(level, tile, tile_width))
+            if len(data) != tile_width * HASH_SIZE:
+                raise ValueError(f"Tile {tile_path(level, tile, tile_width)} has the wrong size")
+            cache[key] = data
+        offset = (index % TILE_WIDTH) * HASH_SIZE
+        return cache[key][offset:offset + HASH_SIZE].hex()
+
+    def node(height: int, index: int) -> str:
+        """Node `index` at `height` levels above the leaves (merkle_log semantics)."""
+        span = 1 << height
+        if height % TILE_HEIGHT == 0 and (index + 1) * span <= size:
+            level = height // TILE_HEIGHT
+            return stored(level, index, _level_width(size, level))
+        below = -(-size // (span >> 1))  # nodes one level down
+        left = node(height - 1, 2 * index)
+        right = node(height - 1, 2 * index + 1) if 2 * index + 1 < below else left
+        return _hash_pair(left, right)
+
+    height = 0
+    while (1 << height) < size:
+        height += 1
+    return node(height, 0)
+
+
+def read_local_tile(base_dir: str = TILES_DIR) -> Callable[[str], bytes]:
+    """A read_tile function for compute_root over a local tiles directory."""
+    def _read(path: str) -> bytes:
+        with open(os.path.join(base_dir, *path.split("/")), "rb") as f:
+            return f.read()
+    return _read
@@ -0,0 +1,146 @@
+"""
+Batching sequencer for the Merkle transparency log.
+
+Issuers submit certificates and get a Future for their log position back
+immediately. One integrator thread appends everything that arrived within
+`max_merge_delay` seconds (or `max_batch` leaves) with a single locked
+merkle_log.append_certs call, so each batch costs one log write, one root
+computation and one signed tree head (a merkle_tiles checkpoint) no matter
+how many issuers are submitting.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+import merkle_log
+import merkle_tiles
+
+DEFAULT_MAX_MERGE_DELAY = float(os.environ.get("LOG_MAX_MERGE_DELAY", "0.5"))
+DEFAULT_MAX_BATCH = 1024
+
+
+class LogSequencer:
+    """Collects log submissions and integrates them in batches.
+
+    Each Future resolves to {"index", "size", "root", "tree_head"} once its
+    leaf is in the log; tree_head is the signed checkpoint of that batch
+    (None if it couldn't be published). `on_tree_head` is called with every
+    new checkpoint.
+    """
+    def __init__(self, max_merge_delay: float = DEFAULT_MAX_MERGE_DELAY, max_batch: int = DEFAULT_MAX_BATCH,
+                 ca_key=None, on_tree_head: Optional[Callable[[dict], None]] = None):
+        self.max_merge_delay = max_merge_delay
+        self.max_batch = max_batch
+        self.ca_key = ca_key
+        self.on_tree_head = on_tree_head
+        self.tree_head: Optional[dict] = None
+        self.stats = {"batches": 0, "leaves": 0, "largest_batch": 0, "errors": 0}
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[bytes, Future]] = []
+        self._first_at: Optional[float] = None
+        self._flush = False
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, cert_pem: bytes) -> Future:
+        """Queues a certificate for the next batch."""
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Sequencer is stopped")
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append((cert_pem, future))
+            self._cond.notify()
+        return future
+
+    def append(self, cert_pem: bytes, timeout: Optional[float] = None) -> dict:
+        """Submits a certificate and waits until it has been integrated."""
+        return self.submit(cert_pem).result(timeout)
+
+    def flush(self):
+        """Integrates whatever is pending without waiting out the merge delay.
+
+        A no-op when nothing is pending: the flag is only cleared by a batch,
+        so setting it on an idle sequencer would let the next submission skip
+        its merge delay.
+        """
+        with self._cond:
+            if self._pending:
+                self._flush = True
+                self._cond.notify()
+
+    def _next_batch(self) -> Optional[List[Tuple[bytes, Future]]]:
+        with self._cond:
+            while True:
+                if self._pending:
+                    due = self._first_at + self.max_merge_delay - time.monotonic()
+                    if due <= 0 or len(self._pending) >= self.max_batch or self._flush or self._stopped:
+                        break
+                    self._cond.wait(due)
+                elif self._stopped:
+                    return None
+                else:
+                    self._cond.wait()
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if self._pending:
+                self._first_at = time.monotonic()
+            else:
+                self._first_at = None
+                self._flush = False
+            return batch
+
+    def _integrate(self, batch: List[Tuple[bytes, Future]]):
+        try:
+            info = merkle_log.append_certs([pem for pem, _ in batch], ca_key=self.ca_key)
+        except Exception as e:
+            self.stats["errors"] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.stats["batches"] += 1
+        self.stats["leaves"] += len(batch)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        checkpoint = info["checkpoint"]
+        if checkpoint:
+            self.tree_head = checkpoint
+            if self.on_tree_head:
+                try:
+                    self.on_tree_head(checkpoint)
+                except Exception:
+                    pass  # A bad listener must not stall integration
+        for offset, (_, future) in enumerate(batch):
+            future.set_result({"index": info["first_index"] + offset, "size": info["size"],
+                               "root": info["root"], "tree_head": checkpoint})
+
+    def start(self):
+        """Integrates from a background thread until stop() is called."""
+        if self._thread is not None:
+            return
+        if self.ca_key is None:
+            try:
+                # Loaded once here rather than for every batch's signature
+                self.ca_key = merkle_tiles.load_ca_key()
+            except FileNotFoundError:
+                pass  # append_certs reports the missing key per batch
+
+        def _loop():
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._integrate(batch)
+
+        self._thread = threading.Thread(target=_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Integrates anything still pending, then stops the integrator thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Local revocation status responder (OCSP-like).
+
+Answers "is serial N good or revoked?" with a short-lived statement signed
+by the CA key, so peers can staple their own status to a handshake and
+validators check one small signature instead of loading the whole CRL.
+
+Protocol: one JSON object per line over TCP.
+  request:  {"serial": 1234}
+  response: {"serial": 1234, "status": "good", "this_update": "...",
+             "next_update": "...", "sig": "<hex>"}
+
+Usage:
+  python status_responder.py                    # serve on 127.0.0.1:7400
+  python status_responder.py --port 7400 --validity 3600
+"""
+
+import os
+import json
+import socket
+import argparse
+import datetime
+import threading
+import socketserver
+from typing import Optional, Tuple
+
+import crl
+
+DEFAULT_RESPONDER = os.environ.get("STATUS_RESPONDER", "127.0.0.1:7400")
+DEFAULT_VALIDITY = int(os.environ.get("STATUS_VALIDITY", "3600"))
+MAX_STATEMENT_BYTES = 4096
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Splits 'host:port' into a (host, port) tuple."""
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+
+def parse_time(value: str) -> datetime.datetime:
+    """Parses a statement timestamp into a UTC-aware datetime."""
+    return datetime.datetime.strptime(value, _TIME_FORMAT).replace(tzinfo=datetime.timezone.utc)
+
+
+def _payload(statement: dict) -> bytes:
+    """Canonical bytes covered by the statement signature."""
+    body = {k: v for k, v in statement.items() if k != "sig"}
+    return json.dumps(body, sort_keys=True).encode("utf-8")
+
+
+def _sign(key, raw: bytes) -> bytes:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+    if isinstance(key, rsa.RSAPrivateKey):
+        return key.sign(raw, padding.PKCS1v15(), hashes.SHA256())
+    # Ed25519/Ed448 keys sign the message directly
+    return key.sign(raw)
+
+
+def _verify(pubkey, sig: bytes, raw: bytes):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+    if isinstance(pubkey, rsa.RSAPublicKey):
+        pubkey.verify(sig, raw, padding.PKCS1v15(), hashes.SHA256())
+    else:
+        pubkey.verify(sig, raw)
+
+
+def sign_statement(serial: int, revoked: bool, ca_key, validity: int = DEFAULT_VALIDITY) -> dict:
+    """Creates a signed status statement for one certificate serial."""
+    now = _now()
+    statement = {
+        "serial": int(serial),
+        "status": "revoked" if revoked else "good",
+        "this_update": now.strftime(_TIME_FORMAT),
+        "next_update": (now + datetime.timedelta(seconds=validity)).strftime(_TIME_FORMAT),
+    }
+    statement["sig"] = _sign(ca_key, _payload(statement)).hex()
+    return statement
+
+
+def verify_statement(statement: dict, ca_pubkey, serial: int,
+                     now: Optional[datetime.datetime] = None) -> str:
+    """Checks a stapled statement and returns its status ('good' or 'revoked').
+
+    Raises:
+        ValueError: If the signature, serial or validity window is wrong
+    """
+    try:
+        sig = bytes.fromhex(statement["sig"])
+        this_update = parse_time(statement["this_update"])
+        next_update = parse_time(statement["next_update"])
+        status = statement["status"]
+        stated_serial = int(statement["serial"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed status statement: {e}")
+
+    try:
+        _verify(ca_pubkey, sig, _payload(statement))
+    except Exception as e:
+        raise ValueError(f"Status statement signature invalid: {e}")
+
+    if stated_serial != int(serial):
+        raise ValueError("Status statement is for a different certificate")
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    if not (this_update <= now < next_update):
+        raise ValueError("Status statement expired or not yet valid")
+    if status not in ("good", "revoked"):
+        raise ValueError(f"Unknown certificate status: {status}")
+    return status
+
+
+class StatusResponder:
+    """Signs status statements from the CRL, caching them per serial.
+
+    The CRL is reloaded (and its signature checked) only when the file
+    changes; a cached statement is reused until half its validity has passed.
+    """
+    def __init__(self, ca_key, validity: int = DEFAULT_VALIDITY):
+        self.ca_key = ca_key
+        self.validity = validity
+        self._lock = threading.Lock()
+        self._crl_mtime = None
+        self._revoked = frozenset()
+        self._cache = {}  # serial -> (refresh_after, statement)
+
+    def _refresh_crl(self):
+        try:
+            mtime = os.path.getmtime(crl.CRL_PATH)
+        except OSError:
+            mtime = None
+        if mtime == self._crl_mtime:
+            return
+        if mtime is None:
+            revoked = frozenset()
+        else:
+            if not crl.verify_crl_signature(self.ca_key.public_key()):
+                # Fail closed: answering "good" from an unverified CRL would be worse than not answering
+                raise ValueError("CRL signature invalid or missing")
+            revoked = frozenset(crl.get_revoked_serials())
+        self._revoked = revoked
+        self._crl_mtime = mtime
+        self._cache.clear()
+
+    def statement_for(self, serial: int) -> dict:
+        """Returns a current signed statement for serial."""
+        serial = int(serial)
+        with self._lock:
+            self._refresh_crl()
+            now = _now()
+            cached = self._cache.get(serial)
+            if cached and now < cached[0]:
+                return cached[1]
+            statement = sign_statement(serial, serial in self._revoked, self.ca_key, self.validity)
+            self._cache[serial] = (now + datetime.timedelta(seconds=self.validity / 2), statement)
+            return statement
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_STATEMENT_BYTES)
+        try:
+            serial = int(json.loads(line.decode("utf-8"))["serial"])
+            response = self.server.responder.statement_for(serial)
+        except Exception as e:
+            response = {"error": str(e)}
+        self.wfile.write(json.dumps(response, sort_keys=True).encode("utf-8") + b"\n")
+
+
+class ResponderServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], responder: StatusResponder):
+        super().__init__(address, _Handler)
+        self.responder = responder
+
+
+def fetch_statement(serial: int, host: str, port: int, timeout: float = 5.0) -> dict:
+    """Requests the current statement for serial from a responder.
+
+    Raises:
+        ValueError: If the responder returned an error
+        OSError: On connection failure
+    """
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(json.dumps({"serial": int(serial)}).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            response = json.loads(f.readline(MAX_STATEMENT_BYTES).decode("utf-8"))
+    if "error" in response:
+        raise ValueError(f"Status responder error: {response['error']}")
+    return response
+
+
+def main():
+    from cryptography.hazmat.primitives import serialization
+
+    default_host, default_port = parse_address(DEFAULT_RESPONDER)
+    parser = argparse.ArgumentParser(description="Local certificate status responder.")
+    parser.add_argument("--host", default=default_host, help=f"Bind address (default: {default_host})")
+    parser.add_argument("--port", type=int, default=default_port, help=f"Bind port (default: {default_port})")
+    parser.add_argument("--validity", type=int, default=DEFAULT_VALIDITY,
+                        help=f"Statement lifetime in seconds (default: {DEFAULT_VALIDITY})")
+    args = parser.parse_args()
+
+    with open(crl.CA_KEY_PATH, "rb") as f:
+        ca_key = serialization.load_pem_private_key(f.read(), password=None)
+
+    server = ResponderServer((args.host, args.port), StatusResponder(ca_key, validity=args.validity))
+    print(f"Status responder listening on {args.host}:{args.port} (validity {args.validity}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
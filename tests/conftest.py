@@ -2,15 +2,11 @@ import pytest
 import importlib.util
 import pathlib
 import sys
-import tempfile
-import os
-import shutil
 import threading
 import socket
-import time as _time
 import app.utils as app_utils
 import app.handshake as app_handshake
-from cryptography.hazmat.primitives import serialization
+from app.credentials import Credentials
 # Dynamically load helpers from tests/utils so pytest can import conftest
 _utils_dir = pathlib.Path(__file__).parent / "utils"
 
@@ -23,114 +19,92 @@ def _load_util_module(name: str, filename: str):
 _ca = _load_util_module("tests_utils_ca", "ca.py")
 _transport = _load_util_module("tests_utils_transport", "transport.py")
 _timewrap = _load_util_module("tests_utils_timewrap", "timewrap.py")
+_memtls = _load_util_module("tests_utils_memtls", "memtls.py")
+_credpool = _load_util_module("tests_utils_credpool", "credpool.py")
 
 make_root_ca = _ca.make_root_ca
 make_id_keys = _ca.make_id_keys
 DirectTransport = _transport.DirectTransport
 InterceptingTransport = _transport.InterceptingTransport
 timewarp = _timewrap.timewarp
+MemoryTLSHarness = _memtls.Harness
+CredentialPool = _credpool.CredentialPool
 
 # Ensure repository root is on sys.path so `app` package can be imported
 repo_root = str(pathlib.Path(__file__).parent.parent)
 if repo_root not in sys.path:
     sys.path.insert(0, repo_root)
 
+@pytest.fixture(scope="session")
+def credential_pool(request, tmp_path_factory):
+    """Named identities per key algorithm and validity window (tests/utils/credpool.py).
+
+    Generated once and kept in pytest's cache directory across runs, so
+    handing one out costs no key generation or signing.
+    """
+    cache = getattr(request.config, "cache", None)
+    directory = cache.mkdir("credpool") if cache is not None else tmp_path_factory.mktemp("credpool")
+    return CredentialPool(str(directory))
+
 @pytest.fixture
-def session_pair(request, make_id_keys_factory, root_ca):
+def configured_identity(credential_pool, monkeypatch):
+    """Points the `app.utils` identity paths at pooled Alice for code that reads them."""
+    keys = credential_pool.get("Alice")
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", keys['ca_path'])
+    monkeypatch.setattr(app_utils, "USER_CERT_PATH", keys['cert_path'])
+    monkeypatch.setattr(app_utils, "USER_KEY_PATH", keys['key_path'])
+    return keys
+
+@pytest.fixture
+def session_pair(request, credential_pool):
     """Create in-process TLS client/server SessionState pair (a_state, b_state).
 
-    This fixture generates temporary CA + identity cert files, points the
-    `app.utils` paths at them, then spins up a server thread that accepts a
-    single connection and returns the SessionState objects.
+    Alice and Bob come from the credential pool and are passed to the
+    handshake functions as Credentials, so `app.utils` is left alone. A
+    server thread accepts a single connection and returns the SessionState objects.
     """
-    tmp = tempfile.mkdtemp(prefix="fcp_test_")
-    try:
-        ca_dir = os.path.join(tmp, "ca")
-        keys_dir = os.path.join(tmp, "keys")
-        os.makedirs(ca_dir, exist_ok=True)
-        os.makedirs(keys_dir, exist_ok=True)
-
-        # Create root CA and two identities
-        root = root_ca
-        a_keys = make_id_keys_factory("Alice", issuer=root)
-        b_keys = make_id_keys_factory("Bob", issuer=root)
-
-        # Write PEM files
-        ca_pem = os.path.join(ca_dir, "root_cert.pem")
-        with open(ca_pem, "wb") as f:
-            f.write(root['cert'].public_bytes(serialization.Encoding.PEM))
-
-        def write_keypair(name, pair):
-            cert_p = os.path.join(keys_dir, f"{name}_cert.pem")
-            key_p = os.path.join(keys_dir, f"{name}_key.pem")
-            with open(cert_p, "wb") as f:
-                f.write(pair['cert'].public_bytes(serialization.Encoding.PEM))
-            with open(key_p, "wb") as f:
-                f.write(pair['private_key'].private_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PrivateFormat.PKCS8,
-                    encryption_algorithm=serialization.NoEncryption()
-                ))
-            return cert_p, key_p
-
-        a_cert_p, a_key_p = write_keypair("Alice", a_keys)
-        b_cert_p, b_key_p = write_keypair("Bob", b_keys)
-
-        # Prepare server thread
-        server_ready = threading.Event()
-        server_state = {}
-
-        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        listener.bind(("127.0.0.1", 0))
-        listener.listen(1)
-        port = listener.getsockname()[1]
-
-        def server_thread():
-            raw_conn, addr = listener.accept()
-            # point app utils to server cert/key/ca
-            app_utils.CA_ROOT_PATH = ca_pem
-            app_utils.USER_CERT_PATH = b_cert_p
-            app_utils.USER_KEY_PATH = b_key_p
-            # create server SessionState
-            state = app_handshake.handle_incoming_connection(raw_conn, addr)
-            server_state['state'] = state
-            server_ready.set()
-
-        t = threading.Thread(target=server_thread, daemon=True)
-        t.start()
-
-        # Give server a moment to start listening
-        _time.sleep(0.05)
-
-        # point app utils to client cert/key/ca for the client side
-        app_utils.CA_ROOT_PATH = ca_pem
-        app_utils.USER_CERT_PATH = a_cert_p
-        app_utils.USER_KEY_PATH = a_key_p
-
-        # Initiate client connection
-        a_state = app_handshake.initiate_tls_handshake("127.0.0.1", port)
-
-        # Wait for server to accept and create state
-        server_ready.wait(timeout=5.0)
-        b_state = server_state.get('state')
-
-        yield a_state, b_state
-
-        # Teardown: close sockets
-        try:
-            if a_state and hasattr(a_state, 'conn'):
-                a_state.conn.close()
-        except Exception:
-            pass
+    a_keys = credential_pool.get("Alice")
+    b_keys = credential_pool.get("Bob")
+    alice = Credentials(a_keys['ca_path'], a_keys['cert_path'], a_keys['key_path'])
+    bob = Credentials(b_keys['ca_path'], b_keys['cert_path'], b_keys['key_path'])
+
+    # Prepare server thread
+    server_ready = threading.Event()
+    server_state = {}
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    port = listener.getsockname()[1]
+
+    def server_thread():
+        raw_conn, addr = listener.accept()
+        # create server SessionState
+        state = app_handshake.handle_incoming_connection(raw_conn, addr, credentials=bob)
+        server_state['state'] = state
+        server_ready.set()
+
+    t = threading.Thread(target=server_thread, daemon=True)
+    t.start()
+
+    # Initiate client connection
+    a_state = app_handshake.initiate_tls_handshake("127.0.0.1", port, credentials=alice)
+
+    # Wait for server to accept and create state
+    server_ready.wait(timeout=5.0)
+    b_state = server_state.get('state')
+
+    yield a_state, b_state
+
+    # Teardown: close sockets
+    for state in (a_state, b_state):
         try:
-            if b_state and hasattr(b_state, 'conn'):
-                b_state.conn.close()
+            if state and hasattr(state, 'conn'):
+                state.conn.close()
         except Exception:
             pass
-        listener.close()
-    finally:
-        shutil.rmtree(tmp)
+    listener.close()
 
 @pytest.fixture(scope="session")
 def root_ca():
@@ -142,6 +116,11 @@ def alt_root_ca():
     """Attacker root CA"""
     return make_root_ca("Attacker Root CA")
 
+@pytest.fixture
+def impostor_root_ca():
+    """Different key, same name as root_ca: only a signature check tells them apart"""
+    return make_root_ca("Test Root CA")
+
 @pytest.fixture
 def make_id_keys_factory(root_ca):
     def _make(name, issuer=root_ca, valid_days=30):
@@ -158,6 +137,23 @@ def direct_pair():
     a.attach_peer(b); b.attach_peer(a)
     return a, b
 
+@pytest.fixture
+def memtls(tmp_path, monkeypatch, root_ca):
+    """Socket-free handshakes with the real app contexts, trusting root_ca.
+
+    Single-threaded over MemoryBIO and DirectTransport pairs (see
+    tests/utils/memtls.py); app.utils.CA_ROOT_PATH points at the same CA so
+    memtls validation runs the app-level peer checks too.
+    """
+    def pair():
+        a, b = DirectTransport(), DirectTransport()
+        a.attach_peer(b); b.attach_peer(a)
+        return a, b
+
+    harness = MemoryTLSHarness(str(tmp_path), root_ca, pair)
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", harness.ca_path)
+    return harness
+
 @pytest.fixture
 def intercepting_pair():
     a = InterceptingTransport(); b = InterceptingTransport()
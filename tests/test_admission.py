@@ -0,0 +1,260 @@
+import socket
+import ssl
+import threading
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from app import utils as app_utils
+from app import workers
+from app.admission import AdmissionController
+from app.handshake import AUTH_FAILURE, TRANSPORT_FAILURE, handle_incoming_connection
+from app.utils import create_ssl_context
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_buckets_limit_per_source_and_globally():
+    clock = _Clock()
+    adm = AdmissionController(per_ip_rate=1, per_ip_burst=2, global_rate=1, global_burst=3,
+                              max_concurrent=100, clock=clock)
+    results = [adm.admit("10.0.0.1") for _ in range(3)]
+    assert results == [None, None, "source_rate"]
+    assert adm.admit("10.0.0.2") is None
+    assert adm.admit("10.0.0.3") == "global_rate"  # global burst of 3 used up
+
+    clock.now += 1.0  # one token back in each bucket
+    assert adm.admit("10.0.0.3") is None
+    assert adm.stats()["admitted"] == 4
+
+
+def test_concurrent_handshake_cap_frees_on_release():
+    adm = AdmissionController(per_ip_burst=100, max_concurrent=2, clock=_Clock())
+    assert adm.admit("a") is None and adm.admit("b") is None
+    assert adm.admit("c") == "concurrency"
+    adm.release("a", authenticated=True)
+    assert adm.admit("c") is None
+    assert adm.stats()["in_flight"] == 2
+
+
+def test_failures_decay_and_repeat_bans_double():
+    clock = _Clock()
+    adm = AdmissionController(per_ip_rate=1000, per_ip_burst=1000, ban_threshold=3, failure_half_life=10,
+                              ban_seconds=30, clock=clock)
+
+    def fail(ip="6.6.6.6"):
+        assert adm.admit(ip) is None
+        return adm.release(ip, authenticated=False)
+
+    # Spread-out failures decay away and never reach the threshold
+    for _ in range(5):
+        assert fail() == 0
+        clock.now += 30
+    assert not adm.is_banned("6.6.6.6")
+
+    assert [fail(), fail(), fail()] == [0, 0, 30]
+    assert adm.admit("6.6.6.6") == "banned"
+    assert adm.admit("7.7.7.7") is None  # other sources are unaffected
+    adm.release("7.7.7.7", authenticated=True)
+
+    clock.now += 31
+    assert [fail(), fail(), fail()] == [0, 0, 60]
+    stats = adm.stats()
+    assert stats["bans"] == 2 and stats["banned_now"] == 1 and stats["banned"] == 1
+
+
+def test_success_resets_the_failure_score():
+    adm = AdmissionController(per_ip_burst=100, ban_threshold=2, clock=_Clock())
+    for authenticated in (False, True, False, True):
+        assert adm.admit("1.2.3.4") is None
+        assert adm.release("1.2.3.4", authenticated) == 0
+
+
+def test_source_table_is_bounded():
+    adm = AdmissionController(global_burst=10_000, max_sources=100, clock=_Clock())
+    for i in range(1000):
+        ip = f"10.0.{i // 256}.{i % 256}"
+        assert adm.admit(ip) is None
+        adm.release(ip, authenticated=False)
+    assert adm.stats()["tracked_sources"] == 100
+
+
+@pytest.mark.skipif(not workers.supported(), reason="needs fork() and SO_REUSEPORT")
+def test_listener_stops_handshaking_with_a_failing_source(tmp_path, monkeypatch, root_ca, alt_root_ca,
+                                                          make_id_keys_factory):
+    def write(name, pair):
+        paths = (str(tmp_path / f"{name}_cert.pem"), str(tmp_path / f"{name}_key.pem"))
+        with open(paths[0], "wb") as f:
+            f.write(pair["cert"].public_bytes(serialization.Encoding.PEM))
+        with open(paths[1], "wb") as f:
+            f.write(pair["private_key"].private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                      serialization.NoEncryption()))
+        return paths
+
+    ca_pem = str(tmp_path / "root_cert.pem")
+    with open(ca_pem, "wb") as f:
+        f.write(root_ca["cert"].public_bytes(serialization.Encoding.PEM))
+    bob = write("Bob", make_id_keys_factory("Bob"))
+    mallory = write("Mallory", make_id_keys_factory("Mallory", issuer=alt_root_ca))  # wrong CA
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", ca_pem)
+
+    server_ctx = create_ssl_context(is_server=True, ca_path=ca_pem, cert_path=bob[0], key_path=bob[1])
+    sup = workers.WorkerSupervisor(workers=1, port=0, host="127.0.0.1", context=server_ctx)
+    sup.start()
+    thread = threading.Thread(target=sup.serve_forever, daemon=True)
+    thread.start()
+    client_ctx = create_ssl_context(is_server=False, ca_path=ca_pem, cert_path=mallory[0], key_path=mallory[1])
+    deadline = time.monotonic() + 10
+    while not sup.stats()["per_worker"] and time.monotonic() < deadline:
+        time.sleep(0.02)  # The worker reports once it is listening
+
+    def attempts():
+        stats = sup.stats()
+        return stats["failures"] + stats["rejected"]
+
+    try:
+        for i in range(8):
+            raw = socket.create_connection(("127.0.0.1", sup.port), timeout=5)
+            try:
+                conn = client_ctx.wrap_socket(raw, server_hostname="127.0.0.1")
+                conn.read(1)  # TLS 1.3 reports the client-cert rejection on the first read
+            except (ssl.SSLError, OSError):
+                pass
+            finally:
+                raw.close()
+            # Let the worker record the outcome before the next attempt
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and attempts() <= i:
+                time.sleep(0.02)
+        stats = sup.stats()
+        assert stats["handshakes"] == 0
+        # Banned once the decaying score reaches the default threshold of 5; the
+        # decay between attempts may make that the sixth failure
+        assert stats["failures"] in (5, 6) and stats["rejected"] == 8 - stats["failures"]
+    finally:
+        sup.stop()
+        thread.join(5.0)
+
+
+def test_only_authentication_failures_count_towards_a_ban(tmp_path, monkeypatch, root_ca, alt_root_ca,
+                                                          make_id_keys_factory):
+    def write(name, pair):
+        paths = (str(tmp_path / f"{name}_cert.pem"), str(tmp_path / f"{name}_key.pem"))
+        with open(paths[0], "wb") as f:
+            f.write(pair["cert"].public_bytes(serialization.Encoding.PEM))
+        with open(paths[1], "wb") as f:
+            f.write(pair["private_key"].private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                      serialization.NoEncryption()))
+        return paths
+
+    ca_pem = str(tmp_path / "root_cert.pem")
+    with open(ca_pem, "wb") as f:
+        f.write(root_ca["cert"].public_bytes(serialization.Encoding.PEM))
+    bob = write("Bob", make_id_keys_factory("Bob"))
+    mallory = write("Mallory", make_id_keys_factory("Mallory", issuer=alt_root_ca))  # wrong CA
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", ca_pem)
+    server_ctx = create_ssl_context(is_server=True, ca_path=ca_pem, cert_path=bob[0], key_path=bob[1])
+    client_ctx = create_ssl_context(is_server=False, ca_path=ca_pem, cert_path=mallory[0], key_path=mallory[1])
+
+    def serve(client):
+        listener = socket.create_server(("127.0.0.1", 0))
+        thread = threading.Thread(target=client, args=(listener.getsockname()[1],))
+        thread.start()
+        raw, addr = listener.accept()
+        listener.close()
+        outcome = {}
+        session = handle_incoming_connection(raw, addr, context=server_ctx, outcome=outcome)
+        thread.join(5.0)
+        assert session is None
+        return outcome["failure"]
+
+    def hang_up(port):
+        socket.create_connection(("127.0.0.1", port), timeout=5).close()
+
+    def not_tls(port):
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as raw:
+            raw.sendall(b"GET / HTTP/1.0\r\n\r\n")
+            try:
+                raw.recv(1024)
+            except OSError:
+                pass
+
+    def wrong_ca(port):
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as raw:
+            try:
+                client_ctx.wrap_socket(raw, server_hostname="127.0.0.1").read(1)
+            except (ssl.SSLError, OSError):
+                pass
+
+    assert serve(hang_up) == TRANSPORT_FAILURE
+    assert serve(not_tls) == TRANSPORT_FAILURE
+    assert serve(wrong_ca) == AUTH_FAILURE
+
+    adm = AdmissionController(ban_threshold=2)
+    for _ in range(5):
+        assert adm.admit("5.5.5.5") is None
+        assert adm.release("5.5.5.5", authenticated=None) == 0
+    assert adm.stats()["failures"] == 0 and not adm.is_banned("5.5.5.5")
+
+
+@pytest.mark.skipif(not workers.supported(), reason="needs fork() and SO_REUSEPORT")
+def test_a_stalled_handshake_times_out_and_frees_its_slot(tmp_path, monkeypatch, root_ca, make_id_keys_factory):
+    def write(name, pair):
+        paths = (str(tmp_path / f"{name}_cert.pem"), str(tmp_path / f"{name}_key.pem"))
+        with open(paths[0], "wb") as f:
+            f.write(pair["cert"].public_bytes(serialization.Encoding.PEM))
+        with open(paths[1], "wb") as f:
+            f.write(pair["private_key"].private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                      serialization.NoEncryption()))
+        return paths
+
+    ca_pem = str(tmp_path / "root_cert.pem")
+    with open(ca_pem, "wb") as f:
+        f.write(root_ca["cert"].public_bytes(serialization.Encoding.PEM))
+    bob = write("Bob", make_id_keys_factory("Bob"))
+    alice = write("Alice", make_id_keys_factory("Alice"))
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", ca_pem)
+    monkeypatch.setattr(app_utils, "HANDSHAKE_TIMEOUT", 0.5)
+
+    server_ctx = create_ssl_context(is_server=True, ca_path=ca_pem, cert_path=bob[0], key_path=bob[1])
+    sup = workers.WorkerSupervisor(workers=1, port=0, host="127.0.0.1", context=server_ctx,
+                                   admission=lambda: AdmissionController(per_ip_burst=100, max_concurrent=1))
+    sup.start()
+    thread = threading.Thread(target=sup.serve_forever, daemon=True)
+    thread.start()
+    client_ctx = create_ssl_context(is_server=False, ca_path=ca_pem, cert_path=alice[0], key_path=alice[1])
+
+    def wait_for(predicate):
+        deadline = time.monotonic() + 10
+        while not predicate() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return predicate()
+
+    try:
+        assert wait_for(lambda: sup.stats()["per_worker"])
+        idle = socket.create_connection(("127.0.0.1", sup.port), timeout=5)  # Never sends a ClientHello
+        started = time.monotonic()
+        # While it holds the only slot, the next connection is turned away
+        socket.create_connection(("127.0.0.1", sup.port), timeout=5).close()
+        assert wait_for(lambda: sup.stats()["rejected"] == 1)
+
+        assert wait_for(lambda: sup.stats()["failures"] == 1)
+        assert time.monotonic() - started >= 0.4
+        assert idle.recv(1) == b""  # Dropped by the listener
+        idle.close()
+
+        with socket.create_connection(("127.0.0.1", sup.port), timeout=5) as raw:
+            conn = client_ctx.wrap_socket(raw, server_hostname="127.0.0.1")
+            conn.write(b"hi")
+            assert wait_for(lambda: sup.stats()["handshakes"] == 1)
+            conn.close()
+    finally:
+        sup.stop()
+        thread.join(5.0)
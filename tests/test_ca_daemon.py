@@ -0,0 +1,87 @@
+import sys
+import threading
+
+import pytest
+from cryptography import x509
+
+import build_ca
+import ca_daemon
+import ca_tool
+import crl
+import inventory
+import merkle_log
+
+pytestmark = pytest.mark.skipif(not hasattr(ca_daemon, "DaemonServer"), reason="needs Unix domain sockets")
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    service = ca_daemon.CAService(batch_delay=0.02, log_delay=0.02)
+    service.start()
+    server = ca_daemon.DaemonServer(ca_daemon.SOCKET_PATH, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield service
+    server.shutdown()
+    server.server_close()
+    service.stop(timeout=5)
+
+
+def _pubkey_pem(username):
+    with open(ca_tool.generate_user_keypair(username), "rb") as f:
+        return f.read().decode("ascii")
+
+
+def test_daemon_batches_concurrent_issues_and_revocations(daemon):
+    with open("ca/root_cert.pem", "rb") as f:
+        root = x509.load_pem_x509_certificate(f.read())
+    pubkeys = {f"user-{i}": _pubkey_pem(f"user-{i}") for i in range(12)}
+    results = {}
+
+    def issue(username):
+        results[username] = ca_daemon.request({"op": "issue", "username": username,
+                                               "pubkey_pem": pubkeys[username], "valid_days": 1})
+
+    threads = [threading.Thread(target=issue, args=(u,)) for u in pubkeys]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for username, result in results.items():
+        cert = x509.load_pem_x509_certificate(result["cert_pem"].encode())
+        cert.verify_directly_issued_by(root)
+        assert cert.serial_number == result["serial"]
+    assert sorted(r["index"] for r in results.values()) == list(range(12))
+    assert len(merkle_log.get_leaves()) == 12
+
+    serials = [r["serial"] for r in results.values()]
+    first = ca_daemon.request({"op": "revoke", "serials": serials[:5] + serials[:2], "reason": "keyCompromise"})
+    assert first == {"revoked": serials[:5], "already_revoked": 2}
+    assert sorted(crl.get_revoked_serials()) == sorted(serials[:5])
+    with inventory.Inventory() as inv:  # Recorded by the daemon, log index included
+        assert [inv.by_serial(r["serial"])["log_index"] for r in results.values()] == \
+            [r["index"] for r in results.values()]
+        assert inv.audit()["revoked"] == 5
+
+    stats = ca_daemon.request({"op": "stats"})
+    assert stats["requests"] == {"issue": 12, "revoke": 1}
+    assert stats["completed"] == 13 and stats["errors"] == 0
+    assert stats["batches"] < 13 and stats["log"]["batches"] < 12
+    assert stats["queue_latency_ms"]["p99"] is not None
+
+    with pytest.raises(ValueError, match="Unknown operation"):
+        ca_daemon.request({"op": "rekey"})
+
+
+def test_ca_tool_uses_daemon_when_running(daemon, monkeypatch, capsys):
+    ca_tool.generate_user_keypair("Pilot-Alpha")
+    monkeypatch.setattr(sys, "argv", ["ca_tool.py", "issue", "Pilot-Alpha"])
+    ca_tool.main()
+    monkeypatch.setattr(sys, "argv", ["ca_tool.py", "revoke", "Pilot-Alpha"])
+    ca_tool.main()
+
+    out = capsys.readouterr().out
+    assert "Appended cert to Merkle log index=0" in out and "Revoked certificate" in out
+    assert daemon.stats()["requests"] == {"issue": 1, "revoke": 1}
@@ -0,0 +1,195 @@
+import os
+import shutil
+import socket
+import threading
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+import build_ca
+import crl
+import certificate_validation
+import app.utils as app_utils
+from app import handshake as app_handshake
+from app.credentials import Credentials
+from app.utils import create_ssl_context
+
+
+def test_validate_cert_accepts_der_pem_and_objects(root_ca, make_id_keys_factory):
+    leaf = make_id_keys_factory("Bob")
+    cert = leaf['cert']
+    der = cert.public_bytes(serialization.Encoding.DER)
+    pem = cert.public_bytes(serialization.Encoding.PEM)
+    anchor = certificate_validation.TrustAnchor(root_ca['cert'])
+
+    for peer in (cert, der, pem):
+        assert certificate_validation.validate_cert(peer, anchor, "Bob")
+    assert certificate_validation.validate_cert(der, root_ca['cert'], "Bob")
+    assert certificate_validation.validate_cert(
+        der, root_ca['cert'].public_bytes(serialization.Encoding.PEM), "Bob")
+
+    with pytest.raises(ValueError, match="Identity mismatch"):
+        certificate_validation.validate_cert(der, anchor, "Mallory")
+
+
+def test_trust_anchor_is_loaded_once_and_reloaded_on_change(tmp_path, root_ca, alt_root_ca):
+    path = str(tmp_path / "root_cert.pem")
+    with open(path, "wb") as f:
+        f.write(root_ca['cert'].public_bytes(serialization.Encoding.PEM))
+
+    first = certificate_validation.load_trust_anchor(path)
+    assert certificate_validation.load_trust_anchor(path) is first
+
+    with open(path, "wb") as f:
+        f.write(alt_root_ca['cert'].public_bytes(serialization.Encoding.PEM))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    reloaded = certificate_validation.load_trust_anchor(path)
+    assert reloaded is not first
+    assert reloaded.cert == alt_root_ca['cert']
+
+
+def test_signature_recheck_is_skipped_only_when_asked(root_ca, impostor_root_ca, make_id_keys_factory):
+    # Leaf from another CA: only the Python signature check can reject it here
+    foreign = make_id_keys_factory("Bob", issuer=impostor_root_ca)['cert']
+    anchor = certificate_validation.TrustAnchor(root_ca['cert'])
+
+    with pytest.raises(ValueError, match="signature verification failed"):
+        certificate_validation.validate_cert(foreign, anchor, "Bob")
+    assert certificate_validation.validate_cert(foreign, anchor, "Bob", verify_signature=False)
+    with pytest.raises(ValueError, match="Identity mismatch"):
+        certificate_validation.validate_cert(foreign, anchor, "Mallory", verify_signature=False)
+
+
+def test_tls_context_trusts_only_our_ca(configured_identity):
+    import app.utils as app_utils
+
+    for is_server in (False, True):
+        ctx = app_utils.create_ssl_context(is_server=is_server)
+        assert len(ctx.get_ca_certs()) == 1
+
+
+@pytest.fixture
+def full_validation(monkeypatch):
+    import app.utils as app_utils
+    monkeypatch.setattr(app_utils, "VALIDATION_MODE", "full")
+
+
+def test_handshake_in_full_validation_mode(full_validation, session_pair):
+    a_state, b_state = session_pair
+    assert a_state is not None and b_state is not None
+    assert (a_state.peer_id, b_state.peer_id) == ("Bob", "Alice")
+
+
+def _intermediate_identity(name, issuer, valid_days=1):
+    from ca_tool import generate_user_keypair
+
+    with open(generate_user_keypair(name), "rb") as f:
+        leaf = build_ca.issue_cert(name, f.read(), valid_days=valid_days, issuer=issuer)
+    cert_path = os.path.join("keys", f"{name}_cert.pem")
+    with open(cert_path, "wb") as f:
+        f.write(leaf + build_ca.issuer_chain_pem(issuer))
+    return leaf, cert_path, os.path.join("keys", f"{name}_key.pem")
+
+
+def test_chain_builder_verifies_intermediate_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    inter_path = build_ca.create_intermediate("issuer-1")
+    leaf_a, _, _ = _intermediate_identity("Alice", "issuer-1")
+    leaf_b, _, _ = _intermediate_identity("Bob", "issuer-1")
+
+    verified = []
+    real_verify = certificate_validation._verify_signature
+    monkeypatch.setattr(certificate_validation, "_verify_signature",
+                        lambda cert, key: verified.append(cert.subject) or real_verify(cert, key))
+
+    # Local ca/intermediates lookup through the file-backed anchor
+    anchor = certificate_validation.load_trust_anchor("ca/root_cert.pem")
+    assert certificate_validation.validate_cert(leaf_a, anchor, "Alice")
+    assert certificate_validation.validate_cert(leaf_b, anchor, "Bob")
+    inter = x509.load_pem_x509_certificate(open(inter_path, "rb").read())
+    assert verified.count(inter.subject) == 1  # the link was verified once, leaves every time
+    assert len(verified) == 3
+
+    # Without a local directory the peer-presented chain is needed
+    bare = certificate_validation.TrustAnchor(anchor.cert)
+    with pytest.raises(ValueError, match="No trusted intermediate"):
+        certificate_validation.validate_cert(leaf_a, bare, "Alice")
+    assert certificate_validation.validate_cert(leaf_a, bare, "Alice", intermediates=[open(inter_path, "rb").read()])
+
+    # Revoking the intermediate revokes everything below it
+    crl.revoke(inter.serial_number)
+    with pytest.raises(ValueError, match="revoked"):
+        certificate_validation.validate_cert(leaf_b, anchor, "Bob")
+
+
+def test_tls_serves_intermediate_chain(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    build_ca.create_intermediate("issuer-1")
+    _, s_cert, s_key = _intermediate_identity("Server", "issuer-1")
+    _, c_cert, c_key = _intermediate_identity("Client", "issuer-1")
+    server_ctx = create_ssl_context(is_server=True, ca_path="ca/root_cert.pem", cert_path=s_cert, key_path=s_key)
+    client_ctx = create_ssl_context(is_server=False, ca_path="ca/root_cert.pem", cert_path=c_cert, key_path=c_key)
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    result = {}
+
+    def serve():
+        raw, _ = listener.accept()
+        with server_ctx.wrap_socket(raw, server_side=True) as conn:
+            result["peer"] = conn.getpeercert(binary_form=True)
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+    # Only the root is trusted, so both handshakes rely on the served intermediate
+    with client_ctx.wrap_socket(socket.create_connection(listener.getsockname())) as conn:
+        server_der = conn.getpeercert(binary_form=True)
+    t.join(timeout=5)
+    listener.close()
+
+    anchor = certificate_validation.load_trust_anchor("ca/root_cert.pem")
+    assert certificate_validation.validate_cert(server_der, anchor, "Server")
+    assert certificate_validation.validate_cert(result["peer"], anchor, "Client")
+
+
+@pytest.mark.parametrize("mode", ["tls", "full"])
+def test_handshake_accepts_served_intermediate_without_local_directory(tmp_path, monkeypatch, mode):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_utils, "VALIDATION_MODE", mode)
+    build_ca.create_ca()
+    build_ca.create_intermediate("issuer-1")
+    _intermediate_identity("Server", "issuer-1")
+    _intermediate_identity("Client", "issuer-1")
+    # Each peer trusts only a copy of the root, with no intermediates next to it
+    peer_dir = tmp_path / "peer"
+    peer_dir.mkdir()
+    shutil.copy("ca/root_cert.pem", peer_dir / "root_cert.pem")
+    server, client = (Credentials(str(peer_dir / "root_cert.pem"), f"keys/{n}_cert.pem", f"keys/{n}_key.pem")
+                      for n in ("Server", "Client"))
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    accepted = []
+
+    def serve():
+        raw, addr = listener.accept()
+        accepted.append(app_handshake.handle_incoming_connection(raw, addr, credentials=server))
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+    try:
+        session = app_handshake.initiate_tls_handshake("127.0.0.1", listener.getsockname()[1], "Server",
+                                                       credentials=client)
+        t.join(timeout=5)
+        assert session is not None and session.peer_id == "Server"
+        assert accepted[0] is not None and accepted[0].peer_id == "Client"
+        session.close()
+        accepted[0].close()
+    finally:
+        listener.close()
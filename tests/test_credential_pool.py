@@ -0,0 +1,49 @@
+import json
+import os
+import ssl
+
+import pytest
+
+import app.utils as app_utils
+from conftest import CredentialPool
+
+
+def test_pool_reuses_cached_files_across_runs(tmp_path):
+    first = CredentialPool(str(tmp_path), names=("Alice",), algorithms=("ed25519",))
+    alice = first.get("Alice")
+    assert first.generated == 1 and first.get("Alice") is alice
+
+    # A later run with the same parameters loads the files instead of generating
+    second = CredentialPool(str(tmp_path), names=("Alice",), algorithms=("ed25519",))
+    assert second.get("Alice")['cert'].serial_number == alice['cert'].serial_number
+    assert second.generated == 0
+
+    # Different parameters get their own set; an old set is regenerated
+    other = CredentialPool(str(tmp_path), names=("Alice", "Bob"), algorithms=("ed25519",))
+    assert other.get("Alice")['cert'] != alice['cert'] and other.generated == 1
+    manifest = os.path.join(os.path.dirname(alice['cert_path']), "manifest.json")
+    with open(manifest) as f:
+        data = json.load(f)
+    data["created"] -= first.max_age
+    with open(manifest, "w") as f:
+        json.dump(data, f)
+    stale = CredentialPool(str(tmp_path), names=("Alice",), algorithms=("ed25519",))
+    assert stale.get("Alice")['cert'] != alice['cert'] and stale.generated == 1
+
+    with pytest.raises(ValueError):
+        stale.get("Zed")
+
+
+@pytest.mark.parametrize("algorithm", ["ed25519", "ecdsa-p256", "rsa-2048"])
+def test_pooled_identities_handshake_per_algorithm_and_window(algorithm, credential_pool, memtls, tmp_path,
+                                                              monkeypatch):
+    harness = type(memtls)(str(tmp_path), credential_pool.root(algorithm), memtls.pair)
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", harness.ca_path)
+    bob = credential_pool.get("Bob", algorithm)
+
+    for window in ("valid", "short"):
+        client, server = harness.connect(credential_pool.get("Alice", algorithm, window), bob)
+        assert memtls.validate(server)[0] == "Alice"
+    for window in ("expired", "future"):
+        with pytest.raises(ssl.SSLError):
+            harness.connect(credential_pool.get("Alice", algorithm, window), bob)
@@ -0,0 +1,86 @@
+import os
+import shutil
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app.utils as app_utils
+from app import handshake as app_handshake
+from app.credentials import Credentials
+
+
+def _credentials(keys, ca_path=None):
+    return Credentials(ca_path or keys['ca_path'], keys['cert_path'], keys['key_path'])
+
+
+def _listen(credentials, connections):
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(connections)
+    sessions = []
+
+    def serve():
+        for _ in range(connections):
+            raw, addr = listener.accept()
+            sessions.append(app_handshake.handle_incoming_connection(raw, addr, credentials=credentials))
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return listener, thread, sessions
+
+
+def test_several_identities_handshake_concurrently_in_one_process(credential_pool):
+    paths = (app_utils.CA_ROOT_PATH, app_utils.USER_CERT_PATH, app_utils.USER_KEY_PATH)
+    alice, bob, carol = (_credentials(credential_pool.get(n)) for n in ("Alice", "Bob", "Carol"))
+    listeners = {name: _listen(creds, 4) for name, creds in (("Bob", bob), ("Carol", carol))}
+    try:
+        def connect(target):
+            listener = listeners[target][0]
+            return app_handshake.initiate_tls_handshake("127.0.0.1", listener.getsockname()[1], target,
+                                                        credentials=alice)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            sessions = list(pool.map(connect, ["Bob", "Carol"] * 4))
+        assert [s.peer_id for s in sessions] == ["Bob", "Carol"] * 4
+        for listener, thread, accepted in listeners.values():
+            thread.join(5.0)
+            assert [s.peer_id for s in accepted] == ["Alice"] * 4
+            sessions.extend(accepted)
+        for s in sessions:
+            s.close()
+    finally:
+        for listener, _, _ in listeners.values():
+            listener.close()
+    # Nothing went through the module globals
+    assert (app_utils.CA_ROOT_PATH, app_utils.USER_CERT_PATH, app_utils.USER_KEY_PATH) == paths
+
+
+def test_ca_is_read_once_and_contexts_are_shared(credential_pool, tmp_path):
+    keys = credential_pool.get("Bob")
+    ca_copy = str(tmp_path / "root_cert.pem")
+    shutil.copy(keys['ca_path'], ca_copy)
+    bob = _credentials(keys, ca_path=ca_copy)
+    alice = _credentials(credential_pool.get("Alice"))
+    os.remove(ca_copy)  # Contexts and peer validation use the CA kept in memory
+
+    assert bob.context(True) is bob.context(True)
+    assert bob.context(True) is not bob.context(True, profile="bulk")
+    assert bob.name == "Bob"
+    listener, thread, accepted = _listen(bob, 1)
+    try:
+        session = app_handshake.initiate_tls_handshake("127.0.0.1", listener.getsockname()[1], "Bob",
+                                                       credentials=alice)
+        thread.join(5.0)
+        assert session.peer_id == "Bob" and accepted[0].peer_id == "Alice"
+        session.close()
+        accepted[0].close()
+    finally:
+        listener.close()
+
+
+def test_missing_files_are_reported(credential_pool, tmp_path):
+    keys = credential_pool.get("Alice")
+    with pytest.raises(FileNotFoundError):
+        Credentials(keys['ca_path'], str(tmp_path / "missing_cert.pem"), keys['key_path'])
@@ -0,0 +1,50 @@
+import sys
+
+from cryptography import x509
+
+import build_ca
+import ca_tool
+import crl
+
+
+def test_revoke_many_dedups_and_signs_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    assert crl.revoke(5)
+
+    signatures = []
+    real_sign = crl.sign_crl
+    monkeypatch.setattr(crl, "sign_crl", lambda data=None, ca_key=None: signatures.append(1) or real_sign(data, ca_key))
+
+    added = crl.revoke_many([1, 2, 2, 5, 3, 1], reason="keyCompromise")
+    assert added == [1, 2, 3]
+    assert len(signatures) == 1
+    assert sorted(crl.get_revoked_serials()) == [1, 2, 3, 5]
+
+    # Nothing new: no rewrite, no signature
+    assert crl.revoke_many([1, 5]) == []
+    assert not crl.revoke(2)
+    assert len(signatures) == 1
+
+    with open("ca/root_cert.pem", "rb") as f:
+        assert crl.verify_crl_signature(x509.load_pem_x509_certificate(f.read()).public_key())
+
+
+def test_revoke_batch_command_resolves_usernames(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    with open(ca_tool.generate_user_keypair("Pilot-Alpha"), "rb") as f:
+        cert_pem = build_ca.issue_cert("Pilot-Alpha", f.read())
+    with open("keys/Pilot-Alpha_cert.pem", "wb") as f:
+        f.write(cert_pem)
+    serial = x509.load_pem_x509_certificate(cert_pem).serial_number
+
+    (tmp_path / "batch.txt").write_text(f"# compromised\n10\n0xa\nPilot-Alpha\nGhost\n{serial}\n")
+    monkeypatch.setattr(sys, "argv", ["ca_tool.py", "revoke-batch", "batch.txt", "--reason", "keyCompromise"])
+    ca_tool.main()
+
+    out = capsys.readouterr().out
+    assert "Revoked 2 certificate(s); 2 duplicate or already revoked, 1 unresolved" in out
+    assert "no certificate found for Ghost" in out
+    assert "per 1k revocations" in out
+    assert sorted(crl.get_revoked_serials()) == sorted([10, serial])
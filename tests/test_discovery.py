@@ -0,0 +1,98 @@
+import json
+import socket
+import time
+
+from app import cli
+from app.channel import SessionState
+from app.discovery import DiscoveryService, PeerDirectory, der_fingerprint
+from app.pool import SessionPool
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _announcement(peer_id, port=7000, fp="ab" * 32, ttl=30.0, **extra):
+    msg = {"v": 1, "peer_id": peer_id, "port": port, "fp": fp, "ttl": ttl}
+    msg.update(extra)
+    return json.dumps(msg).encode("utf-8")
+
+
+def test_directory_entries_expire_after_ttl():
+    clock = _Clock()
+    directory = PeerDirectory(clock=clock)
+    assert directory.update("Bob", "10.0.0.2", 7000, "aa", ttl=10) is True
+    # Identical refresh only extends the lease
+    assert directory.update("Bob", "10.0.0.2", 7000, "aa", ttl=10) is False
+    assert directory.update("Bob", "10.0.0.2", 7001, "aa", ttl=10) is True
+
+    clock.now += 9.9
+    assert directory.resolve("Bob").port == 7001
+    clock.now += 0.2
+    assert directory.resolve("Bob") is None
+    assert len(directory) == 0
+
+
+def test_announcements_feed_directory_and_interval_scales_with_fleet():
+    service = DiscoveryService("Alice", 7001, cert_path="unused.pem",
+                               target_rate=1.0, min_interval=2.0, max_interval=300.0)
+    assert service.base_interval() == 2.0
+
+    assert service._handle_datagram(_announcement("Bob"), ("10.0.0.2", 7099))
+    # Own echoes, malformed and unsupported datagrams are ignored
+    assert not service._handle_datagram(_announcement("Alice"), ("10.0.0.1", 7099))
+    assert not service._handle_datagram(b"not json", ("10.0.0.3", 7099))
+    assert not service._handle_datagram(_announcement("Eve", v=99), ("10.0.0.3", 7099))
+    assert service.stats["received"] == 1 and service.stats["ignored"] == 3
+
+    entry = service.directory.resolve("Bob")
+    assert (entry.host, entry.port) == ("10.0.0.2", 7000)
+
+    for i in range(99):
+        service._handle_datagram(_announcement(f"peer-{i}"), ("10.0.1.%d" % i, 7099))
+    # 101 peers sharing a 1 announcement/s budget: each refreshes every ~101s
+    assert service.base_interval() == 101.0
+
+
+class _PeerConn:
+    """A socketpair end that presents a fixed DER certificate."""
+    def __init__(self, sock, der):
+        self.sock, self.der = sock, der
+
+    def getpeercert(self, binary_form=False):
+        return self.der
+
+    def read(self, n):
+        return self.sock.recv(n)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def test_connect_by_id_pins_the_announced_fingerprint(monkeypatch):
+    monkeypatch.setattr(cli, "HEARTBEAT_INTERVAL", 0)
+    client = cli.TLSClient()
+    peers = []
+
+    def connect(host, port, expected_peer_id=None, profile=None):
+        ours, theirs = socket.socketpair()
+        peers.append(theirs)
+        return SessionState(expected_peer_id, _PeerConn(ours, b"impostor" if port == 7001 else b"bob"))
+
+    client.pool = SessionPool(connect=connect)
+    client.directory.update("Bob", "10.0.0.2", 7000, der_fingerprint(b"bob"), ttl=30)
+    client.directory.update("Eve", "10.0.0.3", 7001, der_fingerprint(b"eve"), ttl=30)
+    client.directory.update("Quiet", "10.0.0.4", 7002, "", ttl=30)
+
+    client.connect_by_id("Eve")
+    assert client.active_conn is None and peers[0].recv(1) == b""  # Wrong certificate: closed
+    client.connect_by_id("Quiet")
+    assert client.active_conn is None and len(peers) == 1
+    client.connect_by_id("Bob")
+    assert client.active_conn is not None and client.active_conn.peer_id == "Bob"
+    time.sleep(0.1)  # Let the receiver start reading before the socket goes away
+    client.disconnect(close=True)
@@ -3,6 +3,7 @@ import threading
 import socket
 import os
 import time
+import ssl
 import pytest
 from cryptography.hazmat.primitives import serialization
 
@@ -102,151 +103,30 @@ def test_truncation_early_close(make_id_keys_factory, root_ca):
             pass
 
 
-def test_replay_server_handshake_fails(make_id_keys_factory, root_ca):
-    """Record server->client handshake bytes from a real TLS server then
+def test_replay_server_handshake_fails(make_id_keys_factory, memtls, intercepting_pair):
+    """Record server->client handshake records from a real handshake then
     replay them to a fresh client (without contacting the real server). The
     client should fail the handshake when it receives replayed messages.
     """
-    tmp = tempfile.mkdtemp(prefix="fcp_replay_")
-    try:
-        ca_pem = os.path.join(tmp, "root_cert.pem")
-        with open(ca_pem, "wb") as f:
-            f.write(root_ca['cert'].public_bytes(serialization.Encoding.PEM))
-
-        server_keys = make_id_keys_factory("Server", issuer=root_ca)
-        client_keys = make_id_keys_factory("Client", issuer=root_ca)
-        s_cert, s_key = _write_pair(tmp, "s", server_keys)
-        c_cert, c_key = _write_pair(tmp, "c", client_keys)
-
-        # Real server
-        real_listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        real_listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        real_listener.bind(("127.0.0.1", 0))
-        real_listener.listen(1)
-        real_port = real_listener.getsockname()[1]
-
-        server_ready = threading.Event()
-
-        def real_server():
-            raw_conn, addr = real_listener.accept()
-            app_utils.CA_ROOT_PATH = ca_pem
-            app_utils.USER_CERT_PATH = s_cert
-            app_utils.USER_KEY_PATH = s_key
-            ctx = app_handshake.create_ssl_context(is_server=True)
-            ssl_conn = ctx.wrap_socket(raw_conn, server_side=True)
-            # keep server alive briefly to complete handshake
-            server_ready.set()
-            time.sleep(0.5)
-            ssl_conn.close()
-
-        rs = threading.Thread(target=real_server, daemon=True)
-        rs.start()
-
-        # Proxy: connect to real server and record server->client bytes
-        record = bytearray()
-
-        proxy_listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        proxy_listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        proxy_listener.bind(("127.0.0.1", 0))
-        proxy_listener.listen(1)
-        proxy_port = proxy_listener.getsockname()[1]
-
-        def proxy_first_connection():
-            # accept client, connect to real server and relay while recording server->client
-            prox_conn, _ = proxy_listener.accept()
-            server_sock = socket.create_connection(("127.0.0.1", real_port))
-            # simple byte relay until server_ready
-            server_sock.settimeout(1.0)
-            prox_conn.settimeout(1.0)
-            try:
-                while not server_ready.is_set():
-                    time.sleep(0.01)
-                # relay for a short window and record
-                end = time.time() + 0.5
-                while time.time() < end:
-                    try:
-                        data = server_sock.recv(4096)
-                        if data:
-                            # forward to client and record
-                            prox_conn.sendall(data)
-                            record.extend(data)
-                        # forward any client->server bytes too
-                        try:
-                            c2s = prox_conn.recv(4096)
-                            if c2s:
-                                server_sock.sendall(c2s)
-                        except socket.timeout:
-                            pass
-                    except socket.timeout:
-                        pass
-            finally:
-                try:
-                    server_sock.close()
-                except Exception:
-                    pass
-                try:
-                    prox_conn.close()
-                except Exception:
-                    pass
-
-        p_thread = threading.Thread(target=proxy_first_connection, daemon=True)
-        p_thread.start()
-
-        # Client connects to proxy (first connection) to trigger recording
-        app_utils.CA_ROOT_PATH = ca_pem
-        app_utils.USER_CERT_PATH = c_cert
-        app_utils.USER_KEY_PATH = c_key
-        try:
-            s = socket.create_connection(("127.0.0.1", proxy_port), timeout=5)
-            # wrap as client TLS to perform handshake via proxy
-            ctx = app_handshake.create_ssl_context(is_server=False)
-            ssl_s = ctx.wrap_socket(s, server_hostname="127.0.0.1")
-            # if handshake succeeded, close
-            ssl_s.close()
-        except Exception:
-            # ignore; recording may still have happened
-            pass
-
-        time.sleep(0.1)
-
-        # Now second client connects to proxy; proxy will immediately send recorded server bytes
-        def proxy_replay():
-            c, _ = proxy_listener.accept()
-            try:
-                if record:
-                    c.sendall(bytes(record))
-            finally:
-                c.close()
-
-        pr = threading.Thread(target=proxy_replay, daemon=True)
-        pr.start()
-
-        # New client attempts handshake against proxy replay
-        app_utils.CA_ROOT_PATH = ca_pem
-        app_utils.USER_CERT_PATH = c_cert
-        app_utils.USER_KEY_PATH = c_key
-        try:
-            s2 = socket.create_connection(("127.0.0.1", proxy_port), timeout=5)
-            ctx2 = app_handshake.create_ssl_context(is_server=False)
-            # Wrapping should raise or fail because bytes are out-of-context
-            with pytest.raises(Exception):
-                ctx2.wrap_socket(s2, server_hostname="127.0.0.1")
-        finally:
-            try:
-                s2.close()
-            except Exception:
-                pass
-
-    finally:
-        try:
-            real_listener.close()
-        except Exception:
-            pass
-        try:
-            proxy_listener.close()
-        except Exception:
-            pass
-        try:
-            os.rmdir(tmp)
-        except Exception:
-            pass
\ No newline at end of file
+    server_keys = make_id_keys_factory("Server")
+    client_keys = make_id_keys_factory("Client")
+
+    # Real handshake, recording what the server sends
+    record = []
+    client_t, server_t = intercepting_pair
+    server_t.script('send', lambda frame: record.append(frame) or frame)
+    memtls.connect(client_keys, server_keys, transports=(client_t, server_t))
+    assert record
+
+    # Fresh client; the attacker answers its hello with the recorded records
+    victim, attacker = memtls.pair()
+    client = memtls.endpoint(client_keys, victim, server_side=False)
+    client.step()
+    for frame in record:
+        attacker.send(frame)
+    with pytest.raises(ssl.SSLError):
+        for _ in range(8):
+            client.step()
+            if client.done:
+                break
+    assert not client.done
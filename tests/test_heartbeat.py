@@ -0,0 +1,134 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from app.channel import SessionState, chat_send, control_frame, recv_loop
+from app import heartbeat
+from app.heartbeat import HeartbeatMonitor
+from app.timerwheel import TimerWheel
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _PlainSocket(socket.socket):
+    """A plain socket with SSLSocket's write(), for sessions without TLS."""
+    write = socket.socket.sendall
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_heartbeats_measure_rtt_and_stay_out_of_the_chat(session_pair, capsys):
+    a_state, b_state = session_pair
+    wheel = TimerWheel(tick=0.05)
+    wheel.start()
+    monitor = HeartbeatMonitor(wheel, interval=0.2, idle_timeout=2.0)
+    try:
+        monitor.add(a_state)
+        threading.Thread(target=recv_loop, args=(a_state.conn, "Bob", None, a_state, monitor.handle_pong),
+                         daemon=True).start()
+        threading.Thread(target=recv_loop, args=(b_state.conn, "Alice", None, b_state), daemon=True).start()
+
+        assert _wait_for(lambda: monitor.stats()["pongs"] >= 2)
+        assert a_state.rtt is not None and 0 < a_state.rtt < 1.0
+        assert monitor.peer_rtt("Bob") is not None
+        assert not a_state.is_closed()
+
+        assert chat_send(a_state.conn, "hello", a_state)
+        assert _wait_for(lambda: b_state.msgs_in == 1)
+        assert b_state.bytes_in == 5  # heartbeats aren't counted as chat traffic
+        out = capsys.readouterr().out
+        assert "hello" in out and "PING" not in out and "PONG" not in out
+    finally:
+        wheel.stop()
+
+
+def test_silent_peer_is_closed_after_idle_timeout(session_pair):
+    a_state, b_state = session_pair  # b never reads, so it never answers a PING
+    wheel = TimerWheel(tick=0.05)
+    wheel.start()
+    dead, disconnected = [], threading.Event()
+    monitor = HeartbeatMonitor(wheel, interval=0.1, idle_timeout=0.4, on_dead=lambda s, idle: dead.append(idle))
+    try:
+        monitor.add(a_state)
+        threading.Thread(target=recv_loop, args=(a_state.conn, "Bob", disconnected.set, a_state,
+                                                 monitor.handle_pong), daemon=True).start()
+        assert disconnected.wait(5.0)
+        assert len(dead) == 1 and dead[0] >= 0.4
+        stats = monitor.stats()
+        assert stats["timeouts"] == 1 and stats["pings"] >= 1 and stats["sessions"] == 0
+    finally:
+        wheel.stop()
+
+
+def test_active_sessions_are_not_pinged_and_one_timer_each():
+    clock = _Clock()
+    wheel = TimerWheel(tick=1.0, slots=8, clock=clock)
+    monitor = HeartbeatMonitor(wheel, interval=5, idle_timeout=15, clock=clock)
+    pairs = [socket.socketpair() for _ in range(20)]
+    pairs = [(_PlainSocket(fileno=ours.detach()), theirs) for ours, theirs in pairs]
+    try:
+        sessions = [SessionState(f"peer-{i}", ours) for i, (ours, _) in enumerate(pairs)]
+        for s in sessions:
+            s.last_rx = clock.now
+            monitor.add(s)
+            monitor.add(s)  # adding twice keeps a single timer
+        assert len(wheel) == 20
+
+        for _ in range(12):  # busy peers: data keeps arriving
+            clock.now += 1
+            for s in sessions:
+                s.last_rx = clock.now
+            wheel.advance()
+        assert monitor.stats()["pings"] == 0 and len(wheel) == 20
+
+        clock.now += 6  # quiet now: one PING each, still a single timer per session
+        wheel.advance()
+        assert monitor.stats()["pings"] == 20 and len(wheel) == 20
+        assert pairs[0][1].recv(64) == control_frame(b"PING", 1)
+
+        monitor.remove(sessions[0])
+        assert len(wheel) == 19 and len(monitor) == 19
+    finally:
+        for ours, theirs in pairs:
+            ours.close()
+            theirs.close()
+
+
+def test_interval_must_be_shorter_than_timeout():
+    with pytest.raises(ValueError):
+        HeartbeatMonitor(TimerWheel(), interval=10, idle_timeout=5)
+
+
+@pytest.mark.parametrize("interval, timeout, expected", [
+    (None, None, (0.0, 45.0)),   # Off by default
+    ("10", None, (10.0, 30.0)),
+    ("10", "25", (10.0, 25.0)),
+    ("10", "5", (0.0, 45.0)),    # Timeout not above the interval: disabled
+    ("-1", None, (0.0, 45.0)),
+    ("soon", None, (0.0, 45.0)),
+])
+def test_bad_heartbeat_settings_disable_heartbeats_instead_of_failing(monkeypatch, capsys, interval, timeout,
+                                                                      expected):
+    for name, value in (("HEARTBEAT_INTERVAL", interval), ("HEARTBEAT_TIMEOUT", timeout)):
+        if value is None:
+            monkeypatch.delenv(name, raising=False)
+        else:
+            monkeypatch.setenv(name, value)
+    assert heartbeat._settings_from_env() == expected
+    warned = "Heartbeats disabled" in capsys.readouterr().out
+    assert warned == (expected[0] == 0 and interval is not None)
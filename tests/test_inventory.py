@@ -0,0 +1,82 @@
+import datetime
+import os
+import sys
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+
+import build_ca
+import ca_tool
+import crl
+import inventory
+import merkle_log
+
+
+def _run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["ca_tool.py", *argv])
+    ca_tool.main()
+
+
+def _cert(username):
+    with open(f"keys/{username}_cert.pem", "rb") as f:
+        return x509.load_pem_x509_certificate(f.read())
+
+
+def test_issue_renew_and_revoke_are_recorded_and_indexed(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    for name in ("Pilot-Alpha", "Control-Bravo"):
+        ca_tool.generate_user_keypair(name)
+        _run(monkeypatch, "issue", name)
+    first = _cert("Pilot-Alpha").serial_number
+    _run(monkeypatch, "renew", "Pilot-Alpha")
+    renewed = _cert("Pilot-Alpha")
+
+    with inventory.Inventory() as inv:
+        rows = inv.for_user("Pilot-Alpha")
+        assert [(int(r["serial"], 16), r["op"]) for r in rows] == [(first, "issue"), (renewed.serial_number, "renew")]
+        assert [r["log_index"] for r in rows] == [0, 2]
+        assert inv.by_fingerprint(renewed.fingerprint(hashes.SHA256()).hex())["op"] == "renew"
+        # Renewals default to 7 days, issues to 30
+        assert [r["username"] for r in inv.expiring(datetime.timedelta(days=8))] == ["Pilot-Alpha"]
+
+    # Revoking by user takes every live certificate from the inventory, not just the one in keys/
+    os.remove("keys/Pilot-Alpha_cert.pem")
+    capsys.readouterr()
+    _run(monkeypatch, "revoke", "Pilot-Alpha")
+    assert capsys.readouterr().out.count("Revoked certificate serial=") == 2
+    _run(monkeypatch, "expiring", "--hours", "240")
+    assert "0 certificate(s) expire within 240h" in capsys.readouterr().out
+    with inventory.Inventory() as inv:
+        assert inv.for_user("Pilot-Alpha", active_only=True) == []
+        for row in inv.for_user("Pilot-Alpha"):
+            datetime.datetime.strptime(row["revoked_at"], inventory._TIME_FORMAT)  # Same format as not_after
+        audit = inv.audit()
+    assert (audit["certificates"], audit["users"], audit["revoked"], audit["active"]) == (3, 2, 2, 1)
+    assert audit["unlogged"] == []
+
+
+def test_import_backfills_certificates_issued_before_the_inventory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    serials = []
+    for name in ("Pilot-Alpha", "Control-Bravo", "Relay-Charlie"):
+        with open(ca_tool.generate_user_keypair(name), "rb") as f:
+            pem = build_ca.issue_cert(name, f.read())
+        if name != "Relay-Charlie":
+            merkle_log.append_cert(pem)
+        with open(f"keys/{name}_cert.pem", "wb") as f:
+            f.write(pem)
+        serials.append(x509.load_pem_x509_certificate(pem).serial_number)
+    crl.revoke(serials[1], reason="keyCompromise")  # Not in the inventory yet: nothing to mark
+    os.remove(inventory.INVENTORY_PATH)
+
+    with inventory.Inventory() as inv:
+        assert inv.import_certificates() == 3
+        assert inv.import_certificates() == 3  # Idempotent
+        assert inv.by_serial(serials[1])["revocation_reason"] == "keyCompromise"
+        datetime.datetime.strptime(inv.by_serial(serials[1])["revoked_at"], inventory._TIME_FORMAT)
+        assert [inv.by_serial(s)["log_index"] for s in serials] == [0, 1, None]
+        audit = inv.audit()
+    assert audit["certificates"] == 3 and audit["revoked"] == 1
+    assert audit["unlogged"] == [inventory.serial_hex(serials[2])]
@@ -0,0 +1,107 @@
+import os
+import ssl
+import time
+import signal
+import socket
+import threading
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from app import utils as app_utils
+from app import workers
+from app.admission import AdmissionController
+from app.utils import create_ssl_context
+
+pytestmark = pytest.mark.skipif(not workers.supported(), reason="needs fork() and SO_REUSEPORT")
+
+
+def _write_identity(directory, name, pair):
+    cert_p = os.path.join(directory, f"{name}_cert.pem")
+    key_p = os.path.join(directory, f"{name}_key.pem")
+    with open(cert_p, "wb") as f:
+        f.write(pair["cert"].public_bytes(serialization.Encoding.PEM))
+    with open(key_p, "wb") as f:
+        f.write(pair["private_key"].private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                  serialization.NoEncryption()))
+    return cert_p, key_p
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def supervisor(tmp_path, monkeypatch, root_ca, make_id_keys_factory):
+    ca_pem = str(tmp_path / "root_cert.pem")
+    with open(ca_pem, "wb") as f:
+        f.write(root_ca["cert"].public_bytes(serialization.Encoding.PEM))
+    bob = _write_identity(str(tmp_path), "Bob", make_id_keys_factory("Bob"))
+    alice = _write_identity(str(tmp_path), "Alice", make_id_keys_factory("Alice"))
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", ca_pem)
+
+    server_ctx = create_ssl_context(is_server=True, ca_path=ca_pem, cert_path=bob[0], key_path=bob[1])
+    sup = workers.WorkerSupervisor(workers=2, port=0, host="127.0.0.1", context=server_ctx, restart_delay=0.1,
+                                   admission=lambda: AdmissionController(per_ip_burst=100))
+    sup.start()
+    thread = threading.Thread(target=sup.serve_forever, daemon=True)
+    thread.start()
+    # Every worker reports once it is accepting; connecting earlier can be refused
+    assert _wait_for(lambda: len(sup.stats()["per_worker"]) == 2)
+    # TLS 1.2 hands out the ticket within the handshake, so the client can resume without reading
+    client_ctx = create_ssl_context(is_server=False, ca_path=ca_pem, cert_path=alice[0], key_path=alice[1])
+    client_ctx.maximum_version = ssl.TLSVersion.TLSv1_2
+    try:
+        yield sup, client_ctx
+    finally:
+        sup.stop()
+        thread.join(5.0)
+
+
+def _connect(sup, ctx, session=None):
+    raw = socket.create_connection(("127.0.0.1", sup.port), timeout=5)
+    conn = ctx.wrap_socket(raw, server_hostname="127.0.0.1", session=session)
+    conn.write(b"hi")
+    return conn
+
+
+def test_workers_share_ticket_keys_and_spread_connections(supervisor):
+    sup, ctx = supervisor
+    first = _connect(sup, ctx)
+    ticket = first.session
+    first.close()
+
+    resumed = 0
+    for _ in range(16):
+        conn = _connect(sup, ctx, session=ticket)
+        resumed += conn.session_reused
+        conn.close()
+    assert resumed == 16
+
+    assert _wait_for(lambda: sup.stats()["msgs_in"] == 17 and sup.stats()["sessions"] == 0)
+    stats = sup.stats()
+    assert stats["handshakes"] == 17 and stats["resumed"] == 16 and stats["failures"] == 0
+    # The kernel spread the connections, and tickets from one worker resumed on the other
+    assert [w["resumed"] > 0 for w in stats["per_worker"]] == [True, True]
+
+
+def test_supervisor_restarts_dead_workers_and_keeps_their_totals(supervisor):
+    sup, ctx = supervisor
+    for _ in range(4):
+        _connect(sup, ctx).close()
+    assert _wait_for(lambda: sup.stats()["msgs_in"] == 4)
+
+    victim = sup.pids()[0]
+    os.kill(victim, signal.SIGKILL)
+    assert _wait_for(lambda: sup.stats()["restarts"] == 1 and len(sup.pids()) == 2 and victim not in sup.pids())
+
+    for _ in range(4):
+        _connect(sup, ctx).close()
+    assert _wait_for(lambda: sup.stats()["msgs_in"] == 8)
+    stats = sup.stats()
+    assert stats["workers"] == 2 and stats["handshakes"] == 8
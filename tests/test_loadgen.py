@@ -0,0 +1,85 @@
+import time
+import threading
+
+import pytest
+
+import build_ca
+import loadgen
+from app import utils as app_utils
+from app import workers
+from app.admission import AdmissionController
+from app.utils import create_ssl_context
+
+
+def test_percentile_and_mix_parsing():
+    samples = [float(i) for i in range(1, 101)]
+    assert loadgen.percentile(samples, 50) == 50.0
+    assert loadgen.percentile(samples, 99) == 99.0
+    assert loadgen.percentile([], 50) is None
+
+    assert loadgen.parse_mix("handshake=5, burst=3,drop") == {"handshake": 5, "burst": 3, "drop": 1}
+    for bad in ("flood=1", "handshake=-1,burst=3", "handshake=0,drop=0", "burst=lots"):
+        with pytest.raises(ValueError):
+            loadgen.parse_mix(bad)
+
+
+@pytest.mark.skipif(not workers.supported(), reason="needs fork() and SO_REUSEPORT")
+def test_loadgen_drives_the_worker_listener(tmp_path, monkeypatch):
+    """Mint identities with the CA tooling and run a short, seeded load
+    against the node's worker listener; every operation should succeed.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", "ca/root_cert.pem")
+    build_ca.create_ca()
+    identities = loadgen.mint_identities(3, prefix="lg")
+    _, server_cert, server_key = identities[0]
+    server_ctx = create_ssl_context(is_server=True, ca_path="ca/root_cert.pem",
+                                    cert_path=server_cert, key_path=server_key)
+    sup = workers.WorkerSupervisor(workers=2, port=0, host="127.0.0.1", context=server_ctx,
+                                   admission=lambda: AdmissionController(per_ip_burst=100))
+    sup.start()
+    thread = threading.Thread(target=sup.serve_forever, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while len(sup.stats()["per_worker"]) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        gen = loadgen.LoadGenerator("127.0.0.1", sup.port, identities[1:],
+                                    mix={"handshake": 1, "burst": 1, "drop": 1}, burst=5, seed=7,
+                                    ca_path="ca/root_cert.pem")
+        report = gen.run(concurrency=2, duration=10.0, ops_per_worker=4)
+        deadline = time.monotonic() + 5
+        while sup.stats()["handshakes"] < 8 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stats = sup.stats()
+    finally:
+        sup.stop()
+        thread.join(5.0)
+
+    assert report["ops_failed"] == 0, report["errors"]
+    assert report["ops_ok"] == 8
+    assert report["handshake_latency"]["count"] == 8
+    assert report["handshake_latency"]["p50_ms"] is not None
+    # The listener saw what loadgen reports
+    assert stats["handshakes"] == 8 and stats["failures"] == 0
+
+
+def test_mint_identities_reissues_expiring_certs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    (username, cert_path, key_path), = loadgen.mint_identities(1, prefix="lg")
+    with open(cert_path, "rb") as f:
+        first = f.read()
+    with open(key_path, "rb") as f:
+        key = f.read()
+
+    loadgen.mint_identities(1, prefix="lg")
+    with open(cert_path, "rb") as f:
+        assert f.read() == first  # Still valid for a day: reused
+
+    monkeypatch.setattr(loadgen, "MIN_CERT_REMAINING", 2 * 86400)
+    loadgen.mint_identities(1, prefix="lg")
+    with open(cert_path, "rb") as f:
+        assert f.read() != first  # About to expire: re-issued for the same key
+    with open(key_path, "rb") as f:
+        assert f.read() == key
@@ -0,0 +1,25 @@
+import threading
+
+
+def test_in_memory_handshake_runs_app_validation_without_sockets(make_id_keys_factory, memtls):
+    threads = set(threading.enumerate())
+    client, server = memtls.connect(make_id_keys_factory("Alice"), make_id_keys_factory("Bob"))
+    assert client.done and server.done
+    assert client.obj.version() == server.obj.version() == "TLSv1.3"
+    assert not set(threading.enumerate()) - threads  # no helper threads started
+
+    peer_id, cert = memtls.validate(client, "Bob")
+    assert peer_id == "Bob"
+    assert memtls.validate(server)[0] == "Alice"
+
+    client.write(b"hello")
+    assert server.read() == b"hello"
+    server.write(b"hi")
+    assert client.read() == b"hi"
+    server.close()
+    assert client.read() == b""
+
+
+def test_profiles_apply_in_memory(make_id_keys_factory, memtls):
+    client, server = memtls.connect(make_id_keys_factory("Alice"), make_id_keys_factory("Bob"), profile="bulk")
+    assert "GCM" in client.obj.cipher()[0] == server.obj.cipher()[0]
@@ -0,0 +1,68 @@
+import hashlib
+import os
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+import build_ca
+import merkle_log
+import merkle_tiles
+
+
+def _snapshot(base):
+    files = {}
+    for root, _, names in os.walk(base):
+        for name in names:
+            if name != merkle_tiles.CHECKPOINT_NAME:
+                path = os.path.join(root, name)
+                with open(path, "rb") as f:
+                    files[path] = f.read()
+    return files
+
+
+def test_tile_paths():
+    assert merkle_tiles.tile_path(0, 0) == "tile/0/000"
+    assert merkle_tiles.tile_path(0, 1234067) == "tile/0/x001/x234/067"
+    assert merkle_tiles.tile_path(1, 5, 17) == "tile/1/005.p/17"
+
+
+def test_tiles_grow_without_rewrites_and_reproduce_every_root(tmp_path):
+    key = ed25519.Ed25519PrivateKey.generate()
+    writer = merkle_tiles.TileWriter(str(tmp_path))
+    read = merkle_tiles.read_local_tile(str(tmp_path))
+    leaves = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(66000)]
+
+    before = {}
+    sizes = (1, 2, 255, 256, 257, 600, 65536, 66000)
+    for size in sizes:
+        checkpoint = writer.update(leaves[:size], merkle_log._compute_root(leaves[:size]), ca_key=key)
+        merkle_tiles.verify_checkpoint(checkpoint, key.public_key())
+        assert checkpoint["size"] == size
+        assert merkle_tiles.compute_root(size, read) == checkpoint["root"]
+        after = _snapshot(str(tmp_path))
+        assert all(after[path] == data for path, data in before.items())  # written once
+        before = after
+
+    # Every published tree size stays provable from the same immutable tiles
+    for size in sizes:
+        assert merkle_tiles.compute_root(size, read) == merkle_log._compute_root(leaves[:size])
+    assert os.path.exists(tmp_path / "tile" / "2" / "000.p" / "1")
+
+
+def test_append_cert_publishes_signed_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    for i in range(3):
+        merkle_log.append_cert(f"cert {i}".encode())
+
+    checkpoint = merkle_tiles.TileWriter().checkpoint()
+    with open("ca/root_cert.pem", "rb") as f:
+        ca_pub = x509.load_pem_x509_certificate(f.read()).public_key()
+    merkle_tiles.verify_checkpoint(checkpoint, ca_pub)
+    assert checkpoint["size"] == 3 and checkpoint["root"] == merkle_log.get_root()
+    assert merkle_tiles.compute_root(3, merkle_tiles.read_local_tile()) == merkle_log.get_root()
+
+    checkpoint["size"] = 2
+    with pytest.raises(ValueError, match="signature invalid"):
+        merkle_tiles.verify_checkpoint(checkpoint, ca_pub)
@@ -0,0 +1,185 @@
+import datetime
+import os
+import socket
+import ssl
+import threading
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.x509.oid import NameOID
+
+from app import handshake as app_handshake
+from app import utils as app_utils
+from app.channel import chat_send
+from app.renewal import ContextHolder, RenewalAgent
+from app.utils import create_ssl_context
+
+
+def _pem(obj) -> bytes:
+    if isinstance(obj, x509.Certificate):
+        return obj.public_bytes(serialization.Encoding.PEM)
+    return obj.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                             serialization.NoEncryption())
+
+
+def _test_ca_issuer(root, issued):
+    """An issuer signing with the test root instead of going through ca_tool."""
+    def issue(username, pubkey_pem, valid_days):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (x509.CertificateBuilder()
+                .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, username)]))
+                .issuer_name(root["cert"].subject)
+                .public_key(serialization.load_pem_public_key(pubkey_pem))
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now - datetime.timedelta(minutes=1))
+                .not_valid_after(now + datetime.timedelta(days=valid_days))
+                .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+                .sign(private_key=root["private_key"], algorithm=None))
+        issued.append(cert.serial_number)
+        return _pem(cert), b"", None
+    return issue
+
+
+@pytest.fixture
+def identities(tmp_path, monkeypatch, root_ca, make_id_keys_factory):
+    paths = {"ca": str(tmp_path / "root_cert.pem")}
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", paths["ca"])  # peer validation reads it
+    with open(paths["ca"], "wb") as f:
+        f.write(_pem(root_ca["cert"]))
+    for name in ("Alice", "Bob"):
+        keys = make_id_keys_factory(name)
+        cert_p, key_p = str(tmp_path / f"{name}_cert.pem"), str(tmp_path / f"{name}_key.pem")
+        with open(cert_p, "wb") as f:
+            f.write(_pem(keys["cert"]))
+        with open(key_p, "wb") as f:
+            f.write(_pem(keys["private_key"]))
+        paths[name] = (cert_p, key_p, keys["cert"].serial_number)
+    return paths
+
+
+class _Listener:
+    """Accepts handshakes for Bob, taking the context from the holder each time."""
+    def __init__(self, holder):
+        self.holder = holder
+        self.sessions = []
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                raw, addr = self.sock.accept()
+            except OSError:
+                return
+            self.sessions.append(app_handshake.handle_incoming_connection(
+                raw, addr, context=self.holder.get(is_server=True)))
+
+    def close(self):
+        self.sock.close()
+
+
+def test_renewal_switches_new_handshakes_and_keeps_existing_sessions(identities, root_ca):
+    bob_cert, bob_key, old_serial = identities["Bob"]
+    alice_cert, alice_key, _ = identities["Alice"]
+    holder = ContextHolder(identities["ca"], bob_cert, bob_key)
+    issued = []
+    agent = RenewalAgent("Bob", holder, bob_cert, bob_key, issuer=_test_ca_issuer(root_ca, issued))
+    alice_ctx = create_ssl_context(is_server=False, ca_path=identities["ca"], cert_path=alice_cert,
+                                   key_path=alice_key)
+    listener = _Listener(holder)
+    try:
+        before = app_handshake.initiate_tls_handshake("127.0.0.1", listener.port, "Bob", context=alice_ctx)
+        assert before.serial == old_serial
+
+        agent.renew_now()
+        assert holder.generation == 1 and agent.renewals == 1
+        assert not os.path.exists(bob_cert + ".renew")
+        with open(bob_cert, "rb") as f:
+            assert x509.load_pem_x509_certificate(f.read()).serial_number == issued[0]
+
+        after = app_handshake.initiate_tls_handshake("127.0.0.1", listener.port, "Bob", context=alice_ctx)
+        assert after.serial == issued[0] != old_serial
+
+        # The session made before the swap still carries traffic
+        assert chat_send(before.conn, "still here", before)
+        listener_side = listener.sessions[0]
+        listener_side.conn.settimeout(5)
+        assert listener_side.conn.recv(64) == b"still here"
+        for s in [before, after] + listener.sessions:
+            s.close()
+    finally:
+        listener.close()
+
+
+def test_certificate_for_another_key_is_not_installed(identities, root_ca, make_id_keys_factory):
+    bob_cert, bob_key, old_serial = identities["Bob"]
+    holder = ContextHolder(identities["ca"], bob_cert, bob_key)
+    holder.get(is_server=True)
+    wrong_key = make_id_keys_factory("Mallory")["private_key"].public_key()
+    issuer = _test_ca_issuer(root_ca, [])
+    agent = RenewalAgent("Bob", holder, bob_cert, bob_key, retry_interval=5,
+                         issuer=lambda user, _pem, days: issuer(user, wrong_key.public_bytes(
+                             serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo), days))
+
+    with pytest.raises(ssl.SSLError):
+        agent.renew_now()
+    with open(bob_cert, "rb") as f:
+        assert x509.load_pem_x509_certificate(f.read()).serial_number == old_serial
+    assert holder.generation == 0 and not os.path.exists(bob_cert + ".renew")
+
+    agent.seconds_until_due = lambda: 0.0  # due now: a failed background attempt retries later
+    assert agent._step() == 5 and agent.last_error
+
+
+def test_renewal_is_due_at_the_configured_fraction(identities):
+    bob_cert, bob_key, _ = identities["Bob"]
+    holder = ContextHolder(identities["ca"], bob_cert, bob_key)
+    agent = RenewalAgent("Bob", holder, bob_cert, bob_key, fraction=0.5)
+    with open(bob_cert, "rb") as f:
+        cert = x509.load_pem_x509_certificate(f.read())
+    lifetime = cert.not_valid_after_utc - cert.not_valid_before_utc
+    assert agent.renew_at() == cert.not_valid_before_utc + lifetime / 2
+    assert 14 * 86400 < agent.seconds_until_due() < 15 * 86400
+
+    with pytest.raises(ValueError):
+        RenewalAgent("Bob", holder, fraction=1.5)
+
+
+def test_renewal_keeps_the_intermediate_that_issued_the_certificate(tmp_path, monkeypatch):
+    import build_ca
+    import ca_tool
+
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    build_ca.create_intermediate("issuer-1")
+    cert_path, key_path = "keys/Bob_cert.pem", "keys/Bob_key.pem"
+    with open(ca_tool.generate_user_keypair("Bob"), "rb") as f:
+        cert_pem, chain_pem, _ = ca_tool.issue_certificate("Bob", f.read(), 30, "issuer-1")
+    with open(cert_path, "wb") as f:
+        f.write(cert_pem + chain_pem)
+    holder = ContextHolder("ca/root_cert.pem", cert_path, key_path)
+    agent = RenewalAgent("Bob", holder, cert_path, key_path)
+
+    agent.renew_now()
+    with open(cert_path, "rb") as f:
+        renewed = x509.load_pem_x509_certificate(f.read())
+    assert build_ca.issuer_of(renewed) == "issuer-1"
+    assert holder.generation == 1
+
+
+def test_failing_renewal_backs_off_and_reports_once(identities, capsys):
+    bob_cert, bob_key, _ = identities["Bob"]
+    holder = ContextHolder(identities["ca"], bob_cert, bob_key)
+
+    def unreachable(*_):
+        raise ConnectionRefusedError("CA unreachable")
+
+    agent = RenewalAgent("Bob", holder, bob_cert, bob_key, issuer=unreachable, retry_interval=60,
+                         max_retry_interval=300)
+    agent.seconds_until_due = lambda: 0.0
+    assert [agent._step() for _ in range(5)] == [60, 120, 240, 300, 300]
+    assert capsys.readouterr().out.count("renewal failed") == 1
@@ -0,0 +1,107 @@
+import datetime
+import socket
+import threading
+
+import build_ca
+import crl
+from app.channel import SessionState
+from app.revocation import CrlWatcher, SessionIndex
+from app.timerwheel import TimerWheel
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+_peer_socks = []  # keeps the other ends open for the test run
+
+
+def _session(serial, not_after=None):
+    ours, theirs = socket.socketpair()
+    _peer_socks.append(theirs)
+    return SessionState(f"peer-{serial}", ours, not_after=not_after, serial=serial)
+
+
+def test_timer_wheel_fires_on_time_and_honours_cancel():
+    clock = _Clock()
+    wheel = TimerWheel(tick=1.0, slots=8, clock=clock)
+    fired = []
+    wheel.schedule(3, lambda: fired.append("short"))
+    wheel.schedule(20, lambda: fired.append("long"))  # more than two revolutions
+    cancelled = wheel.schedule(5, lambda: fired.append("cancelled"))
+    wheel.cancel(cancelled)
+    assert len(wheel) == 2
+
+    clock.now = 2.9
+    wheel.advance()
+    assert fired == []
+    clock.now = 3.0
+    wheel.advance()
+    assert fired == ["short"]
+    clock.now = 19.5
+    wheel.advance()
+    assert fired == ["short"]
+    clock.now = 20.0
+    wheel.advance()
+    assert fired == ["short", "long"] and len(wheel) == 0
+
+
+def test_concurrent_cancels_count_a_timer_once():
+    wheel = TimerWheel(tick=1.0, slots=8, clock=_Clock())
+    timers = [wheel.schedule(5, lambda: None) for _ in range(500)]
+    wheel.schedule(5, lambda: None)  # Stays pending
+    barrier = threading.Barrier(4)
+
+    def cancel_all():
+        barrier.wait()
+        for timer in timers:
+            wheel.cancel(timer)
+
+    threads = [threading.Thread(target=cancel_all) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(wheel) == 1
+
+
+def test_session_index_expires_sessions_via_wheel():
+    clock = _Clock()
+    wheel = TimerWheel(tick=1.0, slots=16, clock=clock)
+    closed = []
+    index = SessionIndex(wheel, on_close=lambda s, reason: closed.append((s.serial, reason)))
+    soon = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=5)
+    later = soon + datetime.timedelta(days=1)
+    a, b = _session(1, soon), _session(2, later)
+    index.add(a); index.add(b)
+
+    clock.now = 6.0
+    wheel.advance()
+    assert closed == [(1, "certificate expired")]
+    assert a.is_closed() and not b.is_closed()
+    assert len(index) == 1
+
+
+def test_crl_change_closes_only_revoked_sessions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    index = SessionIndex(TimerWheel())
+    watcher = CrlWatcher(index, ca_path="ca/root_cert.pem")
+    sessions = {serial: _session(serial) for serial in (101, 102, 103)}
+    for s in sessions.values():
+        index.add(s)
+
+    assert watcher.poll() == 0  # no CRL yet
+    crl.revoke(102)
+    assert watcher.poll() == 1
+    assert sessions[102].is_closed()
+    assert not sessions[101].is_closed() and not sessions[103].is_closed()
+
+    # Unchanged CRL is a no-op; a pushed delta is applied directly
+    assert watcher.poll() == 0
+    assert watcher.push([103, 102]) == 1
+    assert sessions[103].is_closed() and len(index) == 1
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from cryptography import x509
+
+import build_ca
+import merkle_log
+import merkle_tiles
+from sequencer import LogSequencer
+
+
+def _ca_pubkey():
+    with open("ca/root_cert.pem", "rb") as f:
+        return x509.load_pem_x509_certificate(f.read()).public_key()
+
+
+def test_concurrent_append_cert_loses_no_leaves(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+
+    def issuer(n):
+        for i in range(5):
+            merkle_log.append_cert(f"issuer {n} cert {i}".encode())
+
+    threads = [threading.Thread(target=issuer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(merkle_log.get_leaves()) == 20
+    assert merkle_tiles.TileWriter().checkpoint()["size"] == 20
+
+
+def test_sequencer_batches_submissions_and_signs_tree_heads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    heads = []
+    seq = LogSequencer(max_merge_delay=0.2, on_tree_head=heads.append)
+    seq.start()
+    futures = []
+    lock = threading.Lock()
+
+    def issuer(n):
+        for i in range(10):
+            f = seq.submit(f"issuer {n} cert {i}".encode())
+            with lock:
+                futures.append(f)
+
+    threads = [threading.Thread(target=issuer, args=(n,)) for n in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results = [f.result(timeout=10) for f in futures]
+    seq.stop(timeout=5)
+
+    assert sorted(r["index"] for r in results) == list(range(50))
+    assert seq.stats["leaves"] == 50 and seq.stats["batches"] < 50
+    assert len(heads) == seq.stats["batches"]
+    head = merkle_tiles.verify_checkpoint(seq.tree_head, _ca_pubkey())
+    assert head["size"] == 50 and head["root"] == merkle_log.get_root()
+
+
+def test_sequencer_flush_and_stop_drain_pending(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    seq = LogSequencer(max_merge_delay=60)
+    seq.start()
+    first = seq.submit(b"cert a")
+    seq.flush()
+    assert first.result(timeout=5)["index"] == 0
+
+    second = seq.submit(b"cert b")
+    seq.stop(timeout=5)
+    assert second.result(timeout=0)["size"] == 2
+
+
+def test_flush_on_an_idle_sequencer_does_not_skip_the_next_merge_delay(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    seq = LogSequencer(max_merge_delay=60)
+    seq.start()
+    seq.flush()
+    pending = seq.submit(b"cert a")
+    time.sleep(0.3)
+    assert not pending.done()
+    seq.stop(timeout=5)
+    assert pending.result(timeout=0)["index"] == 0
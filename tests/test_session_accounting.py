@@ -0,0 +1,63 @@
+import socket
+import threading
+
+import pytest
+
+from app.channel import SessionRegistry, SessionState, chat_send, recv_loop
+
+
+def test_session_records_negotiated_parameters_and_counts_traffic(session_pair):
+    a_state, b_state = session_pair
+    assert a_state.version == b_state.version and a_state.version.startswith("TLS")
+    assert a_state.cipher == b_state.cipher and a_state.cipher
+
+    done = threading.Event()
+    receiver = threading.Thread(target=recv_loop, args=(b_state.conn, "Alice", done.set, b_state), daemon=True)
+    receiver.start()
+    assert chat_send(a_state.conn, "hello", a_state)
+    assert chat_send(a_state.conn, "world!", a_state)
+    a_state.close()
+    assert done.wait(5.0)
+
+    assert (a_state.msgs_out, a_state.bytes_out) == (2, 11)
+    assert b_state.bytes_in == 11 and 1 <= b_state.msgs_in <= 2  # TLS may coalesce the records
+    assert b_state.last_rx >= b_state.created
+
+
+def test_session_record_is_slotted_and_bounded():
+    ours, theirs = socket.socketpair()
+    try:
+        s = SessionState("Alice-With-A-Long-Name", ours, serial=2 ** 150,
+                         cipher="TLS_AES_256_GCM_SHA384", version="TLSv1.3")
+        with pytest.raises(AttributeError):
+            s.extra = 1
+        assert not hasattr(s, "__dict__")
+        assert s.record_size() < 512
+    finally:
+        ours.close()
+        theirs.close()
+
+
+def test_registry_aggregates_without_holding_sessions_after_remove():
+    socks = [socket.socketpair() for _ in range(50)]
+    try:
+        registry = SessionRegistry()
+        sessions = [SessionState(f"peer-{i}", ours) for i, (ours, _) in enumerate(socks)]
+        for s in sessions:
+            registry.add(s)
+            s.record_rx(10)
+            s.record_tx(4)
+        stats = registry.stats()
+        assert stats["sessions"] == 50
+        assert (stats["bytes_in"], stats["bytes_out"], stats["msgs_in"]) == (500, 200, 50)
+        assert 0 < stats["record_bytes_per_session"] <= stats["max_record_bytes"] < 512
+        assert stats["record_bytes"] == sum(s.record_size() for s in sessions)
+
+        for s in sessions[:20]:
+            registry.remove(s)
+        registry.remove(sessions[0])  # removing twice is harmless
+        assert len(registry) == 30 and registry.stats()["bytes_in"] == 300
+    finally:
+        for ours, theirs in socks:
+            ours.close()
+            theirs.close()
@@ -0,0 +1,108 @@
+import socket
+import threading
+import time
+import datetime
+
+from app.channel import SessionState, recv_loop
+from app.pool import SessionPool
+
+
+class _FakeConnector:
+    """Stands in for initiate_tls_handshake with plain socketpairs."""
+    def __init__(self, not_after=None):
+        self.calls = 0
+        self.peers = []
+        self.not_after = not_after
+
+    def __call__(self, host, port, expected_peer_id=None, profile=None):
+        self.calls += 1
+        ours, theirs = socket.socketpair()
+        self.peers.append(theirs)
+        return SessionState(expected_peer_id or "Bob", ours, not_after=self.not_after)
+
+
+def test_pool_reuses_healthy_sessions_and_replaces_dead_ones():
+    connector = _FakeConnector()
+    pool = SessionPool(connect=connector)
+
+    s1 = pool.acquire("127.0.0.1", 7000, "Bob")
+    pool.release(s1)
+    s2 = pool.acquire("127.0.0.1", 7000, "Bob")
+    assert s2 is s1 and connector.calls == 1
+
+    # Peer goes away while the session sits idle: health check must catch it
+    pool.release(s2)
+    connector.peers[0].close()
+    s3 = pool.acquire("127.0.0.1", 7000, "Bob")
+    assert s3 is not s1 and connector.calls == 2
+
+    stats = pool.stats()
+    assert stats["reused"] == 1
+    assert stats["evicted_unhealthy"] == 1
+    assert stats["reuse_ratio"] == round(1 / 3, 3)
+    pool.discard(s3)
+
+
+def test_pool_caps_and_eviction():
+    connector = _FakeConnector()
+    pool = SessionPool(max_per_peer=1, max_total=2, connect=connector)
+
+    a = pool.acquire("10.0.0.1", 7000, "A")
+    assert pool.acquire("10.0.0.1", 7000, "A") is None  # per-peer cap
+    b = pool.acquire("10.0.0.2", 7000, "B")
+    pool.release(a)
+    # Global cap is full, so the idle session to A is evicted to make room
+    c = pool.acquire("10.0.0.3", 7000, "C")
+    assert c is not None and a.is_closed()
+    assert pool.stats()["rejected_cap"] == 1
+
+    pool.idle_timeout = 0
+    pool.release(b)
+    assert pool.evict() == 1 and b.is_closed()
+
+
+def test_pool_evicts_sessions_with_expired_peer_cert():
+    past = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)
+    connector = _FakeConnector(not_after=past)
+    pool = SessionPool(connect=connector)
+
+    s = pool.acquire("127.0.0.1", 7000)
+    pool.release(s)
+    assert s.is_closed()
+    assert pool.stats()["idle"] == 0
+
+
+class _Conn:
+    """Enough of an SSLSocket over a socketpair end for recv_loop."""
+    def __init__(self, sock):
+        self.sock = sock
+
+    def read(self, n):
+        return self.sock.recv(n)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def test_parked_session_is_closed_instead_of_showing_chat(capsys):
+    ours, theirs = socket.socketpair()
+    session = SessionState("Bob", _Conn(ours))
+    pool = SessionPool(connect=lambda *a, **k: session)
+    disconnected = threading.Event()
+    session.receiver = threading.Thread(target=recv_loop, args=(session.conn, "Bob", disconnected.set, session),
+                                        daemon=True)
+    session.receiver.start()
+
+    assert pool.acquire("127.0.0.1", 7000, "Bob") is session
+    theirs.sendall(b"while connected")
+    time.sleep(0.1)
+    pool.release(session)
+    assert pool.stats()["idle"] == 1
+    theirs.sendall(b"after disconnect")
+    assert disconnected.wait(5.0)
+    out = capsys.readouterr().out
+    assert "while connected" in out and "after disconnect" not in out
+    assert theirs.recv(16) == b""  # The peer sees the session end
+    assert session.is_closed()
+    pool.acquire("127.0.0.1", 7000, "Bob")
+    assert pool.stats()["evicted_unhealthy"] == 1
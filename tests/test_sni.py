@@ -0,0 +1,104 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from app import handshake as app_handshake
+from app import workers
+from app.admission import AdmissionController
+from app.credentials import Credentials
+from app.sni import SniRouter, sni_name
+
+
+def _credentials(credential_pool, name):
+    keys = credential_pool.get(name)
+    return Credentials(keys['ca_path'], keys['cert_path'], keys['key_path'])
+
+
+@pytest.fixture
+def router(credential_pool, configured_identity):
+    router = SniRouter()
+    for name in ("Alice", "Bob", "Carol"):
+        router.add(_credentials(credential_pool, name))
+    return router
+
+
+def test_initiators_get_the_identity_they_name(router, credential_pool):
+    mallory = _credentials(credential_pool, "Mallory")
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(8)
+    accepted = []
+
+    def serve(count):
+        for _ in range(count):
+            raw, addr = listener.accept()
+            accepted.append(app_handshake.handle_incoming_connection(raw, addr, context=router.context(),
+                                                                     credentials=router.credentials()))
+
+    thread = threading.Thread(target=serve, args=(6,), daemon=True)
+    thread.start()
+    port = listener.getsockname()[1]
+    try:
+        sessions = [app_handshake.initiate_tls_handshake(host, port, name, credentials=mallory)
+                    for host, name in (("127.0.0.1", "Bob"), ("127.0.0.1", "Carol"), ("127.0.0.1", None),
+                                       ("localhost", None))]
+        # No peer_id, dialled by address or by host name: no SNI, the default identity
+        assert [s.peer_id for s in sessions] == ["Bob", "Carol", "Alice", "Alice"]
+        # An initiator from before SNI routing sends the host it dialled and gets the default too
+        old = mallory.context(False).wrap_socket(socket.create_connection(("127.0.0.1", port), timeout=5),
+                                                 server_hostname="localhost")
+        old.close()
+        # An identity this listener doesn't serve gets the default, which the initiator rejects
+        assert app_handshake.initiate_tls_handshake("127.0.0.1", port, "Zed", credentials=mallory) is None
+        thread.join(5.0)
+        served = [router.served_identity(s.conn) for s in accepted if s is not None]
+        assert served == ["Bob", "Carol", "Alice", "Alice", "Alice", "Alice"]
+        assert router.stats() == {"selected": 2, "default": 2, "unknown": 2, "identities": 3}
+        for s in sessions + accepted:
+            if s is not None:
+                s.close()
+    finally:
+        listener.close()
+
+
+def test_router_rejects_duplicates_and_names_case_insensitively(router, credential_pool):
+    with pytest.raises(ValueError):
+        router.add(_credentials(credential_pool, "Bob"))
+    assert router.names() == ["Alice", "Bob", "Carol"] and len(router) == 3
+    assert router.credentials("bob").name == "Bob"
+    assert router.credentials().name == "Alice"
+
+
+def test_only_host_name_shaped_peer_ids_are_sent_as_sni():
+    assert sni_name("Control-Bravo") == "Control-Bravo"
+    assert sni_name("bench_server.lab") == "bench_server.lab"
+    for peer_id in (None, "", "Test User", "127.0.0.1", "-lead", "x" * 64):
+        assert sni_name(peer_id) is None
+
+
+@pytest.mark.skipif(not workers.supported(), reason="needs fork() and SO_REUSEPORT")
+def test_workers_serve_every_identity_of_the_router(router, credential_pool):
+    sup = workers.WorkerSupervisor(workers=2, port=0, host="127.0.0.1", router=router,
+                                   admission=lambda: AdmissionController(per_ip_burst=100))
+    sup.start()
+    thread = threading.Thread(target=sup.serve_forever, daemon=True)
+    thread.start()
+    mallory = _credentials(credential_pool, "Mallory")
+    try:
+        deadline = time.monotonic() + 5.0  # Each worker reports once it is listening
+        while len(sup.stats()["per_worker"]) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        sessions = [app_handshake.initiate_tls_handshake("127.0.0.1", sup.port, name, credentials=mallory)
+                    for name in ("Bob", "Carol", "Bob")]
+        assert [s.peer_id for s in sessions] == ["Bob", "Carol", "Bob"]
+        for s in sessions:
+            s.close()
+        deadline = time.monotonic() + 5.0  # Workers report after each handshake
+        while sup.stats()["identities"] != {"Bob": 2, "Carol": 1} and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert sup.stats()["identities"] == {"Bob": 2, "Carol": 1}
+    finally:
+        sup.stop()
+        thread.join(5.0)
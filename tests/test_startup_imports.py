@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _eager_modules(statement):
+    probe = (f"import sys; {statement}; "
+             "print(sorted({m.split('.')[0] for m in sys.modules} & "
+             "{'cryptography', 'certificate_validation', 'build_ca'}))")
+    out = subprocess.run([sys.executable, "-c", probe], cwd=REPO_ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return out.strip()
+
+
+def test_cli_and_ca_tool_defer_heavy_imports():
+    """Startup budget guard: the CLI must reach its prompt and ca_tool must
+    parse arguments without loading the cryptography stack
+    (see benchmarks/startup.py for the timing budgets).
+    """
+    assert _eager_modules("import app.cli") == "[]"
+    assert _eager_modules("import ca_tool") == "[]"
@@ -0,0 +1,110 @@
+import datetime
+import socket
+import threading
+
+import pytest
+
+import build_ca
+import ca_tool
+import crl
+import certificate_validation
+import status_responder
+from app import stapling
+
+
+@pytest.fixture
+def garbage_crl(tmp_path, monkeypatch):
+    """A CRL that fails verification, so any fallback to the CRL is visible."""
+    path = tmp_path / "crl.json"
+    path.write_text('{"revoked": [], "updated_at": null}')
+    monkeypatch.setattr(crl, "CRL_PATH", str(path))
+    monkeypatch.setattr(crl, "CRL_SIG_PATH", str(tmp_path / "missing.sig"))
+    return path
+
+
+def _pems(root_ca, leaf):
+    from cryptography.hazmat.primitives import serialization
+    return (leaf['cert'].public_bytes(serialization.Encoding.PEM),
+            root_ca['cert'].public_bytes(serialization.Encoding.PEM))
+
+
+def test_responder_signs_and_serves_statements(root_ca, tmp_path, monkeypatch):
+    monkeypatch.setattr(crl, "CRL_PATH", str(tmp_path / "no_crl.json"))
+    responder = status_responder.StatusResponder(root_ca['private_key'], validity=600)
+    server = status_responder.ResponderServer(("127.0.0.1", 0), responder)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        host, port = server.server_address
+        statement = status_responder.fetch_statement(42, host, port)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    pub = root_ca['cert'].public_key()
+    assert status_responder.verify_statement(statement, pub, 42) == "good"
+    # Cached until half its validity has passed
+    assert responder.statement_for(42) == statement
+
+    with pytest.raises(ValueError):
+        status_responder.verify_statement(statement, pub, 43)
+    with pytest.raises(ValueError):
+        status_responder.verify_statement(dict(statement, status="revoked"), pub, 42)
+    later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=601)
+    with pytest.raises(ValueError):
+        status_responder.verify_statement(statement, pub, 42, now=later)
+
+
+def test_validate_cert_uses_staple_instead_of_crl(root_ca, make_id_keys_factory, garbage_crl):
+    leaf = make_id_keys_factory("Bob")
+    peer_pem, ca_pem = _pems(root_ca, leaf)
+    serial = leaf['cert'].serial_number
+    key = root_ca['private_key']
+
+    good = status_responder.sign_statement(serial, False, key)
+    assert certificate_validation.validate_cert(peer_pem, ca_pem, "Bob", staple=good)
+
+    revoked = status_responder.sign_statement(serial, True, key)
+    with pytest.raises(ValueError, match="revoked"):
+        certificate_validation.validate_cert(peer_pem, ca_pem, "Bob", staple=revoked)
+
+    # A staple for another cert is ignored and the (broken) CRL is consulted
+    other = status_responder.sign_statement(serial + 1, False, key)
+    with pytest.raises(ValueError, match="CRL"):
+        certificate_validation.validate_cert(peer_pem, ca_pem, "Bob", staple=other)
+
+
+def test_exchange_staples_over_socketpair():
+    a, b = socket.socketpair()
+    mine = {"serial": 1, "status": "good"}
+    got = {}
+
+    t = threading.Thread(target=lambda: got.setdefault("b", stapling.exchange_staples(b, None)))
+    t.start()
+    got["a"] = stapling.exchange_staples(a, mine)
+    t.join(timeout=5)
+    a.close(); b.close()
+
+    assert got["a"] is None
+    assert got["b"] == mine
+
+
+def test_a_good_staple_does_not_override_the_local_crl(tmp_path, monkeypatch):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import serialization
+
+    monkeypatch.chdir(tmp_path)
+    build_ca.create_ca()
+    with open(ca_tool.generate_user_keypair("Bob"), "rb") as f:
+        peer_pem = build_ca.issue_cert("Bob", f.read())
+    with open(crl.CA_KEY_PATH, "rb") as f:
+        key = serialization.load_pem_private_key(f.read(), password=None)
+    with open("ca/root_cert.pem", "rb") as f:
+        ca_pem = f.read()
+    serial = x509.load_pem_x509_certificate(peer_pem).serial_number
+    good = status_responder.sign_statement(serial, False, key)  # Signed before the revocation
+
+    crl.revoke(serial + 1)
+    assert certificate_validation.validate_cert(peer_pem, ca_pem, "Bob", staple=good)
+    crl.revoke(serial)
+    with pytest.raises(ValueError, match="revoked"):
+        certificate_validation.validate_cert(peer_pem, ca_pem, "Bob", staple=good)
@@ -0,0 +1,143 @@
+import socket
+import ssl
+import threading
+
+import pytest
+
+from app import handshake as app_handshake
+from app import profiles
+from app import utils as app_utils
+from app.utils import create_ssl_context
+
+
+def _listen():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    return listener
+
+
+def _handshake(listener, client_profile, server_profile):
+    """Runs one app-level handshake; returns (initiator, responder) sessions."""
+    server = {}
+
+    def serve():
+        raw, addr = listener.accept()
+        server["session"] = app_handshake.handle_incoming_connection(raw, addr, profile=server_profile)
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+    client = app_handshake.initiate_tls_handshake("127.0.0.1", listener.getsockname()[1], profile=client_profile)
+    t.join(5.0)
+    return client, server.get("session")
+
+
+@pytest.fixture
+def identities(configured_identity, monkeypatch):
+    # Both ends use the configured identity
+    monkeypatch.setattr(app_utils, "TLS_PROFILE", "default")
+
+
+def test_profiles_set_protocol_and_socket_options(identities):
+    listener = _listen()
+    try:
+        client, server = _handshake(listener, "low-latency", "low-latency")
+        assert client.version == server.version == "TLSv1.3"
+        assert client.conn.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert server.conn.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        client.close()
+        server.close()
+
+        client, server = _handshake(listener, "bulk", "bulk")
+        assert "GCM" in client.cipher
+        plain = socket.socket()
+        try:
+            assert client.conn.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) > \
+                plain.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        finally:
+            plain.close()
+        assert not client.conn.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        client.close()
+        server.close()
+    finally:
+        listener.close()
+
+
+def test_tls13_only_listener_refuses_tls12_initiators(identities):
+    server_ctx = create_ssl_context(is_server=True, profile="low-latency")
+    client_ctx = create_ssl_context(is_server=False, profile="default")
+    client_ctx.maximum_version = ssl.TLSVersion.TLSv1_2
+    listener = _listen()
+    try:
+        def serve():
+            raw, _ = listener.accept()
+            try:
+                server_ctx.wrap_socket(raw, server_side=True)
+            except (ssl.SSLError, OSError):
+                raw.close()
+
+        threading.Thread(target=serve, daemon=True).start()
+        raw = socket.create_connection(listener.getsockname(), timeout=5)
+        with pytest.raises(ssl.SSLError):
+            client_ctx.wrap_socket(raw, server_hostname="127.0.0.1")
+        raw.close()
+    finally:
+        listener.close()
+
+
+def test_configured_profile_applies_when_none_is_given(identities):
+    app_utils.TLS_PROFILE = "low-latency"
+    listener = _listen()
+    try:
+        client, server = _handshake(listener, None, "default")
+        # The initiator followed TLS_PROFILE; the listener's explicit profile won
+        assert client.conn.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert not server.conn.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        client.close()
+        server.close()
+    finally:
+        listener.close()
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        profiles.get_profile("turbo")
+    assert profiles.get_profile(None).name == "default"
+
+
+@pytest.mark.parametrize("name", list(profiles.PROFILES))
+def test_profiles_fall_back_to_p256_for_peers_without_x25519(identities, name):
+    server_ctx = create_ssl_context(is_server=True, profile=name)
+    client_ctx = create_ssl_context(is_server=False, profile=name)
+    client_ctx.set_ecdh_curve("prime256v1")  # The only group this client offers
+    listener = _listen()
+    try:
+        def serve():
+            raw, _ = listener.accept()
+            try:
+                conn = server_ctx.wrap_socket(raw, server_side=True)
+                conn.read(1)
+            except (ssl.SSLError, OSError):
+                pass
+            finally:
+                raw.close()
+
+        threading.Thread(target=serve, daemon=True).start()
+        raw = socket.create_connection(listener.getsockname(), timeout=5)
+        conn = client_ctx.wrap_socket(raw, server_hostname="127.0.0.1")
+        conn.write(b"x")
+        conn.close()
+    finally:
+        listener.close()
+
+
+def test_default_profile_matches_the_historical_context_settings():
+    for protocol, is_server in ((ssl.PROTOCOL_TLS_SERVER, True), (ssl.PROTOCOL_TLS_CLIENT, False)):
+        historical = ssl.SSLContext(protocol)
+        historical.minimum_version = ssl.TLSVersion.TLSv1_2
+        historical.set_ciphers('ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS')
+        ctx = ssl.SSLContext(protocol)
+        profiles.get_profile("default").apply_context(ctx, is_server)
+        assert ctx.options == historical.options
+        assert ctx.minimum_version == historical.minimum_version
+        assert [c["name"] for c in ctx.get_ciphers()] == [c["name"] for c in historical.get_ciphers()]
@@ -0,0 +1,119 @@
+import hashlib
+import json
+
+import pytest
+from cryptography import x509
+
+import app.utils as app_utils
+import build_ca
+import ca_tool
+import certificate_validation
+import crl
+import merkle_log
+import verify
+
+
+def _issue(name, issuer=None):
+    with open(ca_tool.generate_user_keypair(name), "rb") as f:
+        cert_pem, chain_pem, index = ca_tool.issue_certificate(name, f.read(), 30, issuer)
+    with open(f"keys/{name}_cert.pem", "wb") as f:
+        f.write(cert_pem + chain_pem)
+    return x509.load_pem_x509_certificate(cert_pem)
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 5, 8, 9, 31, 64, 67])
+def test_parallel_root_matches_the_log_root(size):
+    leaves = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(size)]
+    for workers in (1, 2):
+        assert merkle_log.parallel_root(iter(leaves), workers=workers, chunk_size=8) == \
+            (merkle_log._compute_root(leaves), size)
+    with pytest.raises(ValueError):
+        merkle_log.parallel_root(leaves, chunk_size=6)
+
+
+def test_log_reader_streams_leaves_across_block_boundaries(tmp_path):
+    leaves = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(50)]
+    path = tmp_path / "merkle_log.json"
+    path.write_text(json.dumps({"leaves": leaves, "root": "r", "size": 1234567}, indent=2))
+    reader = merkle_log.LogReader(str(path), block_size=5)
+    assert list(reader) == leaves and reader.count == 50
+    assert reader.fields == {"root": "r", "size": 1234567}
+
+    path.write_text(json.dumps({"leaves": leaves})[:-40])
+    with pytest.raises(ValueError):
+        list(merkle_log.LogReader(str(path), block_size=64))
+
+
+def test_audit_checks_log_crl_and_every_certificate(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", "ca/root_cert.pem")
+    build_ca.create_ca()
+    build_ca.create_intermediate("issuer-1")
+    alpha = _issue("Pilot-Alpha")
+    _issue("Control-Bravo", issuer="issuer-1")
+    _issue("Relay-Charlie")
+
+    report = verify.audit(workers=2, chunk_size=2)
+    assert report["ok"], report
+    assert report["log"]["size"] == 3 and report["log"]["root_matches"]
+    assert [c["log_index"] for c in report["certificates"]] == [1, 0, 2]  # Sorted by file name
+
+    # A revoked cert, a cert the log never saw and a rewritten root all fail the audit
+    crl.revoke(alpha.serial_number)
+    with open(ca_tool.generate_user_keypair("Ghost"), "rb") as f:
+        pem = build_ca.issue_cert("Ghost", f.read())
+    with open("keys/Ghost_cert.pem", "wb") as f:
+        f.write(pem)
+    log = json.loads(open(merkle_log.LOG_PATH).read())
+    log["root"] = "0" * 64
+    with open(merkle_log.LOG_PATH, "w") as f:
+        json.dump(log, f)
+
+    report = verify.audit(workers=1)
+    assert not report["ok"] and not report["log"]["root_matches"] and report["crl"]["signature_valid"]
+    failed = {c["file"].split("/")[-1]: c for c in report["certificates"] if not c["ok"]}
+    assert sorted(failed) == ["Ghost_cert.pem", "Pilot-Alpha_cert.pem"]
+    assert failed["Ghost_cert.pem"]["in_log"] is False and failed["Pilot-Alpha_cert.pem"]["revoked"]
+
+    with open(crl.CRL_SIG_PATH, "wb") as f:
+        f.write(b"forged")
+    capsys.readouterr()
+    assert verify.main(["--audit", "--json"]) == 1
+    out = json.loads(capsys.readouterr().out)
+    assert out["crl"]["signature_valid"] is False and out["summary"] == {"certificates": 4, "failed": 2}
+
+
+def test_audit_checks_certificates_in_parallel_and_indexes_only_their_leaves(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", "ca/root_cert.pem")
+    monkeypatch.setattr(verify, "AUDIT_PARALLEL_MIN", 0)
+    build_ca.create_ca()
+    for name in ("Pilot-Alpha", "Control-Bravo", "Relay-Charlie"):
+        _issue(name)
+    merkle_log.append_certs([f"not audited {i}".encode() for i in range(5)])
+
+    serial = verify.audit(workers=1)
+    parallel = verify.audit(workers=2)
+    assert parallel["ok"] and parallel["certificates"] == serial["certificates"]
+
+    wanted = {c["leaf"] for c in parallel["certificates"]}
+    ca_pub = certificate_validation.load_trust_anchor("ca/root_cert.pem").public_key
+    report, index = verify._audit_log(1, 2, ca_pub, wanted)
+    assert report["ok"] and report["size"] == 8 and set(index) == wanted
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_a_malformed_chain_fails_only_its_own_file(tmp_path, monkeypatch, workers):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_utils, "CA_ROOT_PATH", "ca/root_cert.pem")
+    monkeypatch.setattr(verify, "AUDIT_PARALLEL_MIN", 0)
+    build_ca.create_ca()
+    _issue("Pilot-Alpha")
+    _issue("Control-Bravo")
+    with open("keys/Control-Bravo_cert.pem", "ab") as f:
+        f.write(b"-----BEGIN CERTIFICATE-----\nZ2FyYmFnZQ==\n-----END CERTIFICATE-----\n")
+
+    report = verify.audit(workers=workers)
+    assert not report["ok"]
+    failed = [c["file"].split("/")[-1] for c in report["certificates"] if not c["ok"]]
+    assert failed == ["Control-Bravo_cert.pem"] and len(report["certificates"]) == 2
@@ -0,0 +1,212 @@
+"""
+Pre-generated test credentials, cached on disk across test runs.
+
+Generating keys and signing certificates dominated the suite's setup time.
+A CredentialPool makes one root CA per key algorithm plus a fixed set of
+named identities for every validity window, writes them as PEM files once
+and hands out the same objects afterwards. Files live in a directory keyed
+by a hash of the parameters, so changing names, algorithms or windows
+starts a fresh set. An algorithm's set is generated on first use only, and
+regenerated once it is old enough that a window would no longer describe
+the certificates (see `max_age`).
+
+Implements:
+- ALGORITHMS, WINDOWS, NAMES
+- CredentialPool(directory, names=NAMES, algorithms=ALGORITHMS, windows=WINDOWS)
+  - root(algorithm) -> {'private_key', 'cert', 'cert_path'}
+  - get(name, algorithm="ed25519", window="valid")
+        -> {'private_key', 'cert', 'cert_path', 'key_path', 'ca_path'}
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Tuple
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+FORMAT_VERSION = 1
+
+# Key algorithms; each gets its own root CA of the same type
+ALGORITHMS = ("ed25519", "ecdsa-p256", "rsa-2048")
+
+# Validity windows as (not_before, not_after) offsets in seconds from generation time
+WINDOWS: Dict[str, Tuple[int, int]] = {
+    "valid": (-60, 30 * 86400),
+    "short": (-60, 86400),
+    "expired": (-2 * 86400, -86400),
+    "future": (86400, 2 * 86400),
+}
+
+NAMES = ("Alice", "Bob", "Carol", "Mallory")
+
+
+def _generate_key(algorithm: str):
+    if algorithm == "ed25519":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm == "ecdsa-p256":
+        return ec.generate_private_key(ec.SECP256R1())
+    if algorithm == "rsa-2048":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    raise ValueError(f"Unknown key algorithm: {algorithm}")
+
+
+def _sign(builder, key):
+    # Ed25519 signs without a separate digest
+    algorithm = None if isinstance(key, ed25519.Ed25519PrivateKey) else hashes.SHA256()
+    return builder.sign(private_key=key, algorithm=algorithm)
+
+
+def _name(common_name: str) -> x509.Name:
+    return x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+
+
+def _key_usage(ca: bool) -> x509.KeyUsage:
+    return x509.KeyUsage(digital_signature=True, content_commitment=False, key_encipherment=False,
+                         data_encipherment=False, key_agreement=False, key_cert_sign=ca, crl_sign=ca,
+                         encipher_only=False, decipher_only=False)
+
+
+def _make_root(algorithm: str, now: datetime) -> dict:
+    key = _generate_key(algorithm)
+    builder = (x509.CertificateBuilder()
+               .subject_name(_name(f"Pool Root CA ({algorithm})"))
+               .issuer_name(_name(f"Pool Root CA ({algorithm})"))
+               .public_key(key.public_key())
+               .serial_number(x509.random_serial_number())
+               .not_valid_before(now - timedelta(days=3))
+               .not_valid_after(now + timedelta(days=3650))
+               .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+               .add_extension(_key_usage(ca=True), critical=True)
+               .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False))
+    return {'private_key': key, 'cert': _sign(builder, key)}
+
+
+def _make_leaf(name: str, algorithm: str, root: dict, window: Tuple[int, int], now: datetime) -> dict:
+    key = _generate_key(algorithm)
+    builder = (x509.CertificateBuilder()
+               .subject_name(_name(name))
+               .issuer_name(root['cert'].subject)
+               .public_key(key.public_key())
+               .serial_number(x509.random_serial_number())
+               .not_valid_before(now + timedelta(seconds=window[0]))
+               .not_valid_after(now + timedelta(seconds=window[1]))
+               .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+               .add_extension(_key_usage(ca=False), critical=True)
+               .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+               .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(
+                   root['private_key'].public_key()), critical=False))
+    return {'private_key': key, 'cert': _sign(builder, root['private_key'])}
+
+
+def _write_pem(path: str, obj):
+    if isinstance(obj, x509.Certificate):
+        data = obj.public_bytes(serialization.Encoding.PEM)
+    else:
+        data = obj.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                 serialization.NoEncryption())
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class CredentialPool:
+    """Named test identities per (algorithm, window), generated once and cached in `directory`."""
+    def __init__(self, directory: str, names=NAMES, algorithms=ALGORITHMS, windows=WINDOWS):
+        self.directory = directory
+        self.names = tuple(names)
+        self.algorithms = tuple(algorithms)
+        self.windows = dict(windows)
+        params = json.dumps([FORMAT_VERSION, self.names, self.algorithms, sorted(self.windows.items())])
+        self.key = hashlib.sha256(params.encode()).hexdigest()[:16]
+        self.generated = 0  # Identity sets generated (not loaded) by this pool
+        self._sets: Dict[str, dict] = {}
+
+    @property
+    def max_age(self) -> float:
+        """Seconds before cached files are regenerated: half the nearest future window edge."""
+        edges = [edge for window in self.windows.values() for edge in window if edge > 0]
+        return min(edges) / 2 if edges else float("inf")
+
+    def _set_dir(self, algorithm: str) -> str:
+        return os.path.join(self.directory, f"{algorithm}-{self.key}")
+
+    def _fresh(self, set_dir: str) -> bool:
+        try:
+            with open(os.path.join(set_dir, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return manifest.get("key") == self.key and time.time() - manifest.get("created", 0) < self.max_age
+
+    def _generate(self, algorithm: str, set_dir: str):
+        """Writes a complete set to a scratch directory, then renames it into place."""
+        now = datetime.now(timezone.utc)
+        scratch = tempfile.mkdtemp(prefix=".credpool-", dir=self.directory)
+        root = _make_root(algorithm, now)
+        _write_pem(os.path.join(scratch, "root_cert.pem"), root['cert'])
+        _write_pem(os.path.join(scratch, "root_key.pem"), root['private_key'])
+        for window_name, window in self.windows.items():
+            for name in self.names:
+                leaf = _make_leaf(name, algorithm, root, window, now)
+                _write_pem(os.path.join(scratch, f"{name}-{window_name}_cert.pem"), leaf['cert'])
+                _write_pem(os.path.join(scratch, f"{name}-{window_name}_key.pem"), leaf['private_key'])
+        with open(os.path.join(scratch, "manifest.json"), "w") as f:
+            json.dump({"key": self.key, "created": now.timestamp(), "algorithm": algorithm}, f)
+        shutil.rmtree(set_dir, ignore_errors=True)
+        try:
+            os.rename(scratch, set_dir)
+        except OSError:
+            # Another process (e.g. a parallel worker) installed its set first
+            shutil.rmtree(scratch, ignore_errors=True)
+        self.generated += 1
+
+    def _load(self, algorithm: str) -> dict:
+        if algorithm not in self.algorithms:
+            raise ValueError(f"Algorithm not in this pool: {algorithm}")
+        if algorithm in self._sets:
+            return self._sets[algorithm]
+        set_dir = self._set_dir(algorithm)
+        if not self._fresh(set_dir):
+            self._generate(algorithm, set_dir)
+
+        def load(stem: str, with_key: bool = True) -> dict:
+            cert_path = os.path.join(set_dir, f"{stem}_cert.pem")
+            with open(cert_path, "rb") as f:
+                entry = {'cert': x509.load_pem_x509_certificate(f.read()), 'cert_path': cert_path}
+            if with_key:
+                key_path = os.path.join(set_dir, f"{stem}_key.pem")
+                with open(key_path, "rb") as f:
+                    entry['private_key'] = serialization.load_pem_private_key(f.read(), password=None)
+                entry['key_path'] = key_path
+            return entry
+
+        root = load("root")
+        identities = {}
+        for window_name in self.windows:
+            for name in self.names:
+                identity = load(f"{name}-{window_name}")
+                identity['ca_path'] = root['cert_path']
+                identities[(name, window_name)] = identity
+        self._sets[algorithm] = {"root": root, "identities": identities}
+        return self._sets[algorithm]
+
+    def root(self, algorithm: str = "ed25519") -> dict:
+        """The root CA that signed every identity of this algorithm."""
+        return self._load(algorithm)["root"]
+
+    def get(self, name: str, algorithm: str = "ed25519", window: str = "valid") -> dict:
+        """A cached identity, shaped like make_id_keys() plus its file paths.
+
+        Raises:
+            ValueError: For a name, algorithm or window the pool wasn't built with
+        """
+        if name not in self.names or window not in self.windows:
+            raise ValueError(f"No pooled identity for {name!r} in window {window!r}")
+        return self._load(algorithm)["identities"][(name, window)]
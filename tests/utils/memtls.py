@@ -0,0 +1,182 @@
+"""
+In-memory TLS driver: the real app contexts over ssl.MemoryBIO, no sockets.
+
+Each MemoryTLSEndpoint wraps an SSLObject whose records travel over one
+side of a DirectTransport/InterceptingTransport pair (see transport.py), so
+scripts can drop, mutate or replay TLS records. `handshake()` steps both
+ends in turn on the calling thread until both are done, with no sleeps.
+
+Implements:
+- MemoryTLSEndpoint(context, transport, server_side, server_hostname=None)
+- handshake(client, server, max_rounds=32)
+- connect(client_ctx, server_ctx, transports) -> (client, server)
+- validate(endpoint, expected_name=None) -> (peer_id, cert), via app.handshake
+- Harness(workdir, trust, pair): writes identities and builds their contexts
+"""
+
+import os
+import ssl
+from typing import Callable, Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+
+
+class MemoryTLSEndpoint:
+    def __init__(self, context: ssl.SSLContext, transport, server_side: bool,
+                 server_hostname: Optional[str] = None):
+        self.transport = transport
+        self.incoming = ssl.MemoryBIO()
+        self.outgoing = ssl.MemoryBIO()
+        self.obj = context.wrap_bio(self.incoming, self.outgoing, server_side=server_side,
+                                    server_hostname=None if server_side else server_hostname)
+        self.done = False
+        self._early = b""  # Application data seen while finishing the handshake
+
+    def flush(self) -> bool:
+        """Sends pending TLS records to the peer; True if there were any."""
+        data = self.outgoing.read()
+        if data:
+            self.transport.send(data)
+        return bool(data)
+
+    def feed(self) -> bool:
+        """Moves queued records from the transport into the TLS object."""
+        moved = False
+        while (frame := self.transport.try_recv()) is not None:
+            self.incoming.write(frame)
+            moved = True
+        return moved
+
+    def step(self) -> bool:
+        """Advances the handshake as far as the queued input allows; True on progress."""
+        if self.done:
+            return False
+        progress = self.feed()
+        try:
+            self.obj.do_handshake()
+            self.done = True
+            progress = True
+        except ssl.SSLWantReadError:
+            pass
+        except ssl.SSLError:
+            self.flush()  # let the peer see our alert
+            raise
+        return self.flush() or progress
+
+    def write(self, data: bytes):
+        self.obj.write(data)
+        self.flush()
+
+    def read(self, n: int = 65536) -> bytes:
+        """Reads decrypted data already delivered; b"" if none (or after close_notify)."""
+        if self._early:
+            data, self._early = self._early[:n], self._early[n:]
+            return data
+        self.feed()
+        try:
+            data = self.obj.read(n)
+        except (ssl.SSLWantReadError, ssl.SSLZeroReturnError):
+            data = b""
+        self.flush()  # post-handshake messages (e.g. TLS 1.3 tickets) may need an answer
+        return data
+
+    def poll(self):
+        """Processes delivered records, raising on an alert; keeps any data for read()."""
+        self._early += self.read()
+
+    def close(self):
+        try:
+            self.obj.unwrap()
+        except (ssl.SSLWantReadError, ssl.SSLError):
+            pass
+        self.flush()
+
+
+def handshake(client: MemoryTLSEndpoint, server: MemoryTLSEndpoint, max_rounds: int = 32):
+    """Completes the handshake on both ends.
+
+    Raises:
+        ssl.SSLError: If either end rejects the other, or the exchange stalls
+            (e.g. a dropped record)
+    """
+    for _ in range(max_rounds):
+        progress = client.step()
+        progress = server.step() or progress
+        if client.done and server.done:
+            # TLS 1.3: the client finished first; an alert about its certificate comes after
+            client.poll()
+            return
+        if not progress:
+            break
+    raise ssl.SSLError("in-memory handshake stalled")
+
+
+def connect(client_ctx: ssl.SSLContext, server_ctx: ssl.SSLContext, transports,
+            server_hostname: str = "127.0.0.1") -> Tuple[MemoryTLSEndpoint, MemoryTLSEndpoint]:
+    """Handshakes two contexts over an attached (client, server) transport pair."""
+    client = MemoryTLSEndpoint(client_ctx, transports[0], server_side=False, server_hostname=server_hostname)
+    server = MemoryTLSEndpoint(server_ctx, transports[1], server_side=True)
+    handshake(client, server)
+    return client, server
+
+
+def validate(endpoint: MemoryTLSEndpoint, expected_name: Optional[str] = None):
+    """The app-level peer check the real handshake functions run (CN, validity, CRL)."""
+    import app.handshake as app_handshake
+
+    return app_handshake._validate_peer(endpoint.obj, endpoint.obj.getpeercert(binary_form=True),
+                                        expected_name)
+
+
+class Harness:
+    """Writes test identities to workdir and handshakes them in memory.
+
+    `trust` is the CA dict (tests/utils/ca.py) both ends trust; `pair()`
+    returns a fresh attached (client, server) transport pair.
+    """
+    def __init__(self, workdir: str, trust: dict, pair: Callable[[], tuple]):
+        self.workdir = workdir
+        self.pair = pair
+        self.ca_path = self._write("trust_root_cert.pem", trust["cert"].public_bytes(serialization.Encoding.PEM))
+        self._paths: Dict[int, Tuple[str, str]] = {}
+
+    def _write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.workdir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def paths(self, keys: dict) -> Tuple[str, str]:
+        """(cert_path, key_path) for a make_id_keys() identity, written once."""
+        if id(keys) not in self._paths:
+            n = len(self._paths)
+            self._paths[id(keys)] = (
+                self._write(f"id{n}_cert.pem", keys["cert"].public_bytes(serialization.Encoding.PEM)),
+                self._write(f"id{n}_key.pem", keys["private_key"].private_bytes(
+                    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption())))
+        return self._paths[id(keys)]
+
+    def context(self, keys: dict, is_server: bool, profile=None) -> ssl.SSLContext:
+        """The context app.utils.create_ssl_context builds for this identity."""
+        from app.utils import create_ssl_context
+
+        cert_path, key_path = self.paths(keys)
+        return create_ssl_context(is_server=is_server, ca_path=self.ca_path, cert_path=cert_path,
+                                  key_path=key_path, profile=profile)
+
+    def connect(self, client_keys: dict, server_keys: dict, transports=None, profile=None):
+        """Handshakes client_keys to server_keys; returns (client, server) endpoints.
+
+        Raises:
+            ssl.SSLError: If the TLS layer rejects either end
+        """
+        return connect(self.context(client_keys, False, profile), self.context(server_keys, True, profile),
+                       transports or self.pair())
+
+    def endpoint(self, keys: dict, transport, server_side: bool, profile=None) -> MemoryTLSEndpoint:
+        """One end only, e.g. a client facing replayed records."""
+        return MemoryTLSEndpoint(self.context(keys, server_side, profile), transport, server_side,
+                                 server_hostname="127.0.0.1")
+
+    validate = staticmethod(validate)
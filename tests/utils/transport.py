@@ -8,10 +8,11 @@ Two simple transports:
 Transport contract:
 - send(bytes) -> None
 - recv() -> bytes  (blocking or raises on EOF)
+- try_recv() -> bytes | None  (None when nothing is queued; for single-threaded drivers)
 """
 
 import queue
-from typing import Callable, List, Tuple, Any
+from typing import Callable, List, Optional, Tuple, Any
 
 DROP = object()
 
@@ -29,6 +30,12 @@ class DirectTransport:
     def recv(self, timeout: float = 5.0) -> bytes:
         return self._inbox.get(timeout=timeout)
 
+    def try_recv(self) -> Optional[bytes]:
+        try:
+            return self._inbox.get_nowait()
+        except queue.Empty:
+            return None
+
 class InterceptingTransport:
     def __init__(self):
         self._inbox = queue.Queue()
@@ -75,4 +82,20 @@ class InterceptingTransport:
             for item in rest:
                 self._inbox.put(item)
             return first
-        return r
\ No newline at end of file
+        return r
+
+    def try_recv(self) -> Optional[bytes]:
+        while True:
+            try:
+                frame = self._inbox.get_nowait()
+            except queue.Empty:
+                return None
+            r = self._apply('recv', frame)
+            if r is DROP:
+                continue
+            if isinstance(r, list):
+                first, *rest = r
+                for item in rest:
+                    self._inbox.put(item)
+                return first
+            return r
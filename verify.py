@@ -1,69 +1,326 @@
 #!/usr/bin/env python3
-"""Quick verification script to check all enhancements."""
+"""Quick verification script to check all enhancements.
+
+`python verify.py --audit` instead audits the CA's state: the Merkle log's
+root is recomputed from its leaves (streamed, in parallel chunks), and every
+certificate in keys/ is checked, also in parallel, against the CA, the signed
+CRL and the log.
+"""
 
 import os
+import sys
 import json
+import time
+import glob
+import argparse
+import datetime
+
+AUDIT_KEYS_DIR = os.environ.get("AUDIT_KEYS_DIR", "keys")
+AUDIT_PARALLEL_MIN = int(os.environ.get("AUDIT_PARALLEL_MIN", "64"))  # Fewer certificates are checked in-process
+_PEM_END = b"-----END CERTIFICATE-----"
+
+
+def quick_check():
+    # Verify files exist
+    files_to_check = [
+        'setup.py',
+        'crl.py',
+        'merkle_log.py',
+        'ca/root_cert.pem',
+        'ca/root_key.pem',
+        'ca/merkle_log.json',
+        'keys/Pilot-Alpha_cert.pem',
+        'keys/Control-Bravo_cert.pem',
+    ]
+
+    print('=== FILE VERIFICATION ===')
+    all_good = True
+    for f in files_to_check:
+        exists = os.path.exists(f)
+        status = '✓' if exists else '✗'
+        print(f'{status} {f}')
+        if not exists:
+            all_good = False
+
+    # Check Merkle log structure
+    print('\n=== MERKLE LOG VERIFICATION ===')
+    try:
+        with open('ca/merkle_log.json') as f:
+            log = json.load(f)
+            leaves_count = len(log.get('leaves', []))
+            root = log.get('root', 'N/A')
+            print(f'✓ Leaves count: {leaves_count}')
+            print(f'✓ Root hash: {root[:16]}...')
+    except Exception as e:
+        print(f'✗ Error reading merkle log: {e}')
+        all_good = False
 
-# Verify files exist
-files_to_check = [
-    'setup.py',
-    'crl.py',
-    'merkle_log.py',
-    'ca/root_cert.pem',
-    'ca/root_key.pem',
-    'ca/merkle_log.json',
-    'keys/Pilot-Alpha_cert.pem',
-    'keys/Control-Bravo_cert.pem',
-]
-
-print('=== FILE VERIFICATION ===')
-all_good = True
-for f in files_to_check:
-    exists = os.path.exists(f)
-    status = '✓' if exists else '✗'
-    print(f'{status} {f}')
-    if not exists:
+    # Check CRL structure
+    print('\n=== CRL VERIFICATION ===')
+    try:
+        with open('ca/crl.json') as f:
+            crl = json.load(f)
+            revoked_count = len(crl.get('revoked', []))
+            print(f'✓ Revoked certs: {revoked_count}')
+            if revoked_count > 0:
+                print(f'✓ Latest revocation: {crl["updated_at"]}')
+    except Exception as e:
+        print(f'✗ Error reading CRL: {e}')
         all_good = False
 
-# Check Merkle log structure
-print('\n=== MERKLE LOG VERIFICATION ===')
-try:
-    with open('ca/merkle_log.json') as f:
-        log = json.load(f)
-        leaves_count = len(log.get('leaves', []))
-        root = log.get('root', 'N/A')
-        print(f'✓ Leaves count: {leaves_count}')
-        print(f'✓ Root hash: {root[:16]}...')
-except Exception as e:
-    print(f'✗ Error reading merkle log: {e}')
-    all_good = False
-
-# Check CRL structure
-print('\n=== CRL VERIFICATION ===')
-try:
-    with open('ca/crl.json') as f:
-        crl = json.load(f)
-        revoked_count = len(crl.get('revoked', []))
-        print(f'✓ Revoked certs: {revoked_count}')
-        if revoked_count > 0:
-            print(f'✓ Latest revocation: {crl["updated_at"]}')
-except Exception as e:
-    print(f'✗ Error reading CRL: {e}')
-    all_good = False
-
-# Check CRL signature
-print('\n=== CRL SIGNATURE VERIFICATION ===')
-try:
-    sig_path = 'ca/crl.sig'
-    if os.path.exists(sig_path):
-        size = os.path.getsize(sig_path)
-        print(f'✓ CRL signature present: {size} bytes')
+    # Check CRL signature
+    print('\n=== CRL SIGNATURE VERIFICATION ===')
+    try:
+        sig_path = 'ca/crl.sig'
+        if os.path.exists(sig_path):
+            size = os.path.getsize(sig_path)
+            print(f'✓ CRL signature present: {size} bytes')
+        else:
+            print(f'⚠ CRL signature not found (may not be signed yet)')
+    except Exception as e:
+        print(f'✗ Error checking signature: {e}')
+
+    if all_good:
+        print('\n[✓] All verification checks passed!')
+    else:
+        print('\n[✗] Some checks failed!')
+    return all_good
+
+
+def _audit_log(workers, chunk_size, ca_pub, wanted):
+    """Recomputes the log root, noting where the leaves in `wanted` sit.
+
+    Returns:
+        (report, {leaf: first index}) for the wanted leaves found in the log
+    """
+    import merkle_log
+    import merkle_tiles
+
+    report = {"path": merkle_log.LOG_PATH, "present": os.path.exists(merkle_log.LOG_PATH)}
+    index = {}
+    if not report["present"]:
+        report["ok"] = False
+        return report, index
+
+    reader = merkle_log.LogReader()
+
+    def leaves():
+        # Only the audited certificates' leaves are kept, so memory follows keys/, not the log
+        for i, leaf in enumerate(reader):
+            if leaf in wanted and leaf not in index:
+                index[leaf] = i
+            yield leaf
+
+    started = time.perf_counter()
+    try:
+        root, size = merkle_log.parallel_root(leaves(), workers=workers, chunk_size=chunk_size)
+    except (OSError, ValueError) as e:
+        report.update(ok=False, error=str(e))
+        return report, index
+    stored = reader.fields.get("root")
+    report.update(size=size, stored_root=stored, computed_root=root, root_matches=(root == stored),
+                  workers=workers or os.cpu_count() or 1, chunk_size=chunk_size,
+                  seconds=round(time.perf_counter() - started, 3))
+
+    # The signed checkpoint of the tiled copy must describe the same tree
+    checkpoint = merkle_tiles.TileWriter().checkpoint()
+    if checkpoint is None:
+        report["checkpoint"] = None
+    else:
+        try:
+            merkle_tiles.verify_checkpoint(checkpoint, ca_pub)
+            # A checkpoint behind the log is caught up by the next append; one ahead of it is not
+            behind = checkpoint["size"] < size
+            report["checkpoint"] = {"size": checkpoint["size"], "valid": True, "behind": behind,
+                                    "root_matches": None if behind else (checkpoint["size"] == size
+                                                                         and checkpoint["root"] == root)}
+        except ValueError as e:
+            report["checkpoint"] = {"valid": False, "error": str(e)}
+    report["ok"] = report["root_matches"] and (
+        checkpoint is None or (report["checkpoint"]["valid"] and report["checkpoint"]["root_matches"] is not False))
+    return report, index
+
+
+def _audit_crl(ca_pub):
+    import crl
+
+    if not os.path.exists(crl.CRL_PATH):
+        return {"present": False, "signature_valid": None, "revoked": 0, "ok": True}, set()
+    revoked = set(crl.get_revoked_serials())
+    valid = crl.verify_crl_signature(ca_pub)
+    return {"present": True, "signature_valid": valid, "revoked": len(revoked), "ok": valid}, revoked
+
+
+def _audit_cert(path, anchor, revoked, now):
+    """Checks one certificate file against the CA and the CRL.
+
+    The log check needs every certificate's leaf first (see audit), so the
+    record carries its "leaf" hash and `_finish_cert` adds the log result.
+    """
+    import hashlib
+    import merkle_log
+    import certificate_validation
+    from cryptography import x509
+
+    record = {"file": path}
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        leaf_pem = merkle_log.leaf_pem(data)
+        cert = x509.load_pem_x509_certificate(leaf_pem)
+        chain = [x509.load_pem_x509_certificate(c + _PEM_END) for c in data[len(leaf_pem):].split(_PEM_END)
+                 if c.strip()]
+    except (OSError, ValueError) as e:
+        record.update(ok=False, error=str(e))
+        return record
+    not_before = getattr(cert, "not_valid_before_utc", None) or \
+        cert.not_valid_before.replace(tzinfo=datetime.timezone.utc)
+    not_after = getattr(cert, "not_valid_after_utc", None) or \
+        cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    record.update(subject=cert.subject.rfc4514_string(), serial=cert.serial_number,
+                  not_after=not_after.isoformat(), expired=not (not_before <= now <= not_after))
+    try:
+        issuer = certificate_validation.verify_issuer(cert, anchor, chain)
+        record["signature_valid"] = True
+    except ValueError as e:
+        issuer = None
+        record.update(signature_valid=False, error=str(e))
+    record["revoked"] = cert.serial_number in revoked or (
+        issuer is not None and issuer.cert.serial_number in revoked)
+    record["leaf"] = hashlib.sha256(leaf_pem).hexdigest()
+    return record
+
+
+def _finish_cert(record, log_index):
+    if "leaf" not in record:
+        return record  # Unreadable; already failed
+    record["log_index"] = log_index.get(record["leaf"])
+    record["in_log"] = record["log_index"] is not None
+    record["ok"] = (record["signature_valid"] and record["in_log"]
+                    and not record["expired"] and not record["revoked"])
+    return record
+
+
+_worker_state = None
+
+
+def _init_cert_worker(ca_path, revoked, now):
+    global _worker_state
+    import certificate_validation
+
+    _worker_state = (certificate_validation.load_trust_anchor(ca_path), revoked, now)
+
+
+def _audit_cert_in_worker(path):
+    return _audit_cert(path, *_worker_state)
+
+
+def _audit_certs(paths, ca_path, anchor, revoked, now, workers):
+    """Runs _audit_cert over paths, on a process pool when there are enough of them."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) < AUDIT_PARALLEL_MIN:  # Not worth starting processes
+        return [_audit_cert(p, anchor, revoked, now) for p in paths]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Each worker loads the CA once; the paths go out in a few large batches per worker
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_cert_worker,
+                             initargs=(ca_path, revoked, now)) as pool:
+        return list(pool.map(_audit_cert_in_worker, paths, chunksize=max(1, len(paths) // (4 * workers))))
+
+
+def audit(workers=None, chunk_size=None, keys_dir=None) -> dict:
+    """Audits the log, the CRL and every certificate in keys_dir; returns the report.
+
+    The certificates are checked first (on `workers` processes), so the log
+    pass only has to remember where their leaves are.
+    """
+    import merkle_log
+    import certificate_validation
+    from app.utils import CA_ROOT_PATH
+
+    report = {"time": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+    try:
+        anchor = certificate_validation.load_trust_anchor(CA_ROOT_PATH)
+    except (OSError, ValueError) as e:
+        report.update(ok=False, error=f"CA certificate unusable: {e}")
+        return report
+    crl_report, revoked = _audit_crl(anchor.public_key)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    paths = sorted(glob.glob(os.path.join(keys_dir or AUDIT_KEYS_DIR, "*_cert.pem")))
+    certificates = _audit_certs(paths, CA_ROOT_PATH, anchor, revoked, now, workers)
+    wanted = {c["leaf"] for c in certificates if "leaf" in c}
+    report["log"], log_index = _audit_log(workers, chunk_size or merkle_log.ROOT_CHUNK, anchor.public_key, wanted)
+    report["crl"] = crl_report
+    report["certificates"] = [_finish_cert(c, log_index) for c in certificates]
+    failed = [c["file"] for c in report["certificates"] if not c["ok"]]
+    report["summary"] = {"certificates": len(paths), "failed": len(failed)}
+    report["ok"] = report["log"]["ok"] and report["crl"]["ok"] and not failed
+    return report
+
+
+def _print_audit(report):
+    from app.utils import COLOR_ERROR, COLOR_RESET
+
+    if "error" in report:
+        print(f"{COLOR_ERROR}{report['error']}{COLOR_RESET}")
+        return
+    log = report["log"]
+    if not log["present"]:
+        print(f"{COLOR_ERROR}✗ Merkle log not found: {log['path']}{COLOR_RESET}")
+    elif "error" in log:
+        print(f"{COLOR_ERROR}✗ Merkle log unreadable: {log['error']}{COLOR_RESET}")
+    else:
+        mark = "✓" if log["root_matches"] else "✗"
+        print(f"{mark} Merkle log: {log['size']} leaves, root {str(log['computed_root'])[:16]}... "
+              f"({'matches' if log['root_matches'] else 'DOES NOT match'} the stored root; "
+              f"{log['seconds']}s on {log['workers']} worker(s))")
+        checkpoint = log["checkpoint"]
+        if checkpoint is not None:
+            if not checkpoint["valid"]:
+                print(f"✗ Tiles checkpoint: {checkpoint['error']}")
+            elif checkpoint["behind"]:
+                print(f"⚠ Tiles checkpoint: size {checkpoint['size']}, behind the log")
+            else:
+                print(f"{'✓' if checkpoint['root_matches'] else '✗'} Tiles checkpoint: size {checkpoint['size']}, "
+                      + ("matches the log" if checkpoint["root_matches"] else "DOES NOT match the log"))
+    crl_report = report["crl"]
+    if crl_report["present"]:
+        print(f"{'✓' if crl_report['ok'] else '✗'} CRL: {crl_report['revoked']} revoked, signature "
+              f"{'valid' if crl_report['signature_valid'] else 'INVALID or missing'}")
+    for cert in report["certificates"]:
+        if cert["ok"]:
+            continue
+        problems = [p for p, bad in (("bad signature", not cert.get("signature_valid", True)),
+                                     ("expired", cert.get("expired")), ("revoked", cert.get("revoked")),
+                                     ("not in log", cert.get("in_log") is False)) if bad]
+        print(f"{COLOR_ERROR}✗ {cert['file']}: {', '.join(problems) or cert.get('error')}{COLOR_RESET}")
+    summary = report["summary"]
+    print(f"{summary['certificates'] - summary['failed']}/{summary['certificates']} certificates passed")
+    print("\n[✓] Audit passed" if report["ok"] else "\n[✗] Audit failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the CA's files, or audit them with --audit")
+    parser.add_argument("--audit", action="store_true",
+                        help="Verify the log root, the CRL signature and every certificate in keys/")
+    parser.add_argument("--json", action="store_true", help="With --audit: print the report as JSON")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes for the log root and the certificate checks (default: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Leaves per parallel chunk, a power of two (default MERKLE_ROOT_CHUNK)")
+    parser.add_argument("--keys-dir", default=None, help=f"Certificates to audit (default {AUDIT_KEYS_DIR})")
+    args = parser.parse_args(argv)
+    if not args.audit:
+        quick_check()
+        return 0
+    report = audit(workers=args.workers, chunk_size=args.chunk_size, keys_dir=args.keys_dir)
+    if args.json:
+        print(json.dumps(report, indent=2))
     else:
-        print(f'⚠ CRL signature not found (may not be signed yet)')
-except Exception as e:
-    print(f'✗ Error checking signature: {e}')
-
-if all_good:
-    print('\n[✓] All verification checks passed!')
-else:
-    print('\n[✗] Some checks failed!')
+        _print_audit(report)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())